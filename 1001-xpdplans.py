@@ -0,0 +1,19 @@
+"""
+IPython profile startup script: load the xpdplans package.
+
+Put this file into the startup directory of the beamline profile, in place
+of plans.py, mscan_run.py, temp_runs.py, mrun_2det.py, 1001-remoteplan.py,
+user_temp.py, ...  It runs after the xpdacq startup scripts, so the motors,
+detectors, ``xrun`` and ``db`` are defined, hands them to ``xpdplans.bl``
+and puts every plan and driver into the session namespace.
+
+XPDPLANS_PATH is the directory holding the xpdplans package; default is the
+directory of this file.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.environ.get("XPDPLANS_PATH", os.path.dirname(os.path.abspath(__file__))))
+import xpdplans
+
+xpdplans.load(globals())
@@ -0,0 +1,249 @@
+"""
+Overhead benchmarks for the plans and drivers, run against the simulated profile.
+
+Every case runs one plan (or driver) through ``xrun`` at several sizes with
+all modelled hardware time switched off (``scale=0``), so what is measured is
+the software cost only: plan construction, RunEngine message handling,
+document emission and callbacks.  A straight line fitted through the wall
+times splits it into a fixed per-run overhead and a per-point (or per-sample)
+overhead.
+
+Usage:
+    python benchmarks.py                         # all cases, print table
+    python benchmarks.py --only lineplan gridplan
+    python benchmarks.py --save base.json        # keep a baseline
+    python benchmarks.py --compare base.json     # exit 1 on a regression
+    python benchmarks.py --startup               # package load and import times
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time as ttime
+
+import numpy as np
+import pandas as pd
+
+import sim_profile
+
+
+def _ns():
+    return sim_profile.load_sim_profile(scale=0, workdir=tempfile.mkdtemp(prefix="xpd_bench_"))
+
+
+def _sample_sheet(rows=2000):
+    """Name of a sample sheet with *rows* samples in ./Import, written on first use."""
+    fname = f"bench_{rows}.xlsx"
+    path = os.path.join("Import", fname)
+    if not os.path.exists(path):
+        names = ["example"] + [f"sample_{i}" for i in range(rows)]
+        tags = [None] + [f"batch{i % 7}" if i % 3 else None for i in range(rows)]
+        pd.DataFrame({"Sample Name": names, "User supplied tags": tags}).to_excel(path, index=False)
+    return fname
+
+
+# name -> (unit, function(ns, n) running one measurement of size n)
+BENCHMARKS = {
+    "ct_motors_plan": (
+        "point",
+        lambda ns, n: ns["xrun"](0, ns["ct_motors_plan"]([ns["pe1c"], ns["eurotherm"], ns["sample_x"]], 1, num=n)),
+    ),
+    "lineplan": (
+        "point",
+        lambda ns, n: ns["xrun"](0, ns["lineplan"](1, 0, 1, n)),
+    ),
+    "gridplan": (
+        "point",
+        # 2 rows of n/2 columns, so the point count is comparable to the other cases
+        lambda ns, n: ns["xrun"](0, ns["gridplan"](1, 0, 1, max(n // 2, 1), 0, 1, 2)),
+    ),
+    "xyposplan": (
+        "point",
+        lambda ns, n: ns["xrun"](0, ns["xyposplan"](1, list(np.linspace(0, 1, n)), list(np.linspace(0, 1, n)))),
+    ),
+    "count_with_calib": (
+        "point",
+        lambda ns, n: ns["xrun"](0, ns["count_with_calib"]([ns["pe1c"], ns["sample_x"]], n,
+                                                           calibration_md={"poni_file": "xrd.poni"})),
+    ),
+    "xpd_mscan": (
+        "sample",
+        lambda ns, n: ns["xpd_mscan"](list(range(n)), list(np.linspace(0, 10, n)), 0),
+    ),
+    "xrd_line": (
+        "point",
+        lambda ns, n: ns["xrun"](0, ns["xrd_line"]([ns["pe1c"]], ns["fs"], ns["sample_x"], 0, 1, n, 0.2, 1)),
+    ),
+    "save_position": (
+        # n samples tagged in a 2000 row sheet
+        "sample",
+        lambda ns, n: ns["save_position_to_sample_list"](list(range(0, 20 * n, 20)), list(np.arange(n) * 0.5),
+                                                         _sample_sheet()),
+    ),
+}
+
+# gridplan rounds to an even number of points
+_SIZE = {"gridplan": lambda n: 2 * max(n // 2, 1)}
+
+
+# loads the xpdplans package into a fresh interpreter and prints the time it took
+_STARTUP_CODE = """
+import sys, time
+sys.path.insert(0, {here!r})
+import sim_profile
+sim_profile.make_sim_beamline(scale=0)
+import IPython.core.inputtransformer2  # already loaded in a beamline session
+t0 = time.perf_counter()
+import xpdplans
+for name in xpdplans.MODULES:
+    exec("import xpdplans." + name)  # import statements, importlib.import_module is not seen by -X importtime
+xpdplans.namespace()
+print(time.perf_counter() - t0)
+"""
+
+
+def startup_time(repeat=3):
+    """
+    Best-of-*repeat* time to load the xpdplans package in a fresh interpreter.
+
+    The modules the simulated beamline itself needs (bluesky, ophyd, pandas)
+    and IPython are imported before the clock starts, so what remains is the
+    cost of the package and of the imports only it pulls in, as at an
+    IPython restart.
+
+    Returns:
+        tuple: total seconds, and ``{module: (self, cumulative)}`` import
+        seconds of the xpdplans modules (``python -X importtime``) of the best run.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = _STARTUP_CODE.format(here=here)
+    best, modules = np.inf, {}
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                             capture_output=True, text=True, check=True)
+        total = float(out.stdout.strip().splitlines()[-1])
+        if total < best:
+            best, modules = total, _import_times(out.stderr, "xpdplans")
+    return best, modules
+
+
+def _import_times(stderr, package):
+    """Parse ``-X importtime`` output into ``{module: (self, cumulative)}`` seconds for *package*."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        name = fields[-1].strip()
+        if name == package or name.startswith(package + "."):
+            times[name] = (int(fields[0]) * 1e-6, int(fields[1]) * 1e-6)
+    return times
+
+
+def run_case(ns, func, sizes, repeat):
+    """Return the best-of-*repeat* wall time for each size."""
+    times = []
+    for n in sizes:
+        best = np.inf
+        for _ in range(repeat):
+            t0 = ttime.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                func(ns, n)
+            best = min(best, ttime.perf_counter() - t0)
+        times.append(best)
+    return times
+
+
+def fit_overhead(sizes, times):
+    """Fit ``time = fixed + per_unit * size``, returning ``(fixed, per_unit)``."""
+    per_unit, fixed = np.polyfit(sizes, times, 1)
+    return float(fixed), float(per_unit)
+
+
+def run(names=None, sizes=(1, 5, 10, 20), repeat=3):
+    """
+    Run the benchmark cases *names* (default all).
+
+    Returns:
+        dict: name -> {"unit", "sizes", "times", "fixed", "per_unit"}, times in seconds.
+    """
+    cwd = os.getcwd()
+    ns = _ns()
+    results = {}
+    try:
+        for name in names or BENCHMARKS:
+            unit, func = BENCHMARKS[name]
+            case_sizes = [_SIZE.get(name, int)(n) for n in sizes]
+            # warm up imports and caches outside the timed region
+            run_case(ns, func, case_sizes[:1], 1)
+            times = run_case(ns, func, case_sizes, repeat)
+            fixed, per_unit = fit_overhead(case_sizes, times)
+            results[name] = dict(unit=unit, sizes=case_sizes, times=times, fixed=fixed, per_unit=per_unit)
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def report(results, baseline=None):
+    print(f"{'case':>18s} {'fixed / run':>12s} {'per unit':>14s} {'vs baseline':>12s}")
+    for name, r in results.items():
+        line = f"{name:>18s} {r['fixed'] * 1e3:9.1f} ms {r['per_unit'] * 1e3:7.2f} ms/{r['unit']:<6s}"
+        if baseline and name in baseline:
+            line += f" {_ratio(r, baseline[name]):11.2f}x"
+        print(line)
+
+
+def _ratio(result, base):
+    """Slowdown of *result* against *base*, compared at the baseline's largest size."""
+    n = base["sizes"][-1]
+    return (result["fixed"] + result["per_unit"] * n) / (base["fixed"] + base["per_unit"] * n)
+
+
+def regressions(results, baseline, threshold):
+    """Names of the cases more than *threshold* times slower than *baseline*."""
+    return [name for name, r in results.items() if name in baseline and _ratio(r, baseline[name]) > threshold]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="cases to run")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1, 5, 10, 20], help="points / samples per run")
+    parser.add_argument("--repeat", type=int, default=3, help="repeats per size, best is kept")
+    parser.add_argument("--save", help="write results to this json file")
+    parser.add_argument("--compare", help="baseline json file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown counted as a regression")
+    parser.add_argument("--startup", action="store_true", help="time loading the xpdplans package instead")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        total, modules = startup_time(args.repeat)
+        print(f"{'xpdplans load':>24s} {total * 1e3:8.1f} ms")
+        print(f"{'import self':>33s} {'cumulative':>11s}")
+        for name, (own, cumulative) in modules.items():
+            print(f"{name:>24s} {own * 1e3:8.1f} ms {cumulative * 1e3:8.1f} ms")
+        return 0
+
+    results = run(args.only, args.sizes, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        slow = regressions(results, baseline, args.threshold)
+        if slow:
+            print(f"regressions (> {args.threshold}x): {', '.join(slow)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
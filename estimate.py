@@ -0,0 +1,285 @@
+"""
+Predict how long a driver or plan will take before running it at the beamline.
+
+`estimate` runs the named driver (``mrun_2det_batch``, ``mgridscan``,
+``xpd_mtemp_ramp``, ...) or plan (``xrd_line``, ``gridplan``, ...) against
+the simulated profile from ``sim_profile`` without waiting for anything.
+Blocking device moves and ``time.sleep`` calls made by the driver are charged
+serially to a virtual clock, and every plan handed to ``xrun`` is walked
+message by message: moves, triggers and sleeps are timed from the
+`sim_profile.SIM_TIMING` model, with parallel moves/triggers in the same
+group overlapping as they would in the RunEngine.
+
+Example:
+    >>> est = estimate('mrun_2det_batch', [1, 2, 3], [4, 5, 6], [10, 20, 30], 60, 30, confirm=False)
+    >>> est.report()
+    >>> est.total / 3600    # hours
+
+    a faster motor or another frame time is just a timing override
+    >>> estimate('mgridscan', [1, 2], 5, [10, 20], 2, 11, [0, 0], 2, 11, timing={'sample_y_velocity': 5})
+"""
+import contextlib
+import importlib
+import time as ttime
+import uuid
+from collections import defaultdict
+
+from ophyd import OphydObject
+
+import sim_profile
+import xpdplans
+
+
+class VirtualClock(sim_profile.SimClock):
+    """
+    `sim_profile.SimClock` that never waits but keeps a virtual time.
+
+    Every charged duration advances :attr:`now` and is added to
+    :attr:`phases` under its phase name.  While :attr:`recording` is False
+    (e.g. while `PlanWalker` handles the timing itself) charges are ignored.
+    """
+
+    def __init__(self):
+        super().__init__(scale=0)
+        self.now = 0.0
+        self.phases = defaultdict(float)
+        self.recording = True
+
+    @property
+    def instant(self):
+        return False
+
+    def model_time(self):
+        return self._t0 + self.now
+
+    def charge(self, duration, phase):
+        if self.recording and duration > 0:
+            self.now += duration
+            self.phases[phase] += duration
+        return 0.0
+
+    def advance(self, duration, phase):
+        """Advance virtual time regardless of :attr:`recording`."""
+        if duration > 0:
+            self.now += duration
+            self.phases[phase] += duration
+
+
+class PlanWalker:
+    """
+    Walk a plan's messages and account for their modelled duration.
+
+    Messages are answered directly from the simulated devices instead of a
+    RunEngine.  A ``set`` or ``trigger`` starts a timed operation from the
+    device's ``move_time`` / ``ramp_time`` / ``switch_time`` /
+    ``trigger_segments``; a ``wait`` on its group advances the clock to the
+    slowest member, so operations in one group overlap.  ``sleep`` advances
+    the clock directly and every run adds ``run_overhead``.
+    """
+
+    def __init__(self, clock, timing):
+        self.clock = clock
+        self.timing = timing
+        self.num_runs = 0
+        self.num_events = 0
+        self._groups = defaultdict(list)
+
+    def _segments(self, msg):
+        obj = msg.obj
+        if msg.command == "trigger":
+            return obj.trigger_segments() if hasattr(obj, "trigger_segments") else []
+        value = msg.args[0]
+        if hasattr(obj, "move_time"):
+            return [("motor", obj.move_time(value))]
+        if hasattr(obj, "ramp_time"):
+            return [("temperature", obj.ramp_time(value))]
+        if hasattr(obj, "switch_time"):
+            return [(obj.phase, obj.switch_time(value))]
+        return []
+
+    def _start(self, msg):
+        """Start a timed operation and remember it under its group."""
+        segments = self._segments(msg)
+        group = msg.kwargs.get("group")
+        if group is not None:
+            self._groups[group].append((self.clock.now, segments))
+        if msg.command == "trigger":
+            return msg.obj.trigger()
+        return msg.obj.set(*msg.args)
+
+    def _wait(self, group):
+        """Advance to the end of the slowest operation in *group*."""
+        for start, segments in self._groups.pop(group, []):
+            t = start
+            for phase, dt in segments:
+                # charge only the part of each piece that is still ahead of us
+                seg_end = t + dt
+                if seg_end > self.clock.now:
+                    self.clock.advance(seg_end - max(t, self.clock.now), phase)
+                t = seg_end
+
+    def _dispatch(self, msg):
+        cmd = msg.command
+        if cmd in ("set", "trigger"):
+            return self._start(msg)
+        if cmd == "wait":
+            self._wait(msg.kwargs.get("group"))
+        elif cmd == "sleep":
+            self.clock.advance(msg.args[0], "sleep")
+        elif cmd == "read":
+            return msg.obj.read()
+        elif cmd == "locate":
+            return msg.obj.locate()
+        elif cmd == "describe":
+            return msg.obj.describe()
+        elif cmd == "stage":
+            self.clock.recording = True
+            try:
+                return msg.obj.stage()
+            finally:
+                self.clock.recording = False
+        elif cmd == "unstage":
+            return msg.obj.unstage()
+        elif cmd == "configure":
+            return msg.obj.configure(*msg.args, **msg.kwargs)
+        elif cmd == "open_run":
+            self.num_runs += 1
+            self.clock.advance(self.timing["run_overhead"], "run overhead")
+            return str(uuid.uuid4())
+        elif cmd == "save":
+            self.num_events += 1
+        elif cmd == "subscribe":
+            return self.num_runs
+        return None
+
+    def walk(self, plan):
+        """Consume *plan*, returning its return value."""
+        self.clock.recording = False
+        ret, exc = None, None
+        try:
+            while True:
+                try:
+                    msg = plan.send(ret) if exc is None else plan.throw(exc)
+                except StopIteration as stop:
+                    return stop.value
+                ret, exc = None, None
+                try:
+                    ret = self._dispatch(msg)
+                except Exception as err:
+                    exc = err
+        finally:
+            # anything never waited for still has to finish
+            for group in list(self._groups):
+                self._wait(group)
+            self.clock.recording = True
+
+
+class DurationEstimate:
+    """Predicted duration of a driver or plan with a per-phase breakdown."""
+
+    def __init__(self, name, phases, num_runs, num_events, wall_time):
+        self.name = name
+        self.phases = dict(sorted(phases.items(), key=lambda kv: -kv[1]))
+        self.total = sum(self.phases.values())
+        self.num_runs = num_runs
+        self.num_events = num_events
+        self.wall_time = wall_time
+
+    def __repr__(self):
+        return f"DurationEstimate({self.name!r}, total={self.total:.1f} s, runs={self.num_runs})"
+
+    def report(self):
+        """Print the breakdown, largest phase first."""
+        print(f"{self.name}: {_hms(self.total)} predicted, {self.num_runs} runs, {self.num_events} events "
+              f"(estimated in {self.wall_time:.2f} s)")
+        for phase, t in self.phases.items():
+            share = t / self.total if self.total else 0
+            print(f"  {phase:>14s}: {_hms(t):>10s}  {share:6.1%}")
+        return self
+
+
+def _hms(seconds):
+    m, s = divmod(int(round(seconds)), 60)
+    h, m = divmod(m, 60)
+    return f"{h:d}:{m:02d}:{s:02d}"
+
+
+def _to_sim(obj, ns):
+    """Swap real devices in the call arguments for their simulated namesakes."""
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_sim(o, ns) for o in obj)
+    if isinstance(obj, OphydObject):
+        sim = ns.get(obj.name)
+        if not isinstance(sim, OphydObject):
+            # never let the estimate touch real hardware
+            raise ValueError(f"no simulated device named {obj.name!r} to stand in for {obj!r}")
+        return sim
+    return obj
+
+
+def _no_op(*args, **kwargs):
+    return None
+
+
+@contextlib.contextmanager
+def _patched(**attrs):
+    """Set *attrs* as globals of every xpdplans module, restoring the old ones on exit."""
+    modules = [importlib.import_module(f"xpdplans.{name}") for name in xpdplans.MODULES]
+    saved = [(mod, name, vars(mod).get(name, _patched)) for mod in modules for name in attrs]
+    for mod in modules:
+        vars(mod).update(attrs)
+    try:
+        yield
+    finally:
+        for mod, name, value in saved:
+            if value is _patched:
+                del vars(mod)[name]
+            else:
+                vars(mod)[name] = value
+
+
+def estimate(name, *args, timing=None, scripts=(), **kwargs):
+    """
+    Predict the duration of the driver or plan *name* called with *args*.
+
+    Parameters:
+        name (str or function): driver or plan, e.g. ``'xpd_mtemp_ramp'``; a function is looked up by name.
+        *args, **kwargs: the arguments exactly as they would be given at the beamline.
+            Devices are replaced by the simulated device of the same name.
+        timing (dict, optional): overrides for `sim_profile.SIM_TIMING`, plus ``run_overhead``,
+            the fixed cost per run (metadata, documents, darks) charged by `PlanWalker`.
+        scripts (iterable): further profile scripts to load, see `sim_profile.load_sim_profile`.
+
+    Returns:
+        DurationEstimate: ``.total`` in seconds, ``.phases`` breakdown, ``.report()``.
+    """
+    if not isinstance(name, str):
+        name = name.__name__
+    timing = dict({"run_overhead": 2.0}, **(timing or {}))
+    t0 = ttime.perf_counter()
+    clock = VirtualClock()
+
+    # the beamline objects of the session are back in xpdplans.bl afterwards
+    with xpdplans.bl.preserved():
+        ns = sim_profile.load_sim_profile(scripts=scripts, scale=0, timing=timing, clock=clock)
+        walker = PlanWalker(clock, ns["sim_timing"])
+        xrun = ns["xrun"]
+
+        def _xrun(sample, plan, *_args, **_kwargs):
+            if isinstance(plan, int):
+                plan = xrun.scanplans[plan]()
+            # like RunEngine.__call__
+            for preprocessor in _xrun.preprocessors:
+                plan = preprocessor(plan)
+            walker.walk(plan)
+            return ()
+
+        _xrun.preprocessors = list(xrun.preprocessors)
+        xpdplans.bl.configure(xrun=_xrun)
+        ns["xrun"] = _xrun
+        with _patched(input=lambda prompt="": "y", save_tb_xlsx=_no_op, save_uids_xlsx=_no_op):
+            target = ns[name]
+            result = target(*_to_sim(list(args), ns), **{k: _to_sim(v, ns) for k, v in kwargs.items()})
+            if hasattr(result, "send"):
+                walker.walk(result)
+    return DurationEstimate(name, clock.phases, walker.num_runs, walker.num_events, ttime.perf_counter() - t0)
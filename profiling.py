@@ -0,0 +1,177 @@
+"""
+Message-level profiling of the plans run through ``xrun``.
+
+`MsgProfiler` wraps a plan (``profile_wrapper``) and records, for every
+message, when the plan yielded it and how long it took the RunEngine to hand
+control back, plus the time spent in the plan's own code in between.  The
+records are aggregated by command and object name and can be written per run
+as CSV or as folded stacks for flamegraph.pl / speedscope.
+
+Example:
+    prof = MsgProfiler()
+    with prof.installed(xrun):            # every plan given to xrun
+        xpd_battery([1, 2], [10, 20], 0, cycle=2)
+    prof.report()
+    prof.write('profiles/')               # one .csv and .folded per run
+
+    or for a single plan
+    xrun(1, prof.wrap(lineplan(5, 0, 10, 11)))
+"""
+import contextlib
+import csv
+import os
+import time as ttime
+from collections import defaultdict
+
+from bluesky.utils import ensure_generator, make_decorator
+
+
+def profile_wrapper(plan, profiler):
+    """
+    Pass *plan* through unchanged while timing every message into *profiler*.
+
+    Parameters:
+        plan (iterable): the plan to wrap.
+        profiler (MsgProfiler): receives one record per message.
+    """
+    plan = ensure_generator(plan)
+    ret, exc = None, None
+    while True:
+        t_plan = ttime.perf_counter()
+        try:
+            msg = plan.send(ret) if exc is None else plan.throw(exc)
+        except StopIteration as stop:
+            profiler.record_plan_code(ttime.perf_counter() - t_plan)
+            return stop.value
+        profiler.record_plan_code(ttime.perf_counter() - t_plan)
+
+        t_dispatch = ttime.time()
+        t0 = ttime.perf_counter()
+        try:
+            ret, exc = (yield msg), None
+        except GeneratorExit:
+            plan.close()
+            raise
+        except Exception as err:
+            ret, exc = None, err
+        profiler.record(msg, ret, t_dispatch, ttime.perf_counter() - t0)
+
+
+profile_decorator = make_decorator(profile_wrapper)
+
+
+class MsgProfiler:
+    """
+    Collect per-message timings from `profile_wrapper`.
+
+    :attr:`records` holds one ``(run, command, obj_name, t_dispatch,
+    duration)`` tuple per message, where *run* is the uid of the run the
+    message belongs to (``None`` outside a run).  Time spent in the plan's
+    own code between messages is recorded under the command ``"plan"``.
+    """
+
+    def __init__(self):
+        self.records = []
+        self._run = None
+        self._plan_names = {}
+
+    def wrap(self, plan):
+        """Return *plan* wrapped for profiling into this profiler."""
+        return profile_wrapper(plan, self)
+
+    def install(self, RE):
+        """Profile every plan given to *RE* (e.g. ``xrun``) from now on."""
+        if self.wrap not in RE.preprocessors:
+            RE.preprocessors.append(self.wrap)
+
+    def uninstall(self, RE):
+        if self.wrap in RE.preprocessors:
+            RE.preprocessors.remove(self.wrap)
+
+    @contextlib.contextmanager
+    def installed(self, RE):
+        """Context manager version of :meth:`install` / :meth:`uninstall`."""
+        self.install(RE)
+        try:
+            yield self
+        finally:
+            self.uninstall(RE)
+
+    def clear(self):
+        self.records.clear()
+        self._plan_names.clear()
+        self._run = None
+
+    def record(self, msg, ret, t_dispatch, duration):
+        if msg.command == "open_run" and isinstance(ret, str):
+            self._run = ret
+            self._plan_names[ret] = msg.kwargs.get("plan_name", "plan")
+        obj_name = getattr(msg.obj, "name", None) if msg.obj is not None else None
+        self.records.append((self._run, msg.command, obj_name, t_dispatch, duration))
+        if msg.command == "close_run":
+            self._run = None
+
+    def record_plan_code(self, duration):
+        self.records.append((self._run, "plan", None, ttime.time(), duration))
+
+    @property
+    def runs(self):
+        """Uids of the profiled runs, in order."""
+        return list(self._plan_names)
+
+    def summary(self, run=None):
+        """
+        Aggregate the records by ``(command, obj_name)``.
+
+        Parameters:
+            run (str, optional): only this run; default is everything recorded.
+
+        Returns:
+            list: ``(command, obj_name, count, total, mean, max)`` rows, slowest total first.
+        """
+        agg = defaultdict(list)
+        for r, cmd, obj, _, dt in self.records:
+            if run is None or r == run:
+                agg[(cmd, obj)].append(dt)
+        rows = [(cmd, obj, len(v), sum(v), sum(v) / len(v), max(v)) for (cmd, obj), v in agg.items()]
+        return sorted(rows, key=lambda row: -row[3])
+
+    def report(self, run=None, top=20):
+        """Print the :meth:`summary` table."""
+        rows = self.summary(run)
+        total = sum(row[3] for row in rows)
+        print(f"{'command':>12s} {'object':>24s} {'count':>7s} {'total s':>9s} {'mean ms':>9s} {'max ms':>9s} {'share':>6s}")
+        for cmd, obj, n, tot, mean, mx in rows[:top]:
+            share = tot / total if total else 0
+            print(f"{cmd:>12s} {str(obj or ''):>24s} {n:7d} {tot:9.3f} {mean * 1e3:9.2f} {mx * 1e3:9.2f} {share:6.1%}")
+        return rows
+
+    def to_csv(self, fname, run=None):
+        """Write the raw records (all, or of one *run*) as CSV."""
+        with open(fname, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["run", "command", "object", "t_dispatch", "duration"])
+            for rec in self.records:
+                if run is None or rec[0] == run:
+                    writer.writerow(rec)
+
+    def to_folded(self, fname, run=None):
+        """
+        Write folded stacks (``plan;command;object microseconds``), the input
+        format of flamegraph.pl and speedscope.
+        """
+        agg = defaultdict(float)
+        for r, cmd, obj, _, dt in self.records:
+            if run is None or r == run:
+                stack = [self._plan_names.get(r, "outside run"), cmd] + ([obj] if obj else [])
+                agg[";".join(stack)] += dt
+        with open(fname, "w") as f:
+            for stack, dt in sorted(agg.items()):
+                f.write(f"{stack} {int(round(dt * 1e6))}\n")
+
+    def write(self, directory):
+        """Write ``<uid>.csv`` and ``<uid>.folded`` for every profiled run into *directory*."""
+        os.makedirs(directory, exist_ok=True)
+        for run in self.runs:
+            self.to_csv(os.path.join(directory, f"{run}.csv"), run)
+            self.to_folded(os.path.join(directory, f"{run}.folded"), run)
@@ -0,0 +1,601 @@
+"""
+Simulated XPD profile for running the plans and drivers without the beamline.
+
+The xpdplans package takes ``pe1c``, ``pe2c``, ``pe1_x``, ``pe1_z``,
+``sample_x``, ``sample_y``, ``fb``, ``xpd_configuration``, ``glbl``, ``xrun``,
+``db`` and the xpdacq helpers from ``xpdplans.bl``.  `load_sim_profile` builds
+ophyd.sim based stand-ins for all of them, with motor velocities, detector
+frame times, filter/shutter latency and a ramping temperature controller,
+configures ``bl`` with them and loads the package, so drivers like ``xpd_mscan``,
+``mrun_2det_batch``, ``xpd_temp_ramp`` or ``xrd_line`` run (and can be timed)
+on a laptop.
+
+Example:
+    >>> ns = load_sim_profile(scale=0.01)   # 100x faster than real time
+    >>> ns['xpd_mscan']([1, 2, 3], [10, 20, 30], 0)
+
+    inside IPython, load straight into the user namespace
+    >>> load_sim_profile(ns=globals())
+"""
+import asyncio
+import datetime
+import functools
+import logging
+import os
+import re
+import threading
+import time as ttime
+import typing
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import bluesky.plan_stubs as bps
+import bluesky.plans as bp
+import bluesky.preprocessors as bpp
+from bluesky import RunEngine
+from bluesky.callbacks import LiveTable
+from ophyd import Component as Cpt
+from ophyd import Device, Signal
+from ophyd.sim import SynAxis
+from ophyd.status import DeviceStatus, Status
+
+# Timing model of the simulated hardware, all times in seconds.
+SIM_TIMING = {
+    # motor velocities (mm/s) and settle time after each move
+    "sample_x_velocity": 5.0,
+    "sample_y_velocity": 2.0,
+    "pe1_x_velocity": 10.0,
+    "pe1_z_velocity": 5.0,
+    "motor_settle": 0.2,
+    # area detector: per-frame readout and fixed per-trigger overhead, the
+    # time it takes the cam to accept a new acquire time and to stage
+    "frame_readout": 0.03,
+    "trigger_overhead": 0.3,
+    "detector_reconfigure": 1.0,
+    "detector_stage": 0.5,
+    # actuator latency
+    "filter_latency": 0.5,
+    "shutter_latency": 0.1,
+    # temperature controller, ramp rate in K/min
+    "ramp_rate": 10.0,
+    "temp_settle": 5.0,
+}
+
+# Exposure times of the scanplans known to the simulated ``xrun`` by index.
+DEFAULT_SCANPLANS = (5.0, 30.0, 60.0)
+
+
+class SimClock:
+    """
+    Clock shared by the simulated devices.
+
+    Modelled durations are slept for ``duration * scale`` seconds, so
+    ``scale=1`` runs in real time, ``scale=0.01`` a hundred times faster and
+    ``scale=0`` does not wait at all.  :meth:`model_time` runs ``1 / scale``
+    times faster than the wall clock and drives the device models.
+
+    The clock is configured as ``bl.clock``, so the ``bl.clock.sleep`` calls
+    in the drivers follow the same scale, while ``bl.clock.time`` stays the
+    wall clock the documents are stamped with.
+    ``time.monotonic``, which the plans use for deadlines, is model time.
+    """
+
+    def __init__(self, scale=1.0):
+        if scale < 0:
+            raise ValueError("scale must be >= 0")
+        self.scale = scale
+        self._t0 = ttime.time()
+
+    @property
+    def instant(self):
+        """True if modelled waits are skipped entirely."""
+        return self.scale == 0
+
+    def scaled(self, duration):
+        """Return the wall-clock time to spend on a modelled *duration*."""
+        return max(duration, 0) * self.scale
+
+    def charge(self, duration, phase):
+        """
+        Account for a device spending *duration* model seconds on *phase*.
+
+        Returns the wall-clock time the device should wait.  Subclasses
+        (see ``estimate.VirtualClock``) use the phase to build a breakdown.
+        """
+        return self.scaled(duration)
+
+    def model_time(self):
+        now = ttime.time()
+        if self.scale == 0:
+            return now
+        return self._t0 + (now - self._t0) / self.scale
+
+    def monotonic(self):
+        return self.model_time()
+
+    def sleep(self, duration):
+        ttime.sleep(self.charge(duration, "sleep"))
+
+    def __getattr__(self, key):
+        # everything else (strftime, perf_counter, ...) comes from `time`
+        return getattr(ttime, key)
+
+
+def _finish_later(status, delay, action=None):
+    """Run *action* and mark *status* finished after *delay* wall seconds."""
+
+    def _run():
+        if delay > 0:
+            ttime.sleep(delay)
+        if action is not None:
+            action()
+        status.set_finished()
+
+    if delay > 0:
+        threading.Thread(target=_run, daemon=True).start()
+    else:
+        _run()
+    return status
+
+
+class SimMotor(SynAxis):
+    """`SynAxis` whose move time follows its velocity and a settle time."""
+
+    def __init__(self, *, name, clock, velocity=1.0, settle_time=0.0, value=0.0, **kwargs):
+        super().__init__(name=name, value=value, **kwargs)
+        self.clock = clock
+        self.velocity.put(velocity)
+        self.settle_time = settle_time
+
+    def move_time(self, target):
+        """Modelled time to move from the current setpoint to *target*."""
+        distance = abs(target - self.sim_state["setpoint"])
+        if distance == 0:
+            return 0.0
+        return distance / abs(self.velocity.get()) + self.settle_time
+
+    def set(self, value):
+        self.delay = self.clock.charge(self.move_time(value), "motor")
+        return super().set(value)
+
+    def move(self, position, wait=True, timeout=None):
+        st = self.set(position)
+        if wait:
+            st.wait(timeout)
+        return st
+
+
+class SimCam(Device):
+    acquire_time = Cpt(Signal, value=0.1, kind="config")
+    acquire = Cpt(Signal, value=0, kind="omitted")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.acquire_time.subscribe(self._acquire_time_changed, run=False)
+        self.busy_until = 0.0
+
+    def _acquire_time_changed(self, old_value=None, value=None, **kwargs):
+        # the detector needs a while to accept a new frame time
+        if old_value != value:
+            self.busy_until = self.parent.clock.model_time() + self.parent.timing["detector_reconfigure"]
+
+
+class SimAreaDetector(Device):
+    """
+    Area detector producing powder-ring images.
+
+    A trigger takes ``images_per_set * (acquire_time + frame_readout)`` plus
+    a fixed ``trigger_overhead``.  *intensity* is an optional callable
+    returning the scattering strength at the current sample position.
+    """
+
+    cam = Cpt(SimCam, "")
+    images_per_set = Cpt(Signal, value=1, kind="config")
+    image = Cpt(Signal, value=None, kind="normal")
+
+    def __init__(self, *args, clock, timing, shape=(256, 256), intensity=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.clock = clock
+        self.timing = timing
+        self.intensity = intensity
+        self._rng = np.random.default_rng()
+        yy, xx = np.indices(shape)
+        r = np.hypot(yy - shape[0] / 2, xx - shape[1] / 2)
+        self._rings = 5 + sum(
+            np.exp(-0.5 * ((r - r0) / 2.0) ** 2) * 100 / (k + 1)
+            for k, r0 in enumerate(np.linspace(0.1, 0.45, 5) * min(shape))
+        )
+        self.image.put(np.zeros(shape))
+
+    def trigger_segments(self):
+        """Modelled ``(phase, duration)`` pieces of one trigger, in order."""
+        num_frame = self.images_per_set.get()
+        wait = max(self.cam.busy_until - self.clock.model_time(), 0)
+        return [
+            ("detector", wait + self.timing["trigger_overhead"]),
+            ("exposure", num_frame * self.cam.acquire_time.get()),
+            ("detector", num_frame * self.timing["frame_readout"]),
+        ]
+
+    def trigger_time(self):
+        return sum(dt for _, dt in self.trigger_segments())
+
+    def stage(self):
+        # opening the file writers is not free
+        ttime.sleep(self.clock.charge(self.timing["detector_stage"], "detector"))
+        return super().stage()
+
+    def trigger(self):
+        exposure = self.images_per_set.get() * self.cam.acquire_time.get()
+        scale = exposure * (self.intensity() if self.intensity is not None else 1.0)
+
+        def _update():
+            self.image.put(self._rng.poisson(self._rings * max(scale, 0)).astype(float))
+
+        delay = sum(self.clock.charge(dt, phase) for phase, dt in self.trigger_segments())
+        return _finish_later(DeviceStatus(self), delay, _update)
+
+
+class SimActuator(Signal):
+    """Two-state actuator (filter blade, fast shutter) with a switching latency."""
+
+    def __init__(self, *args, latency_key, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency_key = latency_key
+        self.clock = None
+        self.timing = None
+
+    def _root(self):
+        obj = self
+        while getattr(obj, "clock", None) is None and obj.parent is not None:
+            obj = obj.parent
+        return obj
+
+    @property
+    def phase(self):
+        return self.latency_key.split("_")[0]
+
+    def switch_time(self, value):
+        """Modelled time to switch to *value*."""
+        return self._root().timing[self.latency_key] if value != self.get() else 0.0
+
+    def set(self, value, **kwargs):
+        delay = self._root().clock.charge(self.switch_time(value), self.phase)
+        return _finish_later(Status(obj=self), delay, functools.partial(self.put, value))
+
+
+class SimFilterBank(Device):
+    flt1 = Cpt(SimActuator, value="Out", latency_key="filter_latency")
+    flt2 = Cpt(SimActuator, value="Out", latency_key="filter_latency")
+    flt3 = Cpt(SimActuator, value="Out", latency_key="filter_latency")
+    flt4 = Cpt(SimActuator, value="Out", latency_key="filter_latency")
+
+    def __init__(self, *args, clock, timing, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.clock = clock
+        self.timing = timing
+
+
+class _TemperatureReadback(Signal):
+    def get(self, **kwargs):
+        return self.parent.temperature()
+
+
+class SimTemperatureController(Device):
+    """
+    Temperature controller ramping linearly towards its setpoint.
+
+    The readback follows ``ramp_rate`` (K/min) in model time; a ``set``
+    completes once the ramp plus ``temp_settle`` is over.  ``power`` is a
+    crude proportional model of the heater output in percent.
+    """
+
+    readback = Cpt(_TemperatureReadback, value=0.0, kind="hinted")
+    setpoint = Cpt(Signal, value=300.0, kind="normal")
+    power = Cpt(Signal, value=0.0, kind="normal")
+
+    def __init__(self, *args, clock, timing, value=300.0, ambient=300.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.clock = clock
+        self.timing = timing
+        self.ambient = ambient
+        self.readback.name = self.name
+        self.setpoint.put(value)
+        self._ramp = (self.clock.model_time(), value, value)
+
+    @property
+    def ramp_rate(self):
+        """Ramp rate in K/s."""
+        return self.timing["ramp_rate"] / 60.0
+
+    def temperature(self):
+        t_set, t_from, t_to = self._ramp
+        if self.clock.instant:
+            return t_to
+        span = t_to - t_from
+        elapsed = self.clock.model_time() - t_set
+        if elapsed * self.ramp_rate >= abs(span):
+            return t_to
+        return t_from + np.sign(span) * self.ramp_rate * elapsed
+
+    def ramp_time(self, target):
+        """Modelled time to reach and settle at *target*."""
+        distance = abs(target - self.temperature())
+        if distance == 0:
+            return 0.0
+        return distance / self.ramp_rate + self.timing["temp_settle"]
+
+    @property
+    def position(self):
+        return self.temperature()
+
+    def get(self, **kwargs):
+        return self.temperature()
+
+    def set(self, value):
+        duration = self.ramp_time(value)
+        self._ramp = (self.clock.model_time(), self.temperature(), value)
+        self.setpoint.put(value)
+        self.power.put(float(np.clip((value - self.ambient) / 10.0, 0, 100)))
+        return _finish_later(DeviceStatus(self), self.clock.charge(duration, "temperature"))
+
+    def move(self, position, wait=True, timeout=None):
+        st = self.set(position)
+        if wait:
+            st.wait(timeout)
+        return st
+
+    def stop(self, *, success=False):
+        self._ramp = (self.clock.model_time(), self.temperature(), self.temperature())
+
+
+class SimHeader:
+    """Just enough of a databroker header for ``save_tb_xlsx``."""
+
+    def __init__(self, start):
+        self.start = start
+        self.stop = {}
+        self.descriptors = []
+        self._events = {}
+
+    @property
+    def stream_names(self):
+        return sorted({d.get("name", "primary") for d in self.descriptors})
+
+    def table(self, stream_name="primary"):
+        rows = []
+        for desc in self.descriptors:
+            if desc.get("name", "primary") != stream_name:
+                continue
+            for ev in self._events.get(desc["uid"], []):
+                row = {"seq_num": ev["seq_num"], "time": pd.Timestamp(ev["time"], unit="s")}
+                row.update({k: v for k, v in ev["data"].items() if np.ndim(v) == 0})
+                rows.append(row)
+        if not rows:
+            raise IndexError(f"no events in stream {stream_name!r}")
+        return pd.DataFrame(rows).set_index("seq_num")
+
+
+class SimBroker:
+    """
+    In-memory stand-in for ``db``, fed by subscribing :meth:`insert` to the
+    RunEngine.
+
+    Supports ``db[uid]``, ``db[-1]`` and ``db(since=..., until=...)`` with the
+    ``'%Y-%m-%d %H:%M:%S'`` strings used by ``save_tb_xlsx``.
+    """
+
+    def __init__(self):
+        self._headers = OrderedDict()
+        self._by_descriptor = {}
+
+    def insert(self, name, doc):
+        if name == "start":
+            self._headers[doc["uid"]] = SimHeader(doc)
+        elif name == "descriptor":
+            hdr = self._headers[doc["run_start"]]
+            hdr.descriptors.append(doc)
+            self._by_descriptor[doc["uid"]] = hdr
+        elif name == "event":
+            self._by_descriptor[doc["descriptor"]]._events.setdefault(doc["descriptor"], []).append(doc)
+        elif name == "stop":
+            self._headers[doc["run_start"]].stop = doc
+
+    def __call__(self, since=None, until=None):
+        def _ts(s):
+            return datetime.datetime.strptime(s, "%Y-%m-%d %H:%M:%S").timestamp()
+
+        lo = -np.inf if since is None else _ts(since)
+        hi = np.inf if until is None else _ts(until) + 1
+        return [h for h in self._headers.values() if lo <= h.start["time"] < hi]
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return list(self._headers.values())[key]
+        return self._headers[key]
+
+    def __len__(self):
+        return len(self._headers)
+
+
+class SimRunEngine(RunEngine):
+    """
+    RunEngine with the ``xrun(sample, plan)`` call signature.
+
+    *plan* is either a plan or the index of a scanplan from *scanplans*;
+    the sample is recorded as ``sample_name`` in the start document.
+    ``sleep`` messages follow *clock*, like the devices do.
+    """
+
+    def __init__(self, *args, clock, scanplans=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.clock = clock
+        self.scanplans = scanplans or {}
+
+    async def _sleep(self, msg):
+        await asyncio.sleep(self.clock.charge(msg.args[0], "sleep"))
+
+    def __call__(self, sample, plan, subs=None, **metadata_kw):
+        if isinstance(plan, int):
+            try:
+                plan = self.scanplans[plan]()
+            except KeyError:
+                raise KeyError(f"unknown scanplan index {plan}, known: {sorted(self.scanplans)}")
+        metadata_kw.setdefault("sample_name", str(sample))
+        return super().__call__(plan, subs, **metadata_kw)
+
+
+def make_sim_beamline(scale=1.0, timing=None, clock=None):
+    """
+    Create the simulated devices and xpdacq helpers.
+
+    Parameters:
+        scale (float): wall-clock seconds spent per modelled second, see `SimClock`.
+        timing (dict, optional): overrides for `SIM_TIMING`.
+        clock (SimClock, optional): clock to use instead of ``SimClock(scale)``.
+
+    Returns:
+        dict: name -> object, ready to be merged into a profile namespace.
+    """
+    timing = dict(SIM_TIMING, **(timing or {}))
+    if clock is None:
+        clock = SimClock(scale)
+
+    def _motor(name):
+        return SimMotor(name=name, clock=clock, velocity=timing[f"{name}_velocity"],
+                        settle_time=timing["motor_settle"])
+
+    sample_x, sample_y, pe1_x, pe1_z = (_motor(n) for n in ("sample_x", "sample_y", "pe1_x", "pe1_z"))
+    pe1c = SimAreaDetector(name="pe1c", clock=clock, timing=timing)
+    pe2c = SimAreaDetector(name="pe2c", clock=clock, timing=timing)
+    fb = SimFilterBank(name="fb", clock=clock, timing=timing)
+    fs = SimActuator(name="fs", value="Close", latency_key="shutter_latency")
+    fs.clock, fs.timing = clock, timing
+    eurotherm = SimTemperatureController(name="eurotherm", clock=clock, timing=timing)
+
+    glbl = {
+        "frame_acq_time": 0.2,
+        "dk_window": 1000,
+        "auto_load_calib": True,
+        "shutter_conf": {"open": "Open", "close": "Close"},
+    }
+    xpd_configuration = {"area_det": pe1c, "shutter": fs, "temp_controller": eurotherm}
+
+    def configure_area_det(det, exposure, acq_time=None):
+        if acq_time is None:
+            acq_time = glbl["frame_acq_time"]
+        num_frame = max(int(np.ceil(exposure / acq_time)), 1)
+        yield from bps.abs_set(det.cam.acquire_time, acq_time, wait=True)
+        yield from bps.abs_set(det.images_per_set, num_frame, wait=True)
+        return num_frame, acq_time, num_frame * acq_time
+
+    def _configure_area_det(exposure):
+        return (yield from configure_area_det(xpd_configuration["area_det"], exposure))
+
+    def open_shutter_stub():
+        yield from bps.abs_set(xpd_configuration["shutter"], glbl["shutter_conf"]["open"], wait=True)
+
+    def close_shutter_stub():
+        yield from bps.abs_set(xpd_configuration["shutter"], glbl["shutter_conf"]["close"], wait=True)
+
+    def inner_shutter_control(msg):
+        if msg.command == "trigger":
+            def inner():
+                yield from open_shutter_stub()
+                yield msg
+            return inner(), None
+        elif msg.command == "save":
+            return None, close_shutter_stub()
+        return None, None
+
+    def load_calibration_md(poni_file):
+        return {"poni_file": poni_file}
+
+    def ct(exposure, num=1):
+        yield from _configure_area_det(exposure)
+        plan = bp.count([xpd_configuration["area_det"]], num)
+        yield from bpp.plan_mutator(plan, inner_shutter_control)
+
+    db = SimBroker()
+    xrun = SimRunEngine({}, clock=clock, scanplans={i: functools.partial(ct, exp) for i, exp in enumerate(DEFAULT_SCANPLANS)})
+    xrun.subscribe(db.insert)
+
+    return dict(
+        sim_clock=clock, sim_timing=timing,
+        sample_x=sample_x, sample_y=sample_y, pe1_x=pe1_x, pe1_z=pe1_z,
+        pe1c=pe1c, pe2c=pe2c, fb=fb, fs=fs, eurotherm=eurotherm,
+        glbl=glbl, xpd_configuration=xpd_configuration, xrun=xrun, db=db,
+        configure_area_det=configure_area_det, _configure_area_det=_configure_area_det,
+        open_shutter_stub=open_shutter_stub, close_shutter_stub=close_shutter_stub,
+        inner_shutter_control=inner_shutter_control, load_calibration_md=load_calibration_md,
+    )
+
+
+def _read_script(fname):
+    with open(fname) as f:
+        src = f.read()
+    # profile scripts may use IPython magics, e.g. %history; tokenizing is
+    # slow, so only transform the scripts that have any
+    if not re.search(r"^\s*%", src, re.MULTILINE):
+        return src
+    try:
+        from IPython.core.inputtransformer2 import TransformerManager
+    except ImportError:
+        return src
+    return TransformerManager().transform_cell(src)
+
+
+def load_sim_profile(scripts=(), ns=None, scale=1.0, timing=None, workdir=None, clock=None):
+    """
+    Build the simulated beamline and load the xpdplans package into *ns*.
+
+    ``xpdplans.bl`` is configured with the simulated objects (use
+    ``bl.preserved()`` to get the previous configuration back afterwards).
+
+    Parameters:
+        scripts (iterable): further profile scripts to execute into *ns*, relative to this directory.
+        ns (dict, optional): namespace to load into, e.g. ``globals()`` in IPython. Default is a new dict.
+        scale (float): wall-clock seconds per modelled second, see `SimClock`.
+        timing (dict, optional): overrides for `SIM_TIMING`.
+        workdir (str, optional): directory to chdir into; ``tiff_base``, ``Import`` and ``config_base``
+            are created there for the drivers that write files.
+        clock (SimClock, optional): clock to use instead of ``SimClock(scale)``.
+
+    Returns:
+        dict: the populated namespace.
+    """
+    import xpdplans
+
+    if ns is None:
+        ns = {}
+    if workdir is not None:
+        for sub in ("tiff_base", "Import", "config_base"):
+            os.makedirs(os.path.join(workdir, sub), exist_ok=True)
+        os.chdir(workdir)
+
+    sim = make_sim_beamline(scale=scale, timing=timing, clock=clock)
+    ns.update(
+        bp=bp, bps=bps, bpp=bpp, np=np, pd=pd, datetime=datetime, os=os, typing=typing,
+        logging=logging, LiveTable=LiveTable, RE=sim["xrun"],
+    )
+    ns.update(sim)
+    # the drivers sleep on bl.clock, so their sleeps follow the same scale
+    xpdplans.load(ns, clock=sim["sim_clock"])
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for script in scripts:
+        fname = os.path.join(here, script)
+        exec(compile(_read_script(fname), fname, "exec"), ns)
+    # scripts that `import time` sleep on the sim clock as well
+    ns["time"] = sim["sim_clock"]
+    return ns
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    ns = load_sim_profile(scale=0.01, workdir=tempfile.mkdtemp(prefix="xpd_sim_"))
+    t0 = ttime.time()
+    ns["xpd_mscan"]([1, 2, 3], [10, 20, 30], 0)
+    print(f"xpd_mscan on 3 samples: {ttime.time() - t0:.2f} s wall, scale {ns['sim_clock'].scale}")
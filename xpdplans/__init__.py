@@ -0,0 +1,80 @@
+"""
+XPD user plans and drivers, one implementation of each.
+
+    plans          count, line, grid and position plans, filter bank, xlsx export
+    live_roi       live ROI reduction of the area detector frames
+    shutter        fast shutter control of the scan plans
+    staging        keep the detectors staged across the runs of a batch
+    align          find the samples on the holder
+    mscan_run      multi-sample, battery, line and grid scan drivers
+    temp_runs      temperature drivers, with temp_schedule and temp_log
+    mrun_2det      two-detector PDF + XRD drivers, with geometry for the PE1 moves
+    flyscan        XRD map fly-scan
+    job_queue      resumable batches
+    sample_table   batches driven by the sample sheet
+    status         batch progress and ETA over HTTP
+    job_server     queue server running JSON jobs in the session (not in `namespace`)
+
+The beamline objects (motors, detectors, ``xrun``, ``db``, ...) are not
+globals any more but come from `bl`, see `xpdplans.beamline`.  In the IPython
+profile `load` configures `bl` from the profile namespace and puts every plan
+and driver into that namespace, so they are called as before:
+
+    import xpdplans
+    xpdplans.load(globals())
+    xpd_mscan([1, 2, 3], [10, 20, 30], 0)
+
+Outside the profile, import what you need and configure `bl` yourself:
+
+    from xpdplans import bl
+    from xpdplans.mscan_run import xpd_mscan
+    bl.configure(xrun=xrun, sample_x=sample_x, fb=fb)
+"""
+import importlib
+import inspect
+
+from .beamline import Beamline, bl
+
+# submodules, loaded by `namespace` in this order
+MODULES = (
+    "status", "live_roi", "shutter", "plans", "staging", "align", "job_queue", "mscan_run", "temp_schedule",
+    "temp_log", "temp_runs", "geometry", "mrun_2det", "flyscan", "sample_table",
+)
+
+
+def public_names(module):
+    """The public functions, classes and settings defined in *module* (not the ones it imports)."""
+    return {
+        name: value for name, value in vars(module).items()
+        if not name.startswith("_") and not inspect.ismodule(value)
+        and getattr(value, "__module__", module.__name__) == module.__name__
+    }
+
+
+def namespace():
+    """Every plan and driver of the package by name, plus `bl`."""
+    ns = {"bl": bl}
+    for name in MODULES:
+        ns.update(public_names(importlib.import_module(f"{__name__}.{name}")))
+    return ns
+
+
+def load(ns=None, **objects):
+    """
+    Configure `bl` from *ns* and put every plan and driver into *ns*.
+
+    Parameters:
+        ns (dict, optional): the profile namespace, e.g. ``globals()``. Default is a new dict.
+        **objects: beamline objects to configure in addition, see `Beamline.configure`.
+
+    Returns:
+        dict: *ns*.
+    """
+    bl.configure(ns, **objects)
+    if ns is None:
+        ns = {}
+    ns.update(namespace())
+    missing = bl.missing()
+    if missing:
+        print(f"xpdplans: beamline objects not configured yet: {', '.join(missing)}")
+    return ns
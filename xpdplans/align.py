@@ -0,0 +1,257 @@
+"""
+Sample holder alignment: find the samples on the holder instead of typing
+in their positions.
+
+`find_samples` scans the holder coarsely along ``sample_x``, finds where
+the signal crosses half way between its background and sample level, and
+returns the slot centres; with a y range it also scans ``sample_y`` across
+every slot found and returns the y centres too.  `locate_samples` runs it
+and can write the positions to the sample sheet, so the usual sequence is
+
+    pos = locate_samples(0, 1, 0, 100, 201, smpl_list=[1, 2, 3, 4], filename='300001_sample.xlsx',
+                         metric=pe1c.stats1.total)
+    xpd_mscan([1, 2, 3, 4], pos, 0)
+
+The signal is *metric*, e.g. the total of a stats plugin of the area
+detector, where the samples show up as peaks.  For a transmission signal
+(a diode, the beam stop current), where they show up as dips, pass it
+with ``invert=True``.  Without a metric the area detector image is
+summed, which only works for a detector returning its image in the
+readings (the simulated one); otherwise `find_samples` fails before the
+run starts.
+"""
+import numpy as np
+import bluesky.plan_stubs as bps
+import bluesky.preprocessors as bpp
+from bluesky.callbacks import LiveTable
+
+from .beamline import bl
+from .plans import _scorer, save_position_to_sample_list
+from .shutter import shutter_policy
+
+
+def _normalised(signal, invert, contrast):
+    """*signal* (..., n) scaled to 0 (background) .. 1 (sample) along the last axis; NaN rows without contrast."""
+    signal = -np.asarray(signal, dtype=float) if invert else np.asarray(signal, dtype=float)
+    low = signal.min(axis=-1, keepdims=True)
+    span = np.ptp(signal, axis=-1, keepdims=True)
+    flat = span <= contrast * np.abs(signal).max(axis=-1, keepdims=True)
+    return np.where(flat, np.nan, (signal - low) / np.where(span > 0, span, 1))
+
+
+def find_edges(positions, signal, level=0.5, invert=False, min_width=0.0, contrast=0.05):
+    """
+    The edges of every sample in a line profile, all slots at once.
+
+    An edge is where the normalised signal crosses *level*, interpolated
+    linearly between the two points around it.  Samples cut by the ends of
+    the scan are left out, as their centre is not known.
+
+    Parameters:
+        positions (array): motor positions of the profile.
+        signal (array): signal at *positions*.
+        level (float): crossing level, 0 is the background and 1 the highest sample signal.
+        invert (bool): samples lower the signal, as in transmission.
+        min_width (float): narrower segments (noise, holder features) are left out.
+        contrast (float): smallest (highest - lowest) / highest signal that counts as a sample rather than noise.
+
+    Returns:
+        array: ``(n, 2)`` left and right edge of each sample, in motor units, in increasing position.
+
+    Example:
+        edges = find_edges(x, counts)
+        centres = edges.mean(axis=1)
+    """
+    positions = np.asarray(positions, dtype=float)
+    order = np.argsort(positions)
+    positions = positions[order]
+    norm = _normalised(np.asarray(signal)[order], invert, contrast)
+    if np.isnan(norm).any():
+        return np.empty((0, 2))
+
+    above = norm >= level
+    i = np.flatnonzero(above[1:] != above[:-1])
+    frac = (level - norm[i]) / (norm[i + 1] - norm[i])
+    crossing = positions[i] + frac * (positions[i + 1] - positions[i])
+    rising = above[i + 1]
+    # crossings alternate; drop a leading falling and a trailing rising one (samples cut by the scan ends)
+    start = int(len(rising) > 0 and not rising[0])
+    stop = len(rising) - int(len(rising) > start and rising[-1])
+    edges = crossing[start:stop].reshape(-1, 2)
+    return edges[edges[:, 1] - edges[:, 0] >= min_width]
+
+
+def find_extents(positions, signals, level=0.5, invert=False, contrast=0.05):
+    """
+    Outer edges of the sample in each of several line profiles, all profiles at once.
+
+    Parameters:
+        positions (array): motor positions, shared by the profiles.
+        signals (array): ``(n, len(positions))``, one profile per row.
+        level, invert, contrast: as for `find_edges`.
+
+    Returns:
+        array: ``(n, 2)`` first and last crossing of *level* in each row; the scan ends where the sample
+        reaches past them, NaN for a row without contrast.
+    """
+    positions = np.asarray(positions, dtype=float)
+    order = np.argsort(positions)
+    positions = positions[order]
+    norm = _normalised(np.atleast_2d(signals)[:, order], invert, contrast)
+    rows = np.arange(len(norm))
+    above = norm >= level
+    first = np.argmax(above, axis=1)
+    last = norm.shape[1] - 1 - np.argmax(above[:, ::-1], axis=1)
+
+    def crossing(inside, outside):
+        # interpolate between the last point on the sample and the first one off it
+        outside = np.clip(outside, 0, len(positions) - 1)
+        a, b = norm[rows, inside], norm[rows, outside]
+        frac = np.where(a != b, (a - level) / np.where(a != b, a - b, 1), 0)
+        return positions[inside] + frac * (positions[outside] - positions[inside])
+
+    extents = np.stack([crossing(first, first - 1), crossing(last, last + 1)], axis=1)
+    extents[np.isnan(norm).any(axis=1)] = np.nan
+    return extents
+
+
+def find_samples(exp_time, xstart, xend, xpoints, ystart=None, yend=None, ypoints=None, motorx=None, motory=None,
+                 metric=None, invert=False, level=0.5, min_width=0.0, contrast=0.05, nslots=None, md=None,
+                 det=None):
+    """ plan to locate the samples on the holder with a coarse line scan along x, and optionally y.
+
+    The x profile is measured in the primary stream and the samples are found in it with `find_edges`.
+    With a y range, y is then scanned at the centre of every sample found, in a ``y_profile`` stream,
+    and the y centres are found with `find_extents`.  Everything goes into one run.
+
+    Parameters:
+        exp_time (float): Total exposure time (in seconds) for each point; short, this is only for alignment.
+        xstart (float): Starting position of the x scan.
+        xend (float): Ending position of the x scan.
+        xpoints (int): Number of points of the x scan; the step should be well below the sample width.
+        ystart, yend, ypoints (optional): the y scan across each sample; default is no y scan.
+        motorx (object, optional): Motor object moving the holder along x. Default is `sample_x`.
+        motory (object, optional): Motor object moving the holder along y. Default is `sample_y`.
+        metric (optional): the signal, as for `adaptive_gridplan`, e.g. ``pe1c.stats1.total``; default is the
+            area detector image sum, only possible if the image is in the readings (checked before the run).
+        invert (bool): samples lower the signal, e.g. a transmission diode as *metric*.
+        level (float): edge level between background (0) and sample (1).
+        min_width (float): samples narrower than this (in x motor units) are left out.
+        contrast (float): smallest relative signal range that counts as a sample rather than noise.
+        nslots (int, optional): number of samples expected; a different number found is reported.
+        md (dict, optional): Additional metadata to attach to the scan.
+        det (list, optional): List of extra detectors to record during the scan.
+
+    Returns:
+        list of x centres, or ``(x centres, y centres)`` with a y scan, one per sample in increasing x.
+
+    Example:
+        find_samples(1, 0, 100, 201, ystart=-2, yend=2, ypoints=21, metric=pe1c.stats1.total)
+    """
+    if motorx is None:
+        motorx = bl.sample_x
+    if motory is None:
+        motory = bl.sample_y
+    if det is None:
+        det = []
+    scan_y = ypoints is not None
+    if scan_y and (ystart is None or yend is None):
+        raise ValueError("ystart and yend must be given with ypoints")
+    area_det = bl.xpd_configuration['area_det']
+    dets = [area_det] + det
+    if metric is not None and hasattr(metric, 'read') and metric not in dets:
+        dets.append(metric)
+    score = _scorer(metric, area_det)
+
+    (num_frame, acq_time, computed_exposure) = yield from bl._configure_area_det(exp_time)
+    _md = {
+        "sp_time_per_frame": acq_time,
+        "sp_num_frames": num_frame,
+        "sp_requested_exposure": exp_time,
+        "sp_computed_exposure": computed_exposure,
+        "plan_name": "find_samples",
+        "detectors": [d.name for d in dets],
+        "motors": [motorx.name, motory.name],
+        "find_samples": dict(x=[xstart, xend, xpoints], y=[ystart, yend, ypoints] if scan_y else None,
+                             invert=invert, level=level, min_width=min_width, contrast=contrast, nslots=nslots),
+    }
+    _md.update(md or {})
+
+    def measure(motor, positions, stream):
+        values = []
+        for pos in positions:
+            yield from bps.mv(motor, pos)
+            reading = yield from bps.trigger_and_read(dets + [motorx, motory], name=stream)
+            values.append(score(reading))
+        return np.array(values)
+
+    found = {}
+
+    @bpp.stage_decorator(dets)
+    @bpp.run_decorator(md=_md)
+    def inner():
+        xs = np.linspace(xstart, xend, xpoints)
+        edges = find_edges(xs, (yield from measure(motorx, xs, 'primary')), level, invert, min_width, contrast)
+        xcentres = edges.mean(axis=1)
+        print(f'found {len(edges)} samples' + (f', {nslots} expected' if nslots is not None else ''))
+        for i, (left, right) in enumerate(edges):
+            print(f'  {i}: x = {(left + right) / 2:.3f}  width {right - left:.3f}')
+        found['x'] = [float(x) for x in xcentres]
+        if not scan_y:
+            return
+
+        ys = np.linspace(ystart, yend, ypoints)
+        profiles = np.empty((len(xcentres), len(ys)))
+        for i, x in enumerate(xcentres):
+            # snake, so y does not run back to the start for every sample
+            yorder = slice(None) if i % 2 == 0 else slice(None, None, -1)
+            yield from bps.mv(motorx, x)
+            profiles[i, yorder] = yield from measure(motory, ys[yorder], 'y_profile')
+        ycentres = find_extents(ys, profiles, level, invert, contrast).mean(axis=1)
+        for i, y in enumerate(ycentres):
+            print(f'  {i}: y = {y:.3f}')
+        found['y'] = [float(y) for y in ycentres]
+
+    # run_decorator returns the run uid, so the positions are passed out through found
+    yield from bpp.subs_wrapper(shutter_policy.wrap(inner()), LiveTable([motorx, motory] + det))
+    return (found['x'], found['y']) if scan_y else found['x']
+
+
+def locate_samples(smpl, exp_time, xstart, xend, xpoints, smpl_list=None, filename=None, **kwargs):
+    """ Run `find_samples` and return the sample positions, optionally writing them to the sample sheet.
+
+    Parameters:
+        smpl (int): Sample ID the alignment run is recorded under, e.g. the empty holder or the first sample.
+        exp_time, xstart, xend, xpoints: the x scan, see `find_samples`.
+        smpl_list (list, optional): sample indices on the holder, in increasing x; needed with *filename*.
+        filename (str, optional): sample sheet in ./Import/ to add 'pos=<x>' to, see `save_position_to_sample_list`.
+            Nothing is written unless exactly one sample was found per entry of *smpl_list*.
+        **kwargs: any other parameter of `find_samples`, e.g. the y scan or ``metric``.
+
+    Returns:
+        list of x positions, or ``(x positions, y positions)`` with a y scan; ready for `xpd_mscan`,
+        `mrun_2det_batch` or `xpd_m2dscan`.
+
+    Example:
+        >>> pos = locate_samples(0, 1, 0, 100, 201, smpl_list=[1, 2, 3, 4], filename='300001_sample.xlsx',
+        ...                      metric=pe1c.stats1.total)
+        >>> xpd_mscan([1, 2, 3, 4], pos, 0)
+    """
+    if filename is not None and smpl_list is None:
+        raise ValueError("smpl_list must be given with filename")
+    if smpl_list is not None:
+        kwargs.setdefault('nslots', len(smpl_list))
+    found = {}
+
+    def plan():
+        found['positions'] = yield from find_samples(exp_time, xstart, xend, xpoints, **kwargs)
+
+    bl.xrun(smpl, plan())
+    positions = found['positions']
+    xpos = positions[0] if isinstance(positions, tuple) else positions
+    if filename is not None:
+        if len(xpos) != len(smpl_list):
+            print(f'{len(xpos)} samples found for {len(smpl_list)} in smpl_list, {filename} not updated')
+        else:
+            save_position_to_sample_list(smpl_list, [round(x, 3) for x in xpos], filename)
+    return positions
@@ -0,0 +1,93 @@
+"""
+Beamline objects used by the plans and drivers.
+
+The plans used to find ``sample_x``, ``xrun``, ``xpd_configuration``, ... as
+globals of the IPython profile, which only worked if the scripts were
+executed into that namespace.  They now look them up on `bl`, which is
+configured once when the package is loaded:
+
+    from xpdplans import bl
+    bl.configure(globals())             # everything the profile defines
+    bl.configure(sample_x=my_stage)     # or single objects
+
+xpdacq helpers that were not configured are imported from
+``xpdacq.beamtime`` on first use, and ``bl.clock`` (used for every
+``sleep`` and timestamp in the drivers) is the `time` module unless
+configured otherwise, e.g. with the simulated clock of ``sim_profile``.
+"""
+import contextlib
+import importlib
+import time
+
+# objects the profile has to provide
+NAMES = (
+    "xrun", "db", "glbl", "xpd_configuration", "fb",
+    "pe1c", "pe2c", "pe1_x", "pe1_z", "sample_x", "sample_y",
+)
+
+# name -> module providing it when it is not configured
+DEFAULTS = {
+    "_configure_area_det": "xpdacq.beamtime",
+    "configure_area_det": "xpdacq.beamtime",
+    "open_shutter_stub": "xpdacq.beamtime",
+    "close_shutter_stub": "xpdacq.beamtime",
+    "inner_shutter_control": "xpdacq.beamtime",
+    "load_calibration_md": "xpdacq.beamtime",
+}
+
+
+class Beamline:
+    """
+    Registry of the beamline objects, read as attributes: ``bl.sample_x``.
+
+    Raises AttributeError naming the object if it was never configured.
+    """
+
+    def __init__(self):
+        self._objects = {"clock": time}
+
+    def configure(self, ns=None, **objects):
+        """
+        Set beamline objects.
+
+        Parameters:
+            ns (dict, optional): namespace to take every known name from, e.g. ``globals()``.
+            **objects: objects by name; these win over *ns*.
+        """
+        if ns is not None:
+            known = NAMES + tuple(DEFAULTS) + ("clock",)
+            objects = dict({k: ns[k] for k in known if k in ns}, **objects)
+        self._objects.update(objects)
+        return self
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        try:
+            return self._objects[name]
+        except KeyError:
+            pass
+        if name in DEFAULTS:
+            value = getattr(importlib.import_module(DEFAULTS[name]), name)
+            self._objects[name] = value
+            return value
+        raise AttributeError(f"beamline object {name!r} is not configured, use bl.configure({name}=...)")
+
+    def missing(self):
+        """Names of the required objects not configured yet."""
+        return [name for name in NAMES if name not in self._objects]
+
+    @contextlib.contextmanager
+    def preserved(self):
+        """Restore the current configuration on exit, e.g. around a simulation."""
+        saved = dict(self._objects)
+        try:
+            yield self
+        finally:
+            self._objects = saved
+
+    def __repr__(self):
+        return f"Beamline({', '.join(sorted(self._objects))})"
+
+
+bl = Beamline()
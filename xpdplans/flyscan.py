@@ -0,0 +1,489 @@
+"""Plan to run a XRD map "fly-scan" over a large sample."""
+import datetime
+import pprint
+import time as ttime
+import uuid
+from collections import deque
+
+import numpy as np
+import itertools
+import bluesky.preprocessors as bpp
+import bluesky.plan_stubs as bps
+import bluesky.plans as bp
+from bluesky.callbacks.core import CallbackBase
+from bluesky.utils import short_uid
+
+import event_model
+from ophyd import Signal
+from ophyd.status import Status
+
+from .beamline import bl
+
+
+# vendored, simplified, and made public from bluesky_darkframes
+class SnapshotShell:
+    """
+    Shell to hold snapshots
+    This enables us to hot-swap Snapshot instances in the middle of a Run.
+    We hand this object to the RunEngine, so it sees one consistent
+    instance throughout the Run.
+    """
+
+    def __init__(self):
+        self.__snapshot = None
+
+    def set_snaphsot(self, snapshot):
+        self.__snapshot = snapshot
+
+    def __getattr__(self, key):
+        return getattr(self.__snapshot, key)
+
+
+class EventPager:
+    """
+    Re-pack a run's events into event pages before handing them on.
+
+    Events are held only until *page_size* of them have arrived for a
+    stream (or the run ends) and are then passed to *callback* as a single
+    ``event_page`` document.  All other documents are forwarded unchanged.
+    The memory held here is bounded by *page_size* regardless of the size
+    of the map, and downstream consumers are called once per page instead
+    of once per pixel.
+    """
+
+    def __init__(self, callback, page_size=100):
+        if page_size < 1:
+            raise ValueError("page_size must be a positive integer")
+        self.callback = callback
+        self.page_size = page_size
+        self._pending = {}
+
+    def __call__(self, name, doc):
+        if name == "event":
+            pending = self._pending.setdefault(doc["descriptor"], [])
+            pending.append(doc)
+            if len(pending) >= self.page_size:
+                self._flush(doc["descriptor"])
+            return
+        if name == "event_page":
+            self._flush(doc["descriptor"])
+        elif name == "stop":
+            for descriptor in list(self._pending):
+                self._flush(descriptor)
+        self.callback(name, doc)
+
+    def _flush(self, descriptor):
+        pending = self._pending.pop(descriptor, None)
+        if pending:
+            self.callback("event_page", event_model.pack_event_page(*pending))
+
+
+class LiveRingBuffer(CallbackBase):
+    """
+    Keep the most recent *maxlen* values of *fields* for live display.
+
+    Values are stored in fixed-length ring buffers, so a plotting or table
+    widget polling :meth:`snapshot` sees a flat memory footprint no matter
+    how many pixels the map has.
+
+    Parameters
+    ----------
+    fields : List[str]
+        Data keys to track, e.g. ``["start_sample_x", "stop_sample_x"]``
+    maxlen : int
+        Number of points kept per field
+    stream_name : str
+        Only events from this stream are buffered
+    """
+
+    def __init__(self, fields, maxlen=1000, stream_name="primary"):
+        super().__init__()
+        self.fields = list(fields)
+        self.stream_name = stream_name
+        self.time = deque(maxlen=maxlen)
+        self.seq_num = deque(maxlen=maxlen)
+        self.data = {f: deque(maxlen=maxlen) for f in self.fields}
+        self._descriptors = set()
+
+    def start(self, doc):
+        self.time.clear()
+        self.seq_num.clear()
+        for buf in self.data.values():
+            buf.clear()
+        self._descriptors.clear()
+
+    def descriptor(self, doc):
+        if doc.get("name") == self.stream_name:
+            self._descriptors.add(doc["uid"])
+
+    def event_page(self, doc):
+        if doc["descriptor"] not in self._descriptors:
+            return
+        self.time.extend(doc["time"])
+        self.seq_num.extend(doc["seq_num"])
+        for f, buf in self.data.items():
+            if f in doc["data"]:
+                buf.extend(doc["data"][f])
+
+    def snapshot(self):
+        """Return the buffered values as numpy arrays keyed by field."""
+        out = {"time": np.asarray(self.time), "seq_num": np.asarray(self.seq_num)}
+        out.update({f: np.asarray(buf) for f, buf in self.data.items()})
+        return out
+
+
+class PixelTimer:
+    """
+    Per-pixel timestamps for `xrd_line`.
+
+    One row is kept per pixel holding the wall-clock time at which the plan
+    got control back after each step of the pixel loop:
+
+    ``begin``       start of the pixel
+    ``trigger``     detectors triggered
+    ``start_pos``   fly motor position read after the trigger
+    ``frame_done``  frame acquisition finished
+    ``stop_pos``    fly motor position read after the frame
+    ``saved``       event emitted
+
+    The timestamps live in a preallocated array next to the run rather than
+    in the documents, so recording them costs a few ``time.time()`` calls per
+    pixel.  Use :meth:`summary` / :meth:`report` after the plan is done.
+
+    Example:
+        timer = PixelTimer()
+        RE(xrd_line(dets, fs, sample_x, 0, 10, 100, 0.5, 2, timer=timer))
+        timer.report()
+    """
+
+    stages = ("begin", "trigger", "start_pos", "frame_done", "stop_pos", "saved")
+
+    def __init__(self):
+        self.reset(0)
+
+    def reset(self, num_pixels, dwell_time=None):
+        """Allocate room for *num_pixels* rows and forget previous data."""
+        self.dwell_time = dwell_time
+        self.timestamps = np.full((num_pixels, len(self.stages)), np.nan)
+        self.pass_num = np.full(num_pixels, -1, dtype=int)
+        self._row = -1
+
+    def begin(self, pass_num):
+        """Start a new pixel row belonging to fly pass *pass_num*."""
+        self._row += 1
+        if self._row == len(self.timestamps):
+            # more pixels than announced in reset(); grow geometrically
+            extra = max(len(self.timestamps), 1)
+            self.timestamps = np.vstack([self.timestamps, np.full((extra, len(self.stages)), np.nan)])
+            self.pass_num = np.concatenate([self.pass_num, np.full(extra, -1)])
+        self.pass_num[self._row] = pass_num
+        self.timestamps[self._row, 0] = ttime.time()
+
+    def mark(self, stage):
+        """Record the current time for *stage* of the current pixel."""
+        self.timestamps[self._row, self.stages.index(stage)] = ttime.time()
+
+    def as_dict(self):
+        """Return the recorded rows as arrays keyed by stage name."""
+        n = self._row + 1
+        out = {stage: self.timestamps[:n, i] for i, stage in enumerate(self.stages)}
+        out["pass_num"] = self.pass_num[:n]
+        return out
+
+    def save(self, fname):
+        """Write the recorded rows to an ``.npz`` sidecar file."""
+        np.savez(fname, dwell_time=np.nan if self.dwell_time is None else self.dwell_time, **self.as_dict())
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """
+        Reduce the recorded rows to per-step and per-pixel statistics.
+
+        Returns a dict with the mean time spent in each step of the pixel
+        loop, mean/percentiles of the per-pixel wall time and overhead
+        (wall time minus dwell time), and the effective duty cycle, i.e.
+        the fraction of the fly passes spent exposing.
+        """
+        n = self._row + 1
+        ts = self.timestamps[:n]
+        steps = np.diff(ts, axis=1)
+        pixel_time = ts[:, -1] - ts[:, 0]
+        out = {
+            "num_pixels": n,
+            "dwell_time": self.dwell_time,
+            "step_mean": {stage: float(np.nanmean(steps[:, i])) if n else np.nan
+                          for i, stage in enumerate(self.stages[1:])},
+            "pixel_time_mean": float(np.nanmean(pixel_time)) if n else np.nan,
+            "pixel_time_percentiles": dict(zip(percentiles, np.nanpercentile(pixel_time, percentiles)))
+            if n else {},
+        }
+        if self.dwell_time is not None and n:
+            overhead = pixel_time - self.dwell_time
+            out["overhead_mean"] = float(np.nanmean(overhead))
+            out["overhead_percentiles"] = dict(zip(percentiles, np.nanpercentile(overhead, percentiles)))
+            passes = self.pass_num[:n]
+            wall = sum(np.nanmax(ts[passes == p, -1]) - np.nanmin(ts[passes == p, 0]) for p in np.unique(passes))
+            out["duty_cycle"] = n * self.dwell_time / wall if wall > 0 else np.nan
+        return out
+
+    def report(self):
+        """Print :meth:`summary` in a human readable form."""
+        s = self.summary()
+        print(f"pixels recorded: {s['num_pixels']}, dwell time: {s['dwell_time']}")
+        for stage, t in s["step_mean"].items():
+            print(f"  {stage:>10s}: {t * 1e3:9.2f} ms")
+        print(f"  pixel time: mean {s['pixel_time_mean'] * 1e3:.2f} ms, " +
+              ", ".join(f"p{p} {v * 1e3:.2f} ms" for p, v in s["pixel_time_percentiles"].items()))
+        if "overhead_mean" in s:
+            print(f"  overhead:   mean {s['overhead_mean'] * 1e3:.2f} ms, " +
+                  ", ".join(f"p{p} {v * 1e3:.2f} ms" for p, v in s["overhead_percentiles"].items()))
+            print(f"  duty cycle: {s['duty_cycle']:.1%}")
+        return s
+
+
+def _extract_motor_pos(mtr):
+    ret = yield from bps.read(mtr)
+    if ret is None:
+        return None
+    return next(
+        itertools.chain(
+            (ret[k]["value"] for k in mtr.hints.get("fields", [])),
+            (v["value"] for v in ret.values()),
+        )
+    )
+
+
+def xrd_line(
+    dets,
+    shutter,
+    fly_motor,
+    fly_start,
+    fly_stop,
+    fly_pixels,
+    dwell_time,
+    repeats,
+    *,
+    dark_plan=None,
+    md=None,
+    backoff=0,
+    snake=True,
+    page_size=None,
+    callbacks=None,
+    timer=None,
+):
+    """
+    Collect a 2D XRD map by "flying" in one direction.
+    Parameters
+    ----------
+    dets : List[OphydObj] area_det is the xpd_configuration['area_det']
+    shutter : Movable  xpd: fs
+        Assumed to have "Open" and "Close" as the commands
+        open : bps.mv(fs, -20)
+        close: bps.mv(fs, 20)
+    fly_motor : Movable
+       The motor that will be moved continuously during collection
+       (aka "flown")
+    fly_start, fly_stop : float
+       The start and stop position of the "fly" direction
+    fly_pixels : int
+       The target number of pixels in the "fly" direction
+
+    dwell_time : float
+       How long in s to dwell in each pixel.  combined with *fly_pixels*
+       this will be used to compute the motor velocity
+    dark_plan : Plan or None
+       The expected signature is ::
+          def dp(det : Detector, shell : SnapshotShell):
+             ...
+        It only needs to handle one detector and is responsible for generating
+        the messages to generate events.  The logic of _if_ a darkframe should
+        be taken is handled else where.
+    md : Optional[Dict[str, Any]]
+       User-supplied meta-data
+    backoff : float
+       How far to move beyond the fly dimensions to get up to speed
+    snake : bool
+       If we should "snake" or "typewriter" the fly axis
+    page_size : Optional[int]
+       If given, the per-pixel events are re-packed into event pages of
+       this many pixels before they reach *callbacks* (see `EventPager`),
+       so consumers only ever hold one page at a time; requires *callbacks*
+    callbacks : Optional[List[Callable]]
+       Document consumers subscribed for the duration of this plan, e.g. a
+       `LiveRingBuffer` for live display
+    timer : Optional[PixelTimer]
+       If given, per-pixel trigger / position-read / frame-done / save
+       timestamps are recorded into it (see `PixelTimer.report`)
+    """
+    # TODO input validation
+    if page_size and not callbacks:
+        raise ValueError("page_size only applies to the callbacks given with it, pass callbacks too")
+    # rename here to use better internal names (!!)
+    req_dwell_time = dwell_time
+    del dwell_time
+    acq_time = bl.glbl['frame_acq_time']
+
+
+    plan_args_cache = {
+        k: v
+        for k, v in locals().items()
+        if k not in ("dets", "fly_motor", "dark_plan", "shutter", "callbacks", "timer")
+    }
+
+    (ad,) = (d for d in dets if hasattr(d, "cam"))
+    #(num_frame, acq_time, computed_dwell_time) = yield from configure_area_det(
+    #    ad, req_dwell_time,acq_time
+    #)
+    (num_frame, acq_time, computed_dwell_time) = yield from bl.configure_area_det(
+        ad, req_dwell_time)
+
+    # set up metadata
+    sp = {
+        "time_per_frame": acq_time,
+        "num_frames": num_frame,
+        "requested_exposure": req_dwell_time,
+        "computed_exposure": computed_dwell_time,
+        "type": "ct",
+        "uid": str(uuid.uuid4()),
+        "plan_name": "map_scan",
+    }
+    _md = {
+        "detectors": [det.name for det in dets],
+        "plan_args": plan_args_cache,
+        "hints": {},
+        "sp": sp,
+        "extents": [(fly_start, fly_stop)],
+        **{f"sp_{k}": v for k, v in sp.items()},
+    }
+    _md.update(md or {})
+    _md["hints"].setdefault(
+        "dimensions",
+        [((f"start_{fly_motor.name}",), "primary")],
+    )
+    #_md["hints"].setdefault(
+    #    "extents", [(fly_start, fly_stop), (step_stop, step_start)],
+    #)
+
+    # soft signal to use for tracking pixel edges
+    # TODO put better metadata on these
+    px_start = Signal(name=f"start_{fly_motor.name}", kind="normal")
+    px_stop = Signal(name=f"stop_{fly_motor.name}", kind="normal")
+
+    # TODO either think more carefully about how to compute this
+    # or get the gating working below.
+    #current_fly_motor_speed = fly_motor.velocity.get()
+    speed = abs(fly_stop - fly_start) / (fly_pixels * computed_dwell_time)
+    print(speed)
+    shell = SnapshotShell()
+    if timer is not None:
+        timer.reset(fly_pixels * repeats, computed_dwell_time)
+
+    @bpp.reset_positions_decorator([fly_motor.velocity])
+    @bpp.set_run_key_decorator(f"xrd_map_{uuid.uuid4()}")
+    @bpp.stage_decorator(dets)
+    @bpp.run_decorator(md=_md)
+    def inner():
+        _fly_start, _fly_stop = fly_start, fly_stop
+        _backoff = backoff
+
+        # yield from bps.mv(fly_motor.velocity, speed)
+        for i in range(repeats):
+            yield from bps.checkpoint()
+            # TODO maybe go to a "move velocity here?
+            yield from bps.mv(fly_motor.velocity, 10)
+            pre_fly_group = short_uid("pre_fly")
+            yield from bps.abs_set(
+                fly_motor, _fly_start - _backoff, group=pre_fly_group
+            )
+            # take the dark while we might be waiting for motor movement
+            if dark_plan:
+                yield from bps.mv(shutter, "Close")
+                yield from bps.sleep(0.5)
+                yield from dark_plan(ad, shell)
+            # wait for the pre-fly motion to stop
+            yield from bps.wait(group=pre_fly_group)
+            yield from bps.mv(shutter, "Open")
+
+            yield from bps.sleep(0.5)
+            yield from bps.mv(fly_motor.velocity, speed)
+            fly_group = short_uid("fly")
+            yield from bps.abs_set(fly_motor, _fly_stop + _backoff, group=fly_group)
+            # TODO gate starting to take data on motor position
+            for j in range(fly_pixels):
+                if timer is not None:
+                    timer.begin(i)
+                fly_pixel_group = short_uid("fly_pixel")
+                for d in dets:
+                    yield from bps.trigger(d, group=fly_pixel_group)
+                if timer is not None:
+                    timer.mark("trigger")
+
+                # grab motor position right after we trigger
+                start_pos = yield from _extract_motor_pos(fly_motor)
+                yield from bps.mv(px_start, start_pos)
+                if timer is not None:
+                    timer.mark("start_pos")
+                # wait for frame to finish
+                yield from bps.wait(group=fly_pixel_group)
+                if timer is not None:
+                    timer.mark("frame_done")
+
+                # grab the motor position
+                stop_pos = yield from _extract_motor_pos(fly_motor)
+                yield from bps.mv(px_stop, stop_pos)
+                if timer is not None:
+                    timer.mark("stop_pos")
+                # generate the event
+                yield from bps.create("primary")
+                for obj in dets + [px_start, px_stop]:
+                    yield from bps.read(obj)
+                yield from bps.save()
+                if timer is not None:
+                    timer.mark("saved")
+            yield from bps.checkpoint()
+            yield from bps.mv(shutter, "Close")
+
+            yield from bps.wait(group=fly_group)
+            yield from bps.checkpoint()
+            if snake:
+                # if snaking, flip these for the next pass through
+                _fly_start, _fly_stop = _fly_stop, _fly_start
+                _backoff = -_backoff
+
+    plan = inner()
+    if callbacks:
+        if callable(callbacks):
+            callbacks = [callbacks]
+        if page_size:
+            callbacks = [EventPager(cb, page_size) for cb in callbacks]
+        plan = bpp.subs_wrapper(plan, callbacks)
+    yield from plan
+
+
+def dark_plan(detector, shell, *, stream_name="dark"):
+    # Restage to ensure that dark frames goes into a separate file.
+    yield from bps.unstage(detector)
+    yield from bps.stage(detector)
+
+    # The `group` parameter passed to trigger MUST start with
+    # bluesky-darkframes-trigger.
+    grp = short_uid("bluesky-darkframes-trigger")
+    yield from bps.trigger(detector, group=grp)
+    yield from bps.wait(grp)
+    yield from bps.read(detector)
+    # only needed once darks are taken, keep it out of profile load
+    import bluesky_darkframes
+
+    snapshot = bluesky_darkframes.SnapshotDevice(detector)
+    shell.set_snaphsot(snapshot)
+
+    # emit the event to the dark stream
+    yield from bps.stage(shell)
+    yield from bps.trigger_and_read(
+        [shell], name=stream_name,
+    )
+    yield from bps.unstage(shell)
+
+    # Restage.
+    yield from bps.unstage(detector)
+    yield from bps.stage(detector)
+
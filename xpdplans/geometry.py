@@ -0,0 +1,137 @@
+"""
+Named PE1 detector positions and the safe way to move between them.
+
+For PDF, PE1 (pe1c) sits close behind the sample; for XRD it is moved out
+of the beam so pe2c sees the pattern.  PE1 may only travel along x with
+``pe1_z`` retracted to at least the safe height, so every change is
+
+    pe1_z -> safe height,  pe1_x -> target x,  pe1_z -> target z
+
+`DetectorGeometry` works that sequence out from where the detector is:
+axes already within *tolerance* of the target are not moved, z is not
+retracted when x does not change or is already high enough, and x and z
+move together when both the start and the end are at or above the safe
+height.  It also makes the matching detector the area detector.
+
+A configuration may serve both detectors, e.g. PE1 parked at an offset
+where it does not shadow the part of pe2c the XRD needs; the combined
+PDF + XRD runs (``run_pdf_xrd``) only run in such a configuration.
+
+    detector_geometry.move_to('xrd')                  # named configuration
+    detector_geometry.move_to('pdf', pos=[0, 250])    # this time at z = 250
+    detector_geometry.at('pdf')                       # True within tolerance
+    detector_geometry.define('pdf_far', 0, 265, 'pe1c')
+    detector_geometry.define('shared', 150, 280, ('pe1c', 'pe2c'))
+"""
+from .beamline import bl
+
+# name -> (pe1_x, pe1_z, area detector)
+CONFIGURATIONS = {
+    "pdf": (0.0, 255.0, "pe1c"),
+    "xrd": (400.0, 280.0, "pe2c"),
+}
+
+
+class DetectorGeometry:
+    """
+    Named configurations of the PE1 stage and the moves between them.
+
+    Parameters:
+        configurations (dict, optional): name -> ``(pe1_x, pe1_z, area_det)``, added to `CONFIGURATIONS`;
+            *area_det* is the name of the beamline detector to use there, or a tuple of the names of
+            the detectors that can all be used there, the first being the area detector.
+        safe_z (float): lowest pe1_z at which pe1_x may move.
+        tolerance (float): distance counted as being in position.
+    """
+
+    def __init__(self, configurations=None, safe_z=280.0, tolerance=0.05):
+        self.configurations = dict(CONFIGURATIONS, **(configurations or {}))
+        self.safe_z = safe_z
+        self.tolerance = tolerance
+
+    def define(self, name, x, z, area_det):
+        """Add or change the configuration *name*."""
+        self.configurations[name] = (float(x), float(z), area_det if isinstance(area_det, str) else tuple(area_det))
+
+    def detectors(self, name):
+        """Names of the detectors usable in configuration *name*."""
+        area_det = self.target(name)[2]
+        return (area_det,) if isinstance(area_det, str) else tuple(area_det)
+
+    def target(self, name, pos=None):
+        """``(x, z, area_det)`` of configuration *name*, with *pos* ``[x, z]`` replacing its position."""
+        try:
+            x, z, area_det = self.configurations[name]
+        except KeyError:
+            raise ValueError(f"unknown detector configuration {name!r}, known: {sorted(self.configurations)}")
+        if pos is not None:
+            x, z = pos
+        return float(x), float(z), area_det
+
+    def position(self):
+        return bl.pe1_x.position, bl.pe1_z.position
+
+    def at(self, name, pos=None):
+        """Whether PE1 is within tolerance of configuration *name*."""
+        x, z, _ = self.target(name, pos)
+        cx, cz = self.position()
+        return abs(cx - x) <= self.tolerance and abs(cz - z) <= self.tolerance
+
+    def where(self):
+        """Name of the configuration PE1 is in, or None."""
+        return next((name for name in self.configurations if self.at(name)), None)
+
+    def path(self, x, z, start=None, safe_z=None):
+        """
+        Moves from *start* (default: the current position) to ``(x, z)``.
+
+        Returns:
+            list: steps, each a dict ``{'pe1_x': x, 'pe1_z': z}`` of the axes that move together.
+        """
+        safe_z = self.safe_z if safe_z is None else safe_z
+        cx, cz = self.position() if start is None else start
+        tol = self.tolerance
+        if abs(cx - x) <= tol:
+            return [{"pe1_z": z}] if abs(cz - z) > tol else []
+        if cz >= safe_z - tol and z >= safe_z - tol:
+            # high enough all the way: one move of both axes
+            step = {"pe1_x": x}
+            if abs(cz - z) > tol:
+                step["pe1_z"] = z
+            return [step]
+        steps = []
+        if cz < safe_z - tol:
+            # retract straight to the target z if that is high enough
+            cz = z if z >= safe_z - tol else safe_z
+            steps.append({"pe1_z": cz})
+        steps.append({"pe1_x": x})
+        if abs(cz - z) > tol:
+            steps.append({"pe1_z": z})
+        return steps
+
+    def move_to(self, name, pos=None, safe_z=None, verbose=True):
+        """
+        Move PE1 to configuration *name* along `path` and make its detector the area detector.
+
+        Parameters:
+            name (str): configuration, e.g. ``'pdf'`` or ``'xrd'``.
+            pos (list, optional): ``[pe1_x, pe1_z]`` to use instead of the configuration's.
+            safe_z (float, optional): safe height for this move instead of :attr:`safe_z`.
+            verbose (bool): print the moves.
+
+        Returns:
+            list: the steps moved, empty if PE1 was already there.
+        """
+        x, z, area_det = self.target(name, pos)
+        steps = self.path(x, z, safe_z=safe_z)
+        for step in steps:
+            if verbose:
+                print(f"{name}: " + ", ".join(f"{axis} -> {value}" for axis, value in step.items()))
+            statuses = [getattr(bl, axis).set(value) for axis, value in step.items()]
+            for status in statuses:
+                status.wait()
+        bl.xpd_configuration['area_det'] = getattr(bl, self.detectors(name)[0])
+        return steps
+
+
+detector_geometry = DetectorGeometry()
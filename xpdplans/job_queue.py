@@ -0,0 +1,97 @@
+"""
+Persistent job queue for the batch drivers.
+
+A batch (``mrun_2det_batch``, ``xpd_battery``) is split into units of work,
+e.g. one sample on one detector in one cycle.  `JobQueue` keeps the units and
+the uids of the finished ones in a json file, rewritten atomically after
+every unit, so when the session dies the same call with the same queue file
+skips everything already measured and resumes at the first unit not done.
+
+Example:
+    xpd_battery([1, 2, 3], [10, 20, 30], 0, cycle=10, queue='config_base/battery.json')
+    # the session dies in cycle 4; restart IPython and repeat the same call
+    xpd_battery([1, 2, 3], [10, 20, 30], 0, cycle=10, queue='config_base/battery.json')
+"""
+import datetime
+import json
+import os
+import tempfile
+
+
+def _plain(value):
+    # numpy scalars -> python scalars, anything else as a string
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class JobQueue:
+    """
+    Units of work of a batch and which of them are done, kept in a json file.
+
+    Parameters:
+        fname (str): queue file; if it exists, the finished units are loaded from it.
+        units (list): one dict per unit of work, in execution order, e.g.
+            ``{'cycle': 0, 'sample': 3, 'posx': 30.0}``.
+
+    Raises:
+        ValueError: if *fname* holds the queue of a different batch.
+    """
+
+    def __init__(self, fname, units):
+        self.fname = fname
+        self.units = [json.loads(json.dumps(unit, default=_plain)) for unit in units]
+        self.done = {}
+        if os.path.exists(fname):
+            self._load()
+            print(f'resuming {fname}: {len(self.done)} of {len(self.units)} done')
+        self.save()
+
+    @staticmethod
+    def key(unit):
+        return json.dumps(unit, sort_keys=True, default=_plain)
+
+    def _load(self):
+        with open(self.fname) as f:
+            state = json.load(f)
+        if [self.key(u) for u in state["units"]] != [self.key(u) for u in self.units]:
+            raise ValueError(f"{self.fname} belongs to a different batch; "
+                             f"use another queue file or delete it to start over")
+        self.done = state["done"]
+
+    def is_done(self, unit):
+        return self.key(unit) in self.done
+
+    def mark_done(self, unit, uids=None):
+        """Record *unit* as finished with the *uids* xrun returned for it."""
+        self.done[self.key(unit)] = {
+            "uids": list(uids or []),
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        self.save()
+
+    def pending(self):
+        """Units not done yet, in order."""
+        return [unit for unit in self.units if not self.is_done(unit)]
+
+    def uids(self):
+        """All uids recorded so far, in unit order."""
+        return [uid for unit in self.units for uid in self.done.get(self.key(unit), {}).get("uids", [])]
+
+    def __len__(self):
+        return len(self.units)
+
+    def save(self):
+        """Write the queue to a temporary file and rename it over :attr:`fname`."""
+        directory = os.path.dirname(os.path.abspath(self.fname))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.fname), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"units": self.units, "done": self.done}, f, indent=1)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.fname)
+        except BaseException:
+            os.unlink(tmp)
+            raise
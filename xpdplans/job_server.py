@@ -0,0 +1,409 @@
+"""
+Queue server: the session runs drivers submitted as JSON jobs over a local socket.
+
+`JobServer.run` turns the IPython session into a worker: it listens on a
+Unix socket in a background thread and runs the jobs it receives one after
+the other in the session, without any ``input()`` prompt.  Every job is
+checked when it is submitted (known driver, arguments matching its
+signature, optional validator), so a typo is rejected at once instead of
+hours later when the job comes up.  Progress (job started / finished, run
+uids, points) is sent to every client watching.
+
+A job is one driver call, or one plan run with ``xrun``:
+
+    {"driver": "xpd_mscan", "args": [[1, 2, 3], [10, 20, 30], 0], "kwargs": {"delay": 2}}
+    {"driver": "lineplan", "sample": 4, "args": [5, 0, 10, 21], "kwargs": {"motor": {"$bl": "sample_y"}}}
+
+``{"$bl": name}`` stands for the beamline object ``bl.<name>``.
+
+In the session:
+
+    from xpdplans.job_server import JobServer
+    server = JobServer()
+    server.run()                      # until Ctrl-C or a stop request
+
+From a shell on the same machine:
+
+    python -m xpdplans.job_server submit '{"driver": "xpd_mscan", "args": [[1, 2], [10, 20], 0]}'
+    python -m xpdplans.job_server submit jobs.json          # a list of jobs
+    python -m xpdplans.job_server status
+    python -m xpdplans.job_server watch
+"""
+import argparse
+import asyncio
+import builtins
+import contextlib
+import datetime
+import inspect
+import itertools
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import traceback
+
+from .beamline import bl
+
+DEFAULT_PATH = "config_base/job_server.sock"
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _no_input(prompt=""):
+    raise RuntimeError(f"interactive prompt in a queued job: {prompt!r}")
+
+
+@contextlib.contextmanager
+def _no_prompts():
+    """Make ``input()`` fail instead of waiting for a user who is not there."""
+    saved = builtins.input
+    builtins.input = _no_input
+    try:
+        yield
+    finally:
+        builtins.input = saved
+
+
+def _resolve(value):
+    """Replace every ``{"$bl": name}`` in *value* by the beamline object."""
+    if isinstance(value, dict):
+        if set(value) == {"$bl"}:
+            return getattr(bl, value["$bl"])
+        return {k: _resolve(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve(v) for v in value]
+    return value
+
+
+class JobServer:
+    """
+    Run JSON jobs submitted over a Unix socket back to back in this session.
+
+    Parameters:
+        path (str): socket file. Default is `DEFAULT_PATH`.
+        drivers (dict, optional): name -> driver or plan that may be submitted; default is every function
+            of the package, see `xpdplans.namespace`.
+        validator (callable, optional): called as ``validator(driver, args, kwargs)`` when a job is
+            submitted, e.g. to check positions against the holder; an exception rejects the job.
+            It runs in the server thread while a job may be running, so it must not touch `bl`.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, drivers=None, validator=None):
+        self.path = path
+        self.validator = validator
+        self.jobs = []
+        self.current = None
+        self._drivers = drivers
+        self._pending = queue.Queue()
+        self._ids = itertools.count(1)
+        self._watchers = set()
+        self._loop = None
+        self._closing = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def drivers(self):
+        if self._drivers is None:
+            from . import namespace
+            self._drivers = {name: f for name, f in namespace().items() if inspect.isfunction(f)}
+        return self._drivers
+
+    # jobs
+
+    def validate(self, request):
+        """Check a job request and return the job; raises ValueError for a job that cannot run."""
+        if not isinstance(request, dict) or "driver" not in request:
+            raise ValueError('a job is a JSON object with at least a "driver"')
+        name = request["driver"]
+        func = self.drivers.get(name)
+        if func is None:
+            raise ValueError(f"unknown driver {name!r}")
+        args, kwargs = request.get("args", []), dict(request.get("kwargs", {}))
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise ValueError('"args" must be a list and "kwargs" an object')
+        is_plan = inspect.isgeneratorfunction(func)
+        if is_plan and "sample" not in request:
+            raise ValueError(f"{name} is a plan, the job needs the \"sample\" to run it for")
+        params = inspect.signature(func).parameters
+        if "confirm" in params:
+            kwargs["confirm"] = False
+        try:
+            resolved_args, resolved_kwargs = _resolve(args), _resolve(kwargs)
+            inspect.signature(func).bind(*resolved_args, **resolved_kwargs)
+        except (TypeError, AttributeError) as error:
+            raise ValueError(f"{name}: {error}") from None
+        if self.validator is not None:
+            try:
+                self.validator(name, resolved_args, resolved_kwargs)
+            except Exception as error:
+                raise ValueError(f"{name}: {error!r}") from None
+        return dict(id=next(self._ids), driver=name, args=args, kwargs=kwargs, sample=request.get("sample"),
+                    state="queued", submitted=_now(), started=None, finished=None, uids=[], points=0,
+                    error=None)
+
+    def submit(self, *requests):
+        """Validate and queue job requests, all or none of them; returns the jobs."""
+        jobs = [self.validate(request) for request in requests]
+        for job in jobs:
+            self.jobs.append(job)
+            self._pending.put(job)
+            self._publish(event="queued", job=job["id"], driver=job["driver"])
+        return jobs
+
+    def cancel(self, job_id):
+        """Cancel a queued job; a running job is stopped in the session (Ctrl-C)."""
+        for job in self.jobs:
+            if job["id"] == job_id:
+                if job["state"] != "queued":
+                    raise ValueError(f"job {job_id} is {job['state']}, only queued jobs can be cancelled")
+                job["state"] = "cancelled"
+                self._publish(event="cancelled", job=job_id)
+                return job
+        raise ValueError(f"no job {job_id}")
+
+    def status(self):
+        queued = sum(job["state"] == "queued" for job in self.jobs)
+        return dict(current=self.current and self.current["id"], queued=queued, jobs=self.jobs)
+
+    def _execute(self, job):
+        func = self.drivers[job["driver"]]
+        args, kwargs = _resolve(job["args"]), _resolve(job["kwargs"])
+        if inspect.isgeneratorfunction(func):
+            bl.xrun(job["sample"], func(*args, **kwargs))
+        else:
+            func(*args, **kwargs)
+
+    def _document(self, name, doc):
+        job = self.current
+        if job is None:
+            return
+        if name == "start":
+            job["uids"].append(doc["uid"])
+            self._publish(event="run_start", job=job["id"], uid=doc["uid"], sample=doc.get("sample_name"),
+                          plan=doc.get("plan_name"))
+        elif name in ("event", "event_page"):
+            job["points"] += 1 if name == "event" else len(doc["seq_num"])
+            self._publish(event="point", job=job["id"], points=job["points"])
+        elif name == "stop":
+            self._publish(event="run_stop", job=job["id"], uid=doc["run_start"], status=doc["exit_status"])
+
+    # worker, in the session
+
+    def run(self, until_empty=False):
+        """
+        Serve and run jobs until a stop request or Ctrl-C.
+
+        Parameters:
+            until_empty (bool): also return once the queue is empty.
+        """
+        self.start()
+        token = bl.xrun.subscribe(self._document)
+        print(f"job server listening on {self.path}")
+        try:
+            while not self._stop.is_set():
+                try:
+                    job = self._pending.get(timeout=0.2)
+                except queue.Empty:
+                    if until_empty:
+                        break
+                    continue
+                if job["state"] != "queued":
+                    continue
+                self.current = job
+                job.update(state="running", started=_now())
+                self._publish(event="started", job=job["id"], driver=job["driver"])
+                print(f"job {job['id']}: {job['driver']}")
+                try:
+                    with _no_prompts():
+                        self._execute(job)
+                    job["state"] = "done"
+                except Exception as error:
+                    job.update(state="failed", error=repr(error))
+                    traceback.print_exc()
+                finally:
+                    job["finished"] = _now()
+                    self.current = None
+                    self._publish(event=job["state"], job=job["id"], error=job["error"], uids=job["uids"])
+        finally:
+            bl.xrun.unsubscribe(token)
+            self.close()
+
+    def stop(self):
+        """Stop after the current job."""
+        self._stop.set()
+
+    # socket, in a background thread
+
+    def start(self):
+        """Start listening on :attr:`path`, in a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve_thread, args=(ready,), name="JobServer", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def close(self):
+        """Stop listening."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._closing.set)
+            self._thread.join()
+
+    def _serve_thread(self, ready):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve(ready))
+        finally:
+            self._loop.close()
+            self._loop = None
+
+    async def _serve(self, ready):
+        self._closing = asyncio.Event()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, self.path)
+        ready.set()
+        try:
+            await self._closing.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            for watcher in list(self._watchers):
+                watcher.put_nowait(None)
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    async def _handle(self, reader, writer):
+        try:
+            while not reader.at_eof():
+                line = await reader.readline()
+                if not line.strip():
+                    continue
+                try:
+                    reply = self._reply(json.loads(line))
+                except (ValueError, TypeError) as error:
+                    reply = dict(ok=False, error=str(error))
+                except Exception as error:
+                    # a bad request must not take the connection down without a reply
+                    reply = dict(ok=False, error=repr(error))
+                if reply is None:
+                    await self._watch(writer)
+                    break
+                writer.write((json.dumps(reply, default=str) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _reply(self, request):
+        if not isinstance(request, dict):
+            raise ValueError('a request is a JSON object, e.g. {"op": "status"}')
+        op = request.get("op", "submit")
+        if op == "submit":
+            jobs = request["jobs"] if "jobs" in request else [request]
+            if not isinstance(jobs, list):
+                raise ValueError('"jobs" must be a list of jobs')
+            return dict(ok=True, jobs=[job["id"] for job in self.submit(*jobs)])
+        if op == "status":
+            return dict(ok=True, **self.status())
+        if op == "cancel":
+            if "id" not in request:
+                raise ValueError('"cancel" needs the "id" of the job')
+            return dict(ok=True, job=self.cancel(request["id"]))
+        if op == "stop":
+            self.stop()
+            return dict(ok=True)
+        if op == "watch":
+            return None
+        raise ValueError(f"unknown op {op!r}")
+
+    async def _watch(self, writer):
+        events = asyncio.Queue()
+        self._watchers.add(events)
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                writer.write((json.dumps(event, default=str) + "\n").encode())
+                await writer.drain()
+        finally:
+            self._watchers.discard(events)
+
+    def _publish(self, **event):
+        """Send *event* to every watching client; callable from any thread."""
+        loop = self._loop
+        if loop is None or not self._watchers:
+            return
+        event["time"] = _now()
+        for events in list(self._watchers):
+            try:
+                loop.call_soon_threadsafe(events.put_nowait, event)
+            except RuntimeError:
+                # the server is closing
+                return
+
+
+def request(message, path=DEFAULT_PATH):
+    """Send one request to a running `JobServer` and return its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((json.dumps(message) + "\n").encode())
+        with sock.makefile() as f:
+            return json.loads(f.readline())
+
+
+def watch(path=DEFAULT_PATH):
+    """Yield the progress events of a running `JobServer` as they come."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(b'{"op": "watch"}\n')
+        with sock.makefile() as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Client of the xpdplans job server.")
+    parser.add_argument("--path", default=DEFAULT_PATH, help="socket of the server")
+    sub = parser.add_subparsers(dest="op", required=True)
+    submit = sub.add_parser("submit", help="queue a job, or a list of jobs")
+    submit.add_argument("job", help="JSON job or list of jobs, or a file holding it")
+    sub.add_parser("status", help="list the jobs")
+    cancel = sub.add_parser("cancel", help="cancel a queued job")
+    cancel.add_argument("id", type=int)
+    sub.add_parser("stop", help="stop the server after the current job")
+    sub.add_parser("watch", help="print progress as it happens")
+    args = parser.parse_args(argv)
+
+    if args.op == "watch":
+        for event in watch(args.path):
+            print(json.dumps(event))
+        return 0
+    if args.op == "submit":
+        text = args.job
+        if os.path.exists(text):
+            with open(text) as f:
+                text = f.read()
+        job = json.loads(text)
+        message = dict(op="submit", jobs=job) if isinstance(job, list) else dict(job, op="submit")
+    elif args.op == "cancel":
+        message = dict(op="cancel", id=args.id)
+    else:
+        message = dict(op=args.op)
+    reply = request(message, args.path)
+    print(json.dumps(reply, indent=1))
+    return 0 if reply.get("ok") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Live ROI reduction of the area detector frames.
+
+`LiveROI` is a callback that reduces every pe1c / pe2c frame of a run to a
+few numbers while the scan is running: the total counts, the counts in
+rectangular regions and in rings around the beam centre, and the radius
+of the strongest ring of the radial profile (a cheap stand-in for an
+azimuthal integration).  The reduction runs in a worker thread; the
+callback only queues the frame, so the RunEngine is never held up, and
+frames are dropped rather than queued without bound if the worker cannot
+keep up.
+
+`live_roi` subscribes it for the length of a plan and, with
+``derived=True``, also records the numbers in streams of their own
+(``roi_<name>_monitor``), next to the primary stream.  ``lineplan``,
+``gridplan`` and ``xyposplan`` take it as ``roi=``:
+
+    roi = LiveROI(rois={'spot': (100, 140, 120, 160)}, rings={'111': (40, 46)})
+    xrun(1, lineplan(5, 0, 10, 21, roi=roi))
+    roi.table()                   # one row per frame
+    xrun(1, gridplan(5, 0, 10, 11, 0, 10, 11, roi=roi, roi_derived=True))
+
+Frames stored as files (as at the beamline) are read with *fill*, e.g.
+``LiveROI(fill=db.reg.retrieve)``.
+"""
+import queue
+import threading
+
+import numpy as np
+import pandas as pd
+import bluesky.plan_stubs as bps
+import bluesky.preprocessors as bpp
+import event_model
+from bluesky.callbacks.core import CallbackBase
+from ophyd import Signal
+
+
+class LiveROI(CallbackBase):
+    """
+    Reduce each area detector frame to scalars in a worker thread.
+
+    Parameters:
+        rois (dict, optional): name -> ``(row0, row1, col0, col1)`` rectangle to sum.
+        rings (dict, optional): name -> ``(r0, r1)`` ring around *center*, in pixels, to sum.
+        center (tuple, optional): ``(row, col)`` of the beam centre; default is the image centre.
+        nbins (int): number of radial bins of the profile ``peak_r`` is taken from.
+        field (str, optional): image data key; default is the first 2D data key of the stream,
+            e.g. ``pe1c_image``.
+        fill (callable, optional): turns the image value of an event into an array when it is a
+            reference to a file, e.g. ``db.reg.retrieve``.
+        on_result (callable, optional): called from the worker with the dict of each frame.
+        maxsize (int): frames queued at most; further frames are dropped and counted in :attr:`dropped`.
+        stream_name (str): only frames of this stream are reduced.
+    """
+
+    def __init__(self, rois=None, rings=None, center=None, nbins=100, field=None, fill=None, on_result=None,
+                 maxsize=16, stream_name="primary"):
+        super().__init__()
+        self.rois = dict(rois or {})
+        self.rings = dict(rings or {})
+        self.center = center
+        self.nbins = nbins
+        self.field = field
+        self.fill = fill
+        self.on_result = on_result
+        self.stream_name = stream_name
+        self.results = []
+        self.dropped = 0
+        self.names = ["total", "peak_r"] + list(self.rois) + list(self.rings)
+        self.signals = {name: Signal(name=f"roi_{name}", value=0.0) for name in self.names}
+        self._fields = {}
+        self._radial = None
+        self._queue = queue.Queue(maxsize)
+        self._worker = None
+
+    # RunEngine side: only bookkeeping and queueing
+
+    def start(self, doc):
+        # frames of the previous run still queued are reduced into its results first
+        self._queue.join()
+        self.results = []
+        self.dropped = 0
+        self._fields.clear()
+        for signal in self.signals.values():
+            signal.put(np.nan)
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._work, name="LiveROI", daemon=True)
+            self._worker.start()
+
+    def descriptor(self, doc):
+        if doc.get("name", "primary") != self.stream_name:
+            return
+        field = self.field
+        if field is None:
+            field = next((key for key, dk in doc["data_keys"].items() if len(dk.get("shape") or ()) >= 2), None)
+        if field is not None:
+            self._fields[doc["uid"]] = field
+
+    def event(self, doc):
+        field = self._fields.get(doc["descriptor"])
+        if field is None or field not in doc["data"]:
+            return
+        try:
+            self._queue.put_nowait((doc["seq_num"], doc["time"], doc["data"][field]))
+        except queue.Full:
+            self.dropped += 1
+
+    def event_page(self, doc):
+        for event in event_model.unpack_event_page(doc):
+            self.event(event)
+
+    def pending(self):
+        """Number of frames queued or being reduced."""
+        return self._queue.unfinished_tasks
+
+    # worker side
+
+    def _work(self):
+        while True:
+            seq_num, timestamp, image = self._queue.get()
+            try:
+                if self.fill is not None and np.ndim(image) < 2:
+                    image = self.fill(image)
+                result = dict(seq_num=seq_num, time=timestamp, **self.reduce(np.asarray(image, dtype=float)))
+                self.results.append(result)
+                for name, signal in self.signals.items():
+                    signal.put(result[name], timestamp=timestamp)
+                if self.on_result is not None:
+                    self.on_result(result)
+            except Exception as error:
+                print(f"LiveROI: frame {seq_num} not reduced: {error!r}")
+            finally:
+                self._queue.task_done()
+
+    def _radial_bins(self, shape):
+        # bin index of every pixel, computed once per image shape
+        if self._radial is None or self._radial[0] != shape:
+            center = self.center if self.center is not None else (shape[0] / 2, shape[1] / 2)
+            rows, cols = np.indices(shape)
+            r = np.hypot(rows - center[0], cols - center[1])
+            edges = np.linspace(0, r.max(), self.nbins + 1)
+            index = np.clip(np.searchsorted(edges, r.ravel(), side="right") - 1, 0, self.nbins - 1)
+            counts = np.bincount(index, minlength=self.nbins)
+            self._radial = (shape, r, index, counts, (edges[:-1] + edges[1:]) / 2)
+        return self._radial
+
+    def reduce(self, image):
+        """The scalars of one frame, by name."""
+        if image.ndim > 2:
+            image = image.reshape(-1, *image.shape[-2:]).sum(axis=0)
+        _, r, index, counts, radii = self._radial_bins(image.shape)
+        profile = np.bincount(index, weights=image.ravel(), minlength=self.nbins) / np.maximum(counts, 1)
+        out = {"total": float(image.sum()), "peak_r": float(radii[np.argmax(profile)])}
+        for name, (row0, row1, col0, col1) in self.rois.items():
+            out[name] = float(image[row0:row1, col0:col1].sum())
+        for name, (r0, r1) in self.rings.items():
+            out[name] = float(image[(r >= r0) & (r < r1)].sum())
+        return out
+
+    def table(self):
+        """The results so far, one row per frame, indexed by seq_num."""
+        return pd.DataFrame(self.results, columns=["seq_num", "time"] + self.names).set_index("seq_num")
+
+
+def live_roi(plan, roi, derived=False):
+    """
+    Run *plan* with `LiveROI` *roi* subscribed.
+
+    Parameters:
+        plan: the plan to wrap.
+        roi (LiveROI): the reduction.
+        derived (bool): also record every scalar in a stream of its own, ``roi_<name>_monitor``;
+            the run is kept open until the last frame is reduced.
+    """
+    if derived:
+        def drain(msg):
+            if msg.command != "close_run":
+                return None, None
+
+            def wait_then_close():
+                while roi.pending():
+                    yield from bps.sleep(0.05)
+                return (yield msg)
+
+            return wait_then_close(), None
+
+        plan = bpp.plan_mutator(plan, drain)
+        plan = bpp.monitor_during_wrapper(plan, list(roi.signals.values()))
+    return (yield from bpp.subs_wrapper(plan, roi))
@@ -1,9 +1,29 @@
-import time
+"""
+Two-detector runs: PDF on pe1c and XRD on pe2c, moving pe1c out of the beam
+for XRD and back in for PDF.  The PE1 moves go through `detector_geometry`,
+see geometry.py.
+"""
+import contextlib
+
+import bluesky.plan_stubs as bps
+import bluesky.preprocessors as bpp
+from bluesky.callbacks import LiveTable
+from bluesky.protocols import Triggerable
+from bluesky.utils import separate_devices, short_uid
+
+from .beamline import bl
+from .geometry import detector_geometry
+from .job_queue import JobQueue
+from .plans import plan_with_calib, xpd_flt_set
+from .shutter import shutter_policy
+from .staging import keep_staged
+from .status import expect_runs
 
 
 def mscan_2det(smplist_pdf, smplist_xrd, posxlist, exp_pdf, exp_xrd, smpl_h=None, delay=1,
                pdf_pos=[0, 255], xrd_pos=[400, 275], num_pdf=1, num_xrd=1, pdf_flt_h=None, pdf_flt=None, xrd_flt=None,
-               motorx=sample_x, pdf_frame_acq=None, xrd_frame_acq=None, dets=[pe1_z, sample_x], confirm=True):
+               motorx=None, pdf_frame_acq=None, xrd_frame_acq=None, dets=None, confirm=True, geometry=None,
+               simultaneous=False):
     '''
     Multiple samples, do pdf and xrd for one sample, then move to the next sample
     Parameters:
@@ -25,12 +45,31 @@ def mscan_2det(smplist_pdf, smplist_xrd, posxlist, exp_pdf, exp_xrd, smpl_h=None
         pdf_frame_acq: Frame acquisition time for PDF detector (default: None).
         xrd_frame_acq: Frame acquisition time for XRD detector (default: None).
         dets: List of detectors and motors to record in the data table.
+        geometry: detector_geometry configuration serving both detectors; if given, PE1 stays there and
+            each sample is measured with run_pdf_xrd, PDF and XRD in one run, instead of swapping
+            the detector twice per sample. The run is recorded under the PDF sample. pdf_pos and
+            xrd_pos are not used then, num_xrd must equal num_pdf, and xrd_flt, if given, the PDF
+            filter sets.
+        simultaneous: with geometry, trigger both detectors at once, see pdf_xrd_plan.
     '''
+    if motorx is None:
+        motorx = bl.sample_x
+    if dets is None:
+        dets = [bl.pe1_z, bl.sample_x]
 
     # Validate list lengths for sample list and position list
     if len(smplist_pdf) != len(smplist_xrd) or len(posxlist) != len(smplist_xrd):
         raise ValueError("smplist_pdf, smplist_xrd, posxlist must have the same length")
 
+    if geometry is not None:
+        # One run takes both datasets, with one number of shots and one filter set per sample
+        if num_xrd != num_pdf:
+            raise ValueError("with geometry, PDF and XRD take the same number of shots, num_xrd must equal num_pdf")
+        used = [pdf_flt] + ([pdf_flt_h] if smpl_h else [])
+        if xrd_flt is not None and any(flt != xrd_flt for flt in used):
+            raise ValueError("with geometry, PDF and XRD are taken with the same filters, xrd_flt must equal "
+                             "pdf_flt and, with smpl_h, pdf_flt_h")
+
     # Validate filter settings if high scattering samples are provided
     if smpl_h is not None and (pdf_flt_h is None or pdf_flt is None):
         raise ValueError("If smpl_h is provided, both pdf_flt_h and pdf_flt must also be provided.")
@@ -41,10 +80,14 @@ def mscan_2det(smplist_pdf, smplist_xrd, posxlist, exp_pdf, exp_xrd, smpl_h=None
 
     # Ask the user confirm detector positions
     if confirm is True:
+        if geometry is not None:
+            x, z, _ = detector_geometry.target(geometry)
+            positions = f"  - PDF and XRD Position ({geometry}) = {[x, z]}\n"
+        else:
+            positions = f"  - PDF Position = {pdf_pos}\n  - XRD Position = {xrd_pos}\n"
         confirmation = input(
             f"Confirm detector positions:\n"
-            f"  - PDF Position = {pdf_pos}\n"
-            f"  - XRD Position = {xrd_pos}\n"
+            f"{positions}"
             f"Proceed with these settings? (y/n): ").strip().lower()
 
         if confirmation not in ['y', 'yes']:
@@ -57,10 +100,16 @@ def mscan_2det(smplist_pdf, smplist_xrd, posxlist, exp_pdf, exp_xrd, smpl_h=None
     for smpl_xrd, smpl_pdf, posx in zip(smplist_xrd, smplist_pdf, posxlist):
         print(f' {smpl_xrd}, {smpl_pdf}, in position {posx}')
         motorx.move(posx)
-        time.sleep(delay)
+        bl.clock.sleep(delay)
         # Determine the appropriate filter set for PDF
         pdf_flt_selected = pdf_flt_h if smpl_pdf in smpl_h else pdf_flt
 
+        if geometry is not None:
+            run_pdf_xrd(smpl_pdf, exp_pdf, exp_xrd, num=num_pdf, geometry=geometry, simultaneous=simultaneous,
+                        flt=pdf_flt_selected, pdf_frame_acq=pdf_frame_acq, xrd_frame_acq=xrd_frame_acq,
+                        dets=dets, md={'xrd_sample_name': str(smpl_xrd)})
+            continue
+
         # Run the PDF and XRD measurements using run_2det
         run_2det(
             smpl_pdf=smpl_pdf,
@@ -81,7 +130,8 @@ def mscan_2det(smplist_pdf, smplist_xrd, posxlist, exp_pdf, exp_xrd, smpl_h=None
 
 def mrun_2det_batch(smplist_pdf, smplist_xrd, posxlist, exp_pdf, exp_xrd, smpl_h=[], delay=1,
                  pdf_pos=[0, 240], xrd_pos=[400, 270], num_pdf=1, num_xrd=1, pdf_flt_h=None, pdf_flt=None, xrd_flt=None,
-                 motorx=sample_x, pdf_frame_acq=None, xrd_frame_acq=None, dets=[pe1_z, sample_x], confirm=True):
+                 motorx=None, pdf_frame_acq=None, xrd_frame_acq=None, dets=None, confirm=True,
+                 queue=None, stage_once=True):
     '''
     Multiple samples, do pdf measurment for all sample first, then do xrd measuremnt
 
@@ -104,16 +154,23 @@ def mrun_2det_batch(smplist_pdf, smplist_xrd, posxlist, exp_pdf, exp_xrd, smpl_h
         pdf_frame_acq: Frame acquisition time for PDF detector (default: None).
         xrd_frame_acq: Frame acquisition time for XRD detector (default: None).
         dets: List of detectors and motors to record in the data table.
+        queue: JobQueue file recording every finished (detector, sample); calling again with the same file
+            after an interruption skips what was already measured, and a finished detector phase entirely.
+        stage_once: stage each detector once for all its samples instead of once per sample, see `keep_staged`.
 
 
     '''
+    if motorx is None:
+        motorx = bl.sample_x
+    if dets is None:
+        dets = [bl.pe1_z, bl.sample_x]
 
     # Validate list lengths for sample list and position list
     if len(smplist_pdf) != len(smplist_xrd) or len(posxlist) != len(smplist_xrd):
         raise ValueError("smplist_pdf, smplist_xrd, posxlist must have the same length")
 
     # Validate filter settings if high scattering samples are provided
-    if smpl_h is not None and (pdf_flt_h is None or pdf_flt is None):
+    if smpl_h and (pdf_flt_h is None or pdf_flt is None):
         raise ValueError("If smpl_h is provided, both pdf_flt_h and pdf_flt must also be provided.")
 
     # Ensure that if pdf_flt is provided, xrd_flt are provided
@@ -133,61 +190,71 @@ def mrun_2det_batch(smplist_pdf, smplist_xrd, posxlist, exp_pdf, exp_xrd, smpl_h
             return  # Exit the function if the user doesn't confirm
 
     # Disable automatic loading of calibration during batch processing
-    glbl["auto_load_calib"] = False
+    current_calib_status = bl.glbl["auto_load_calib"]
+    bl.glbl["auto_load_calib"] = False
 
     # Load calibration files for XRD and PDF
-    xrd_calib = load_calibration_md('config_base/xrd.poni')
-    pdf_calib = load_calibration_md('config_base/pdf.poni')
-
-    pdf_pe1x, pdf_pe1z = pdf_pos
-    xrd_pe1x, xrd_pe1z = xrd_pos
-
-    print('pdf scan')
-
-    # Move to the PDF position with the correct sequence
-    pe1_z.move(xrd_pe1z)
-    pe1_x.move(pdf_pe1x)
-    pe1_z.move(pdf_pe1z)
-
-    xpd_configuration['area_det'] = pe1c
-    if pdf_frame_acq is not None:
-        glbl['frame_acq_time'] = pdf_frame_acq
-        time.sleep(5)
-
-    for smpl_pdf, posx in zip(smplist_pdf, posxlist):
-        print(f' PDF: sample: {smpl_pdf} ,position: {posx}')
-        motorx.move(posx)
-        if smpl_pdf in smpl_h:
-            xpd_flt_set(pdf_flt_h)
-        else:
-            if pdf_flt is not None:
-                xpd_flt_set(pdf_flt)
-        time.sleep(delay)
-        plan = plan_with_calib([pe1c] + dets, exp_pdf, num_pdf, pdf_calib)
-        xrun(smpl_pdf, plan)
-
-    print('xrd scan')
-    xpd_configuration['area_det'] = pe2c
-    if xrd_frame_acq is not None:
-        glbl['frame_acq_time'] = xrd_frame_acq
-        time.sleep(5)
-    pe1_z.move(xrd_pe1z)
-    pe1_x.move(xrd_pe1x)
-    if xrd_flt is not None:
-        xpd_flt_set(xrd_flt)
-    for smpl_xrd, posx in zip(smplist_xrd, posxlist):
-        print(f' PDF: sample: {smpl_xrd} ,position: {posx}')
-        motorx.move(posx)
-        # time.sleep(delay)
-        plan = plan_with_calib([pe2c] + dets, exp_xrd, num_xrd, xrd_calib)
-        xrun(smpl_xrd, plan)
-
-    glbl["auto_load_calib"] = current_calib_status
+    xrd_calib = bl.load_calibration_md('config_base/xrd.poni')
+    pdf_calib = bl.load_calibration_md('config_base/pdf.poni')
+
+    pdf_units = [dict(detector='pdf', index=i, sample=smpl, posx=posx)
+                 for i, (smpl, posx) in enumerate(zip(smplist_pdf, posxlist))]
+    xrd_units = [dict(detector='xrd', index=i, sample=smpl, posx=posx)
+                 for i, (smpl, posx) in enumerate(zip(smplist_xrd, posxlist))]
+    jobs = JobQueue(queue, pdf_units + xrd_units) if queue is not None else None
+    if jobs is not None:
+        pdf_units = [u for u in pdf_units if not jobs.is_done(u)]
+        xrd_units = [u for u in xrd_units if not jobs.is_done(u)]
+    expect_runs(len(pdf_units) + len(xrd_units), 'mrun_2det_batch')
+
+    if pdf_units:
+        print('pdf scan')
+        detector_geometry.move_to('pdf', pdf_pos)
+        if pdf_frame_acq is not None:
+            bl.glbl['frame_acq_time'] = pdf_frame_acq
+            bl.clock.sleep(5)
+
+    with keep_staged([bl.pe1c]) if stage_once and pdf_units else contextlib.nullcontext():
+        for unit in pdf_units:
+            smpl_pdf, posx = unit['sample'], unit['posx']
+            print(f' PDF: sample: {smpl_pdf} ,position: {posx}')
+            motorx.move(posx)
+            if smpl_pdf in smpl_h:
+                xpd_flt_set(pdf_flt_h)
+            else:
+                if pdf_flt is not None:
+                    xpd_flt_set(pdf_flt)
+            bl.clock.sleep(delay)
+            plan = plan_with_calib([bl.pe1c] + dets, exp_pdf, num_pdf, pdf_calib)
+            uids = bl.xrun(smpl_pdf, plan)
+            if jobs is not None:
+                jobs.mark_done(unit, uids)
+
+    if xrd_units:
+        print('xrd scan')
+        detector_geometry.move_to('xrd', xrd_pos)
+        if xrd_frame_acq is not None:
+            bl.glbl['frame_acq_time'] = xrd_frame_acq
+            bl.clock.sleep(5)
+        if xrd_flt is not None:
+            xpd_flt_set(xrd_flt)
+    with keep_staged([bl.pe2c]) if stage_once and xrd_units else contextlib.nullcontext():
+        for unit in xrd_units:
+            smpl_xrd, posx = unit['sample'], unit['posx']
+            print(f' PDF: sample: {smpl_xrd} ,position: {posx}')
+            motorx.move(posx)
+            # time.sleep(delay)
+            plan = plan_with_calib([bl.pe2c] + dets, exp_xrd, num_xrd, xrd_calib)
+            uids = bl.xrun(smpl_xrd, plan)
+            if jobs is not None:
+                jobs.mark_done(unit, uids)
+
+    bl.glbl["auto_load_calib"] = current_calib_status
 
 
 def mrun_2det_xypos_batch(smplist_pdf, smplist_xrd, posxlist_pdf, posylist_pdf, posxlist_xrd, posylist_xrd,  exp_pdf, exp_xrd,
                     delay=1, smpl_h=None, pdf_pos=[0, 255], xrd_pos=[400, 275], num_pdf=1, num_xrd=1, pdf_flt_h=None,
-                    pdf_flt=None, xrd_flt=None, motorx=sample_x, motory=sample_y, pdf_frame_acq=None, xrd_frame_acq=None,
+                    pdf_flt=None, xrd_flt=None, motorx=None, motory=None, pdf_frame_acq=None, xrd_frame_acq=None,
                     dets=None, confirm=True):
     '''
 
@@ -215,6 +282,10 @@ def mrun_2det_xypos_batch(smplist_pdf, smplist_xrd, posxlist_pdf, posylist_pdf,
         xrd_frame_acq: Frame acquisition time for XRD detector (default: None).
         dets: List of detectors and motors to record in the data table.
     '''
+    if motorx is None:
+        motorx = bl.sample_x
+    if motory is None:
+        motory = bl.sample_y
 
     # Validate list lengths for PDF
     if len(smplist_pdf) != len(posxlist_pdf) or len(posxlist_pdf) != len(posylist_pdf):
@@ -236,7 +307,7 @@ def mrun_2det_xypos_batch(smplist_pdf, smplist_xrd, posxlist_pdf, posylist_pdf,
         smpl_h = []
     if dets is None:
         dets = []
-    dets = dets + [pe1_Z, motorx, motory]
+    dets = dets + [bl.pe1_z, motorx, motory]
     
     # Ask the user to double-check the pdf_pos and xrd_pos values
     if confirm is True:
@@ -251,23 +322,17 @@ def mrun_2det_xypos_batch(smplist_pdf, smplist_xrd, posxlist_pdf, posylist_pdf,
             return  # Exit the function if the user doesn't confirm
 
     # Disable automatic loading of calibration during batch processing
-    glbl["auto_load_calib"] = False
+    bl.glbl["auto_load_calib"] = False
 
     # Load calibration files for XRD and PDF
-    xrd_calib = load_calibration_md('config_base/xrd.poni')
-    pdf_calib = load_calibration_md('config_base/pdf.poni')
-
-    pdf_pe1x, pdf_pe1z = pdf_pos
-    xrd_pe1x, xrd_pe1z = xrd_pos
+    xrd_calib = bl.load_calibration_md('config_base/xrd.poni')
+    pdf_calib = bl.load_calibration_md('config_base/pdf.poni')
 
     print('Starting xrd scan')
-    xpd_configuration['area_det'] = pe2c
+    detector_geometry.move_to('xrd', xrd_pos)
     if xrd_frame_acq is not None:
-        glbl['frame_acq_time'] = xrd_frame_acq
-        time.sleep(5)
-    # Move the PE1 detector to XRD position
-    pe1_z.move(xrd_pe1z)
-    pe1_x.move(xrd_pe1x)
+        bl.glbl['frame_acq_time'] = xrd_frame_acq
+        bl.clock.sleep(5)
     if xrd_flt is not None:
         xpd_flt_set(xrd_flt)
     for smpl_xrd, posx, posy in zip(smplist_xrd, posxlist_xrd, posylist_xrd):
@@ -275,17 +340,14 @@ def mrun_2det_xypos_batch(smplist_pdf, smplist_xrd, posxlist_pdf, posylist_pdf,
         motorx.move(posx)
         motory.move(posy)
         # time.sleep(delay)
-        plan = plan_with_calib([pe2c] + dets, exp_xrd, num_xrd, xrd_calib)
-        xrun(smpl_xrd, plan)
+        plan = plan_with_calib([bl.pe2c] + dets, exp_xrd, num_xrd, xrd_calib)
+        bl.xrun(smpl_xrd, plan)
 
     print('starting pdf scan')
-    xpd_configuration['area_det'] = pe1c
+    detector_geometry.move_to('pdf', pdf_pos)
     if pdf_frame_acq is not None:
-        glbl['frame_acq_time'] = pdf_frame_acq
-        time.sleep(5)
-    pe1_z.move(xrd_pe1z)
-    pe1_x.move(pdf_pe1x)
-    pe1_z.move(pdf_pe1z)
+        bl.glbl['frame_acq_time'] = pdf_frame_acq
+        bl.clock.sleep(5)
     for smpl_pdf, posx, posy in zip(smplist_pdf, posxlist_pdf, posylist_pdf):
         print(f' PDF: sample: {smpl_pdf} ,position: {posx}')
         motorx.move(posx)
@@ -295,11 +357,11 @@ def mrun_2det_xypos_batch(smplist_pdf, smplist_xrd, posxlist_pdf, posylist_pdf,
         else:
             if pdf_flt is not None:
                 xpd_flt_set(pdf_flt)
-        time.sleep(delay)
-        plan = plan_with_calib([pe1c] + dets, exp_pdf, num_pdf, pdf_calib)
-        xrun(smpl_pdf, plan)
+        bl.clock.sleep(delay)
+        plan = plan_with_calib([bl.pe1c] + dets, exp_pdf, num_pdf, pdf_calib)
+        bl.xrun(smpl_pdf, plan)
 
-    glbl["auto_load_calib"] = True
+    bl.glbl["auto_load_calib"] = True
 
 
 def run_2det(smpl_pdf, smpl_xrd, exp_pdf, exp_xrd, pdf_pos=[0, 255], xrd_pos=[400, 275], num_pdf=1, num_xrd=1,
@@ -348,46 +410,182 @@ def run_2det(smpl_pdf, smpl_xrd, exp_pdf, exp_xrd, pdf_pos=[0, 255], xrd_pos=[40
         dets=[]
         
     # Disable auto-loading calibration
-    glbl["auto_load_calib"] = False
+    bl.glbl["auto_load_calib"] = False
 
     # Load calibration files for both PDF and XRD
-    xrd_calib = load_calibration_md('config_base/xrd.poni')
-    pdf_calib = load_calibration_md('config_base/pdf.poni')
-
-    pdf_pe1x, pdf_pe1z = pdf_pos
-    xrd_pe1x, xrd_pe1z = xrd_pos
+    xrd_calib = bl.load_calibration_md('config_base/xrd.poni')
+    pdf_calib = bl.load_calibration_md('config_base/pdf.poni')
 
     # PDF Scan
     print('pdf scan')
-
-    xpd_configuration['area_det'] = pe1c
+    detector_geometry.move_to('pdf', pdf_pos)
     if pdf_frame_acq is not None:
-        glbl['frame_acq_time'] = pdf_frame_acq
-        time.sleep(5)
-    # Move to the PDF position with the correct sequence
-    pe1_z.move(xrd_pe1z)  # Move z to a safe position
-    pe1_x.move(pdf_pe1x)  # Move x to the PDF position
-    pe1_z.move(pdf_pe1z)  # Finally, move z to the PDF position
+        bl.glbl['frame_acq_time'] = pdf_frame_acq
+        bl.clock.sleep(5)
 
     if pdf_flt is not None:
         xpd_flt_set(pdf_flt)  # set filter for pdf if provided
-    plan = plan_with_calib([pe1c] + dets, exp_pdf, num_pdf, pdf_calib)
-    xrun(smpl_pdf, plan)
+    plan = plan_with_calib([bl.pe1c] + dets, exp_pdf, num_pdf, pdf_calib)
+    bl.xrun(smpl_pdf, plan)
 
     # XRD Scan
     print('xrd scan')
-    xpd_configuration['area_det'] = pe2c
+    detector_geometry.move_to('xrd', xrd_pos)
     if xrd_frame_acq is not None:
-        glbl['frame_acq_time'] = xrd_frame_acq
-        time.sleep(5)
-    pe1_z.move(xrd_pe1z)
-    pe1_x.move(xrd_pe1x)
+        bl.glbl['frame_acq_time'] = xrd_frame_acq
+        bl.clock.sleep(5)
     if xrd_flt is not None:
         xpd_flt_set(xrd_flt)
-    plan = plan_with_calib([pe2c] + dets, exp_xrd, num_xrd, xrd_calib)
-    xrun(smpl_xrd, plan)
+    plan = plan_with_calib([bl.pe2c] + dets, exp_xrd, num_xrd, xrd_calib)
+    bl.xrun(smpl_xrd, plan)
     # Re-enable auto-loading calibration
-    glbl["auto_load_calib"] = True
+    bl.glbl["auto_load_calib"] = True
+
+
+def pdf_xrd_plan(exp_pdf, exp_xrd, num=1, pdf_calib=None, xrd_calib=None, simultaneous=False, delay=0,
+                 pdf_frame_acq=None, xrd_frame_acq=None, dets=None, md=None):
+    """ plan taking PDF on pe1c and XRD on pe2c of the same sample in one run, without moving a detector.
+
+    PE1 has to be where it does not shadow pe2c, see `run_pdf_xrd`.  Each detector is configured for its
+    own exposure once; then, *num* times, pe1c is read into the primary stream and pe2c into the ``xrd``
+    stream, one after the other or, with *simultaneous*, triggered together with *dets* (the shot takes
+    the longer of the two exposures instead of their sum).  The shutter follows `shutter_policy`.
+
+    xrun only takes the dark of the area detector, which should be pe1c: before the shots, the plan
+    takes a dark of pe2c with the shutter closed into the ``xrd_dark`` stream, named in the start
+    document as ``xrd_dark_stream``.
+
+    Parameters:
+        exp_pdf (float): Total exposure time (in seconds) of pe1c.
+        exp_xrd (float): Total exposure time (in seconds) of pe2c.
+        num (int): Number of shots.
+        pdf_calib (dict, optional): calibration of pe1c, recorded as ``calibration_md``.
+        xrd_calib (dict, optional): calibration of pe2c, recorded as ``xrd_calibration_md``.
+        simultaneous (bool): trigger both detectors at once. Default is False.
+        delay (float): Delay (in seconds) between shots.
+        pdf_frame_acq (float, optional): frame acquisition time of pe1c; default is glbl's.
+        xrd_frame_acq (float, optional): frame acquisition time of pe2c; default is glbl's.
+        dets (list, optional): extra detectors and motors read with both.
+        md (dict, optional): Additional metadata to attach to the run.
+
+    Example:
+        pdf_xrd_plan(60, 10, pdf_calib=load_calibration_md('config_base/pdf.poni'), simultaneous=True)
+    """
+    if dets is None:
+        dets = []
+    pe1c, pe2c = bl.pe1c, bl.pe2c
+    (num_frame, acq_time, computed_exposure) = yield from bl.configure_area_det(pe1c, exp_pdf, pdf_frame_acq)
+    (xrd_num_frame, xrd_acq_time, xrd_exposure) = yield from bl.configure_area_det(pe2c, exp_xrd, xrd_frame_acq)
+    _md = {
+        "sp_time_per_frame": acq_time,
+        "sp_num_frames": num_frame,
+        "sp_requested_exposure": exp_pdf,
+        "sp_computed_exposure": computed_exposure,
+        "xrd_sp_time_per_frame": xrd_acq_time,
+        "xrd_sp_num_frames": xrd_num_frame,
+        "xrd_sp_requested_exposure": exp_xrd,
+        "xrd_sp_computed_exposure": xrd_exposure,
+        "plan_name": "pdf_xrd_plan",
+        "detectors": [pe1c.name, pe2c.name] + [d.name for d in dets],
+        "num_points": num,
+        "simultaneous": simultaneous,
+        "xrd_dark_stream": "xrd_dark",
+    }
+    if pdf_calib is not None:
+        _md["calibration_md"] = pdf_calib
+    if xrd_calib is not None:
+        _md["xrd_calibration_md"] = xrd_calib
+    _md.update(md or {})
+
+    def read(stream, readers):
+        yield from bps.create(stream)
+        for obj in readers:
+            yield from bps.read(obj)
+        yield from bps.save()
+
+    def shot():
+        if simultaneous:
+            group = short_uid('trigger')
+            for det in separate_devices([pe1c, pe2c] + dets):
+                if isinstance(det, Triggerable):
+                    yield from bps.trigger(det, group=group)
+            yield from bps.wait(group)
+            yield from read('primary', [pe1c] + dets)
+            yield from read('xrd', [pe2c] + dets)
+        else:
+            yield from bps.trigger_and_read([pe1c] + dets)
+            yield from bps.trigger_and_read([pe2c] + dets, name='xrd')
+
+    def shots():
+        for i in range(num):
+            if i:
+                yield from bps.sleep(delay)
+            yield from shot()
+
+    @bpp.stage_decorator([pe1c, pe2c] + dets)
+    @bpp.run_decorator(md=_md)
+    def inner():
+        yield from bl.close_shutter_stub()
+        yield from bps.trigger_and_read([pe2c], name='xrd_dark')
+        yield from shutter_policy.wrap(shots())
+
+    yield from bpp.subs_wrapper(inner(), LiveTable(dets))
+
+
+def run_pdf_xrd(smpl, exp_pdf, exp_xrd, num=1, geometry='shared', simultaneous=False, flt=None,
+                pdf_calib_file='config_base/pdf.poni', xrd_calib_file='config_base/xrd.poni', pdf_frame_acq=None,
+                xrd_frame_acq=None, dets=None, md=None):
+    """ PDF and XRD of one sample in one run, with PE1 parked where both detectors can be used.
+
+    Unlike `run_2det`, PE1 is not swapped between a PDF and an XRD position: it is moved (only if it
+    is not there already) to the *geometry* configuration, which has to serve both pe1c and pe2c, and
+    `pdf_xrd_plan` takes both datasets.  Define that configuration once for the beamtime, e.g.
+    ``detector_geometry.define('shared', 150, 280, ('pe1c', 'pe2c'))``.  pe1c is made the area detector,
+    so xrun's dark matches the PDF frames; the dark of pe2c is taken by the plan in the ``xrd_dark`` stream.
+
+    Parameters:
+        smpl (int): Sample index.
+        exp_pdf (float): Total exposure time (in seconds) of pe1c.
+        exp_xrd (float): Total exposure time (in seconds) of pe2c.
+        num (int): Number of shots.
+        geometry (str): detector_geometry configuration serving both detectors. Default is 'shared'.
+        simultaneous (bool): trigger both detectors at once, see `pdf_xrd_plan`.
+        flt (list, optional): filter set, the same for both datasets.
+        pdf_calib_file (str): calibration of pe1c.
+        xrd_calib_file (str): calibration of pe2c.
+        pdf_frame_acq, xrd_frame_acq (float, optional): frame acquisition time of each detector.
+        dets (list, optional): extra detectors and motors to read. Default is [pe1_z, sample_x].
+        md (dict, optional): Additional metadata to attach to the run.
+
+    Example:
+        run_pdf_xrd(1, 60, 10, simultaneous=True)
+    """
+    if geometry not in detector_geometry.configurations:
+        raise ValueError(f"no detector configuration {geometry!r}; define where PE1 leaves pe2c a clear view, "
+                         f"e.g. detector_geometry.define({geometry!r}, x, z, ('pe1c', 'pe2c'))")
+    if not {'pe1c', 'pe2c'} <= set(detector_geometry.detectors(geometry)):
+        raise ValueError(f"detector configuration {geometry!r} does not serve both pe1c and pe2c, "
+                         f"use run_2det to swap the detectors")
+    if dets is None:
+        dets = [bl.pe1_z, bl.sample_x]
+
+    detector_geometry.move_to(geometry)
+    bl.xpd_configuration['area_det'] = bl.pe1c
+    if flt is not None:
+        xpd_flt_set(flt)
+
+    # both calibrations are recorded by the plan, not loaded by xrun
+    auto_load_calib = bl.glbl["auto_load_calib"]
+    bl.glbl["auto_load_calib"] = False
+    try:
+        pdf_calib = bl.load_calibration_md(pdf_calib_file)
+        xrd_calib = bl.load_calibration_md(xrd_calib_file)
+        plan = pdf_xrd_plan(exp_pdf, exp_xrd, num, pdf_calib=pdf_calib, xrd_calib=xrd_calib,
+                            simultaneous=simultaneous, pdf_frame_acq=pdf_frame_acq, xrd_frame_acq=xrd_frame_acq,
+                            dets=dets, md=md)
+        return bl.xrun(smpl, plan)
+    finally:
+        bl.glbl["auto_load_calib"] = auto_load_calib
 
 
 def set_xrd(xrd_pos=[400, 280], frame_acq_time=0.2, confirm=True):
@@ -401,8 +599,6 @@ def set_xrd(xrd_pos=[400, 280], frame_acq_time=0.2, confirm=True):
         xrd_pos (list): Position of the PE1 detector [pe1_x, pe1_z] for XRD measurement Default is [400, 280].
         frame_acq_time (float): frame acquisition time. Default is 0.2
     '''
-    xrd_pe1x, xrd_pe1z = xrd_pos
-
     if confirm is True:
         # Ask the user to double-check the pdf_pos and xrd_pos values
         confirmation = input(
@@ -414,11 +610,8 @@ def set_xrd(xrd_pos=[400, 280], frame_acq_time=0.2, confirm=True):
             print("User chose not to proceed with the measurements.")
             return  # Exit the function if the user doesn't confirm
 
-    pe1_z.move(xrd_pe1z)
-    pe1_x.move(xrd_pe1x)
-
-    xpd_configuration['area_det'] = pe2c
-    glbl['frame_acq_time'] = frame_acq_time
+    detector_geometry.move_to('xrd', xrd_pos)
+    bl.glbl['frame_acq_time'] = frame_acq_time
 
 def set_pdf(pdf_pos=[0, 255], safe_out=280, frame_acq_time=0.2, confirm=True):
 
@@ -445,13 +638,8 @@ def set_pdf(pdf_pos=[0, 255], safe_out=280, frame_acq_time=0.2, confirm=True):
             print("User chose not to proceed with the measurements.")
             return  # Exit the function if the user doesn't confirm
 
-    pdf_pe1x, pdf_pe1z = pdf_pos
-
-    pe1_z.move(safe_out)
-    pe1_x.move(pdf_pe1x)
-    pe1_z.move(pdf_pe1z)
-    xpd_configuration['area_det'] = pe1c
-    glbl['frame_acq_time'] = frame_acq_time
+    detector_geometry.move_to('pdf', pdf_pos, safe_z=safe_out)
+    bl.glbl['frame_acq_time'] = frame_acq_time
 
 
 def run_xrd(smpl, exp_xrd, num=1, xrd_pos=[400, 280], calib_file='config_base/xrd.poni',
@@ -474,25 +662,23 @@ def run_xrd(smpl, exp_xrd, num=1, xrd_pos=[400, 280], calib_file='config_base/xr
     if dets is None:
         dets = []
 
-    xrd_pe1x, xrd_pe1z = xrd_pos
-
-    if pe1_x.position == xrd_pe1x:
+    if detector_geometry.at('xrd', xrd_pos):
         print("PE2C detector is already configured, and PE1 is in the correct position.")
         # already xpd configuration
-        xpd_configuration['area_det'] = pe2c
-        if glbl['frame_acq_time'] != frame_acq_time:
-            glbl['frame_acq_time'] = frame_acq_time
-            time.sleep(3)
+        bl.xpd_configuration['area_det'] = bl.pe2c
+        if bl.glbl['frame_acq_time'] != frame_acq_time:
+            bl.glbl['frame_acq_time'] = frame_acq_time
+            bl.clock.sleep(3)
     else:
         print(f"Setting up PE2 detector for XRD measurement. Moving PE1 to position {xrd_pos}.")
         set_xrd(xrd_pos=xrd_pos, frame_acq_time=frame_acq_time, confirm=confirm)
 
     # Disable automatic calibration loading
-    glbl["auto_load_calib"] = False
+    bl.glbl["auto_load_calib"] = False
 
     # Load the calibration file
     try:
-        xrd_calib = load_calibration_md(calib_file)
+        xrd_calib = bl.load_calibration_md(calib_file)
         print(f"Calibration file {calib_file} loaded successfully.")
     except FileNotFoundError:
         raise FileNotFoundError(f"Calibration file '{calib_file}' not found.")
@@ -500,15 +686,15 @@ def run_xrd(smpl, exp_xrd, num=1, xrd_pos=[400, 280], calib_file='config_base/xr
         raise RuntimeError(f"Failed to load calibration file: {e}")
 
     # Run the measurement plan with calibration
-    plan = plan_with_calib([pe2c] + dets, exp_xrd, num, xrd_calib)
-    xrun(smpl, plan)
+    plan = plan_with_calib([bl.pe2c] + dets, exp_xrd, num, xrd_calib)
+    bl.xrun(smpl, plan)
 
     # Re-enable automatic calibration loading
-    glbl["auto_load_calib"] = True
+    bl.glbl["auto_load_calib"] = True
 
 
 def run_pdf(smpl, exp_pdf, num=1, pdf_pos=[0, 255], safe_out=280, calib_file='config_base/pdf.poni',
-            frame_acq_time=0.2, dets=[pe1_z], confirm=True):
+            frame_acq_time=0.2, dets=None, confirm=True):
 
     ''' Run one PDF measurement, moving the PE1 detector to the specified position
         and configuring the system for PDF measurements.
@@ -524,26 +710,25 @@ def run_pdf(smpl, exp_pdf, num=1, pdf_pos=[0, 255], safe_out=280, calib_file='co
         dets (list, optional): Extra detectors (e.g., temperature controller, motor positions). Default is [pe1_z].
 
     '''
-    # Extract PDF x and z positions
-    pdf_pe1x, pdf_pe1z = pdf_pos
-
-    # Check if PE1 is already configured
-    if pe1_x.position == pdf_pe1x and pe1_z.position == pdf_pe1z:
+    if dets is None:
+        dets = [bl.pe1_z]
+    # Check if PE1 is already configured, within tolerance
+    if detector_geometry.at('pdf', pdf_pos):
         print("PE1 detector is already in the correct position.")
-        xpd_configuration['area_det'] = pe1c
-        if glbl['frame_acq_time'] != frame_acq_time:
-            glbl['frame_acq_time'] = frame_acq_time
-            time.sleep(3)
+        bl.xpd_configuration['area_det'] = bl.pe1c
+        if bl.glbl['frame_acq_time'] != frame_acq_time:
+            bl.glbl['frame_acq_time'] = frame_acq_time
+            bl.clock.sleep(3)
     else:
         print(f"Setting up PE1 detector for PDF measurement. Moving PE1 to position {pdf_pos}.")
         set_pdf(pdf_pos=pdf_pos, safe_out=safe_out, frame_acq_time=frame_acq_time, confirm=confirm)
 
     # Disable automatic calibration loading
-    glbl["auto_load_calib"] = False
+    bl.glbl["auto_load_calib"] = False
 
     # Load the calibration file
     try:
-        pdf_calib = load_calibration_md(calib_file)
+        pdf_calib = bl.load_calibration_md(calib_file)
         print(f"Calibration file {calib_file} loaded successfully.")
     except FileNotFoundError:
         raise FileNotFoundError(f"Calibration file '{calib_file}' not found.")
@@ -551,69 +736,8 @@ def run_pdf(smpl, exp_pdf, num=1, pdf_pos=[0, 255], safe_out=280, calib_file='co
         raise RuntimeError(f"Failed to load calibration file: {e}")
 
     # Run the measurement plan with calibration
-    plan = plan_with_calib([pe1c] + dets, exp_pdf, num, pdf_calib)
-    xrun(smpl, plan)
+    plan = plan_with_calib([bl.pe1c] + dets, exp_pdf, num, pdf_calib)
+    bl.xrun(smpl, plan)
 
     # Re-enable automatic calibration loading
-    glbl["auto_load_calib"] = True
-
-
-def plan_with_calib(dets, exp_time, num, calib_file, delay=1):
-    '''
-
-    '''
-    motors = dets[1:]
-    yield from _configure_area_det(exp_time)
-    plan = count_with_calib(dets, num, delay=delay, calibration_md=calib_file)
-    plan = bpp.subs_wrapper(plan, LiveTable(motors))
-    yield from plan
-
-
-def count_with_calib(detectors: list, num: int = 1, delay: float = None, *, calibration_md: dict = None,
-                     md: dict = None) -> typing.Generator:
-    """
-    Take one or more readings from detectors with shutter control and calibration metadata injection.
-
-    Parameters
-    ----------
-    detectors : list
-        list of 'readable' objects
-
-    num : integer, optional
-        number of readings to take; default is 1
-
-        If None, capture data until canceled
-
-    delay : iterable or scalar, optional
-        Time delay in seconds between successive readings; default is 0.
-
-    calibration_md :
-        The calibration data in a dictionary. If not applied, the function is a normal `bluesky.plans.count`.
-
-    md : dict, optional
-        metadata
-
-    Notes
-    -----
-    If ``delay`` is an iterable, it must have at least ``num - 1`` entries or
-    the plan will raise a ``ValueError`` during iteration.
-    """
-    if md is None:
-        md = dict()
-    if calibration_md is not None:
-        md["calibration_md"] = calibration_md
-
-    def _per_shot(_detectors):
-        yield from open_shutter_stub()
-        yield from bps.one_shot(_detectors)
-        yield from close_shutter_stub()
-        return
-
-    try:
-        plan = bp.count(detectors, num, delay, md=md, per_shot=_per_shot)
-        sts = yield from plan
-    except Exception as error:
-
-        raise error
-
-    return sts
+    bl.glbl["auto_load_calib"] = True
@@ -10,24 +10,25 @@ Created on Thu Aug 13 15:58:10 2020
 Plan to run multiple sample under remote condition
 This plan uses xpdacq protocol
 """
+import contextlib
+import logging
 
-from xpdacq.beamtime import _configure_area_det
-from xpdacq.beamtime import open_shutter_stub, close_shutter_stub
-from collections import ChainMap, OrderedDict
-import pandas as pd
-import datetime
-import functools
-import time
-from bluesky.callbacks import LiveFit
-from bluesky.callbacks.mpl_plotting import LiveFitPlot
-import numpy as np
-from urllib import request
-import json
-from os import chmod
-from pandas.core.common import flatten
-
-
-def xpd_mscan(sample_list, pos_list, scanplan, delay=0, smpl_h=None, flt_h=None, flt_l=None, motor=sample_x):
+from .beamline import bl
+from .job_queue import JobQueue
+from .plans import adaptive_gridplan, gridplan, lineplan, xpd_flt_set, xyposplan
+from .staging import keep_staged
+from .status import batch
+
+
+def save_histroy():
+    """ write the input history of the IPython session to history.txt"""
+    from IPython import get_ipython
+
+    get_ipython().run_line_magic('history', '-o -f history.txt')
+
+
+def xpd_mscan(sample_list, pos_list, scanplan, delay=0, smpl_h=None, flt_h=None, flt_l=None, motor=None,
+              stage_once=True):
     """ multi-sample scan
 
     Perform a multi-sample scan by moving samples to specified positions, applying filters, and executing a scan plan.
@@ -55,7 +56,10 @@ def xpd_mscan(sample_list, pos_list, scanplan, delay=0, smpl_h=None, flt_h=None,
         smpl_h: list of samples which needs special filter set
         flt_h: filter set for smpl_h
         flt_l: filter set for rest of the samples
+        stage_once: stage the area detector once for all the samples instead of once per sample, see `keep_staged`
     """
+    if motor is None:
+        motor = bl.sample_x
     # Input validation
     assert len(sample_list) == len(pos_list), "sample_list and pos_list must have the same length"
 
@@ -69,33 +73,34 @@ def xpd_mscan(sample_list, pos_list, scanplan, delay=0, smpl_h=None, flt_h=None,
     length = len(sample_list)
     print('Total sample numbers:', length)
 
-    for sample, pos in zip(sample_list, pos_list):
-        print(f'Move sample {sample} to position {pos}')
-        motor.move(pos)
+    with batch(length, 'xpd_mscan'), (keep_staged() if stage_once else contextlib.nullcontext()):
+        for sample, pos in zip(sample_list, pos_list):
+            print(f'Move sample {sample} to position {pos}')
+            motor.move(pos)
 
-        # Apply filter if necessary
-        if sample in smpl_h:
-            if flt_h is not None:
-                print(f'Applying special filter set {flt_h} for sample {sample}')
-                xpd_flt_set(flt_h)
-        else:
-            if flt_l is not None:
-                print(f'Applying standard filter set {flt_l} for sample {sample}')
-                xpd_flt_set(flt_l)
+            # Apply filter if necessary
+            if sample in smpl_h:
+                if flt_h is not None:
+                    print(f'Applying special filter set {flt_h} for sample {sample}')
+                    xpd_flt_set(flt_h)
+            else:
+                if flt_l is not None:
+                    print(f'Applying standard filter set {flt_l} for sample {sample}')
+                    xpd_flt_set(flt_l)
 
-        # Delay between sample movements if specified
-        time.sleep(delay)
+            # Delay between sample movements if specified
+            bl.clock.sleep(delay)
 
-        # Run the scan plan
-        print(f'Running scan plan for sample {sample}')
-        xrun(sample, scanplan)
+            # Run the scan plan
+            print(f'Running scan plan for sample {sample}')
+            bl.xrun(sample, scanplan)
 
     print('Multi-sample scan complete.')
 
 
 
 def xpd_m2dscan(sample_list, posx_list, posy_list, scanplan, delay=0, smpl_h=None, flt_h=None, flt_l=None,
-                motorx=sample_x, motory=sample_y):
+                motorx=None, motory=None):
     """ Perform multi-sample scans by moving samples to predefined x and y positions, applying filters,
     and executing a scan plan.
 
@@ -122,6 +127,10 @@ def xpd_m2dscan(sample_list, posx_list, posy_list, scanplan, delay=0, smpl_h=Non
         flt_h: filter set for samples in smpl_h
         flt_l: filter set for rest of the samples
     """
+    if motorx is None:
+        motorx = bl.sample_x
+    if motory is None:
+        motory = bl.sample_y
     # Input validation
     
     if len(sample_list) != len(posx_list) or len(posx_list) != len(posy_list):
@@ -136,24 +145,26 @@ def xpd_m2dscan(sample_list, posx_list, posy_list, scanplan, delay=0, smpl_h=Non
     length = len(sample_list)
     print('Total sample numbers:', length)
 
-    for sample, posx, posy in zip(sample_list, posx_list, posy_list):
-        print(f'Move sample {sample} to position ({posx}, {posy})')
-        motorx.move(posx)
-        motory.move(posy)
-        if sample in smpl_h:
-            if flt_h is not None:
-                xpd_flt_set(flt_h)
-        else:
-            if flt_l is not None:
-                xpd_flt_set(flt_l)
-        # Delay between samples
-        time.sleep(delay)
-        #run the scan plan
-        xrun(sample, scanplan)
-
-        return None
-
-def xpd_battery(smpl_list, posx_list, scanplan, cycle=1, delay=0, motor=sample_x):
+    with batch(length, 'xpd_m2dscan'):
+        for sample, posx, posy in zip(sample_list, posx_list, posy_list):
+            print(f'Move sample {sample} to position ({posx}, {posy})')
+            motorx.move(posx)
+            motory.move(posy)
+            if sample in smpl_h:
+                if flt_h is not None:
+                    xpd_flt_set(flt_h)
+            else:
+                if flt_l is not None:
+                    xpd_flt_set(flt_l)
+            # Delay between samples
+            bl.clock.sleep(delay)
+            #run the scan plan
+            bl.xrun(sample, scanplan)
+
+    return None
+
+
+def xpd_battery(smpl_list, posx_list, scanplan, cycle=1, delay=0, motor=None, queue=None):
     """ multi-battery cycling scan plan, all samples at same y position
 
     Example:
@@ -170,9 +181,13 @@ def xpd_battery(smpl_list, posx_list, scanplan, cycle=1, delay=0, motor=sample_x
         delay (int or float, optional): Time delay (in seconds) between moving each sample and running the scan.
             Default is 0 (no delay).
         motor (object, optional): Motor object used to move the sample holder along the x-axis. Default is `sample_x`.
+        queue (str, optional): JobQueue file recording every finished (cycle, sample); calling again with the
+            same file after an interruption skips what was already measured.
 
 
     """
+    if motor is None:
+        motor = bl.sample_x
 
     # Input validation
     assert len(smpl_list) == len(posx_list), "smpl_list and posx_list must have the same length"
@@ -180,18 +195,26 @@ def xpd_battery(smpl_list, posx_list, scanplan, cycle=1, delay=0, motor=sample_x
     length = len(smpl_list)
     print('Total sample numbers:', length)
 
-    for i in range(cycle):
+    units = [dict(cycle=i, index=j, sample=smpl, posx=posx)
+             for i in range(cycle) for j, (smpl, posx) in enumerate(zip(smpl_list, posx_list))]
+    jobs = JobQueue(queue, units) if queue is not None else None
 
-        for smpl, posx in zip(smpl_list, posx_list):
-            print(f'Cycle {i+1}, moving sample {smpl} to position {posx}')
+    with batch(sum(jobs is None or not jobs.is_done(unit) for unit in units), 'xpd_battery'):
+        for unit in units:
+            if jobs is not None and jobs.is_done(unit):
+                continue
+            smpl, posx = unit['sample'], unit['posx']
+            print(f"Cycle {unit['cycle']+1}, moving sample {smpl} to position {posx}")
             motor.move(posx)
-            time.sleep(delay)
-            xrun(smpl, scanplan)
+            bl.clock.sleep(delay)
+            uids = bl.xrun(smpl, scanplan)
+            if jobs is not None:
+                jobs.mark_done(unit, uids)
 
     return None
 
 
-def xpd_batteryxy(smpl_list, posx_list, posy_list, scanplan, cycle=1, delay=0, motorx=sample_x, motory=sample_y):
+def xpd_batteryxy(smpl_list, posx_list, posy_list, scanplan, cycle=1, delay=0, motorx=None, motory=None):
     """ battery cycling experiment for multiple cells, each at different x and y positions
 
      Example:
@@ -214,27 +237,32 @@ def xpd_batteryxy(smpl_list, posx_list, posy_list, scanplan, cycle=1, delay=0, m
         motory (object, optional): Motor object used to move the sample holder along the y-axis. Default is `sample_y`.
 
     """
+    if motorx is None:
+        motorx = bl.sample_x
+    if motory is None:
+        motory = bl.sample_y
 
     # Input validation
-    if len(smplist) != len(posx_list) or len(posx_list) != len(posy_list):
+    if len(smpl_list) != len(posx_list) or len(posx_list) != len(posy_list):
         raise ValueError("smpl_list, posx_list, and posy_list must have the same length")
     
     length = len(smpl_list)
     print(f'Total sample numbers: {length}')
 
-    for i in range(cycle):
-        print(f"Starting cycle {i + 1}/{cycle}")
-        # Loop through each sample and perform the scan
-        for smpl, posx, posy in zip(smpl_list, posx_list, posy_list):
-            print(f'Cycle {i + 1}, moving sample {smpl} to position (x = {posx}, y = {posy})')
-            motorx.move(posx)
-            motory.move(posy)
-            time.sleep(delay)
-            xrun(smpl, scanplan)
+    with batch(length * cycle, 'xpd_batteryxy'):
+        for i in range(cycle):
+            print(f"Starting cycle {i + 1}/{cycle}")
+            # Loop through each sample and perform the scan
+            for smpl, posx, posy in zip(smpl_list, posx_list, posy_list):
+                print(f'Cycle {i + 1}, moving sample {smpl} to position (x = {posx}, y = {posy})')
+                motorx.move(posx)
+                motory.move(posy)
+                bl.clock.sleep(delay)
+                bl.xrun(smpl, scanplan)
 
 
 
-def linescan(smpl, exp_time, xstart, xend, xpoints, motor=sample_y, md=None, det=None):
+def linescan(smpl, exp_time, xstart, xend, xpoints, motor=None, md=None, det=None):
 
     """  line scan by moving a motor between `xstart` and `xend` in `xpoints` steps and recording measurements.
 
@@ -252,16 +280,18 @@ def linescan(smpl, exp_time, xstart, xend, xpoints, motor=sample_y, md=None, det
         det (list, optional): List of extra detectors to record during the scan. Default is None.
 
     """
+    if motor is None:
+        motor = bl.sample_y
     # Log the scan details
     print(f'Starting line scan for sample {smpl}')
     print(f'Line scan parameters: xstart={xstart}, xend={xend}, xpoints={xpoints}, exp_time={exp_time}s')
 
     # Create the scan plan
     plan = lineplan(exp_time, xstart, xend, xpoints, motor=motor, md=md, det=det)
-    xrun(smpl, plan)
+    bl.xrun(smpl, plan)
 
 
-def mlinescan(smplist, poslist, exp_time, lstart, lend, lpoints, pos_motor=sample_x, lmotor=sample_y,
+def mlinescan(smplist, poslist, exp_time, lstart, lend, lpoints, pos_motor=None, lmotor=None,
               smpl_h=None, flt_l=None, flt_h=None, det=None, md=None):
     """ Perform line scans for multiple samples. For each sample, the function moves the sample to a specified position
      and measures multiple points along a line using a motor.
@@ -287,6 +317,10 @@ def mlinescan(smplist, poslist, exp_time, lstart, lend, lpoints, pos_motor=sampl
          md (dict, optional): Metadata to be associated with the scan. Default is None.
 
      """
+    if pos_motor is None:
+        pos_motor = bl.sample_x
+    if lmotor is None:
+        lmotor = bl.sample_y
     # Input validation
     assert len(smplist) == len(poslist), "sample_list and pos_list must have the same length"
 
@@ -304,26 +338,27 @@ def mlinescan(smplist, poslist, exp_time, lstart, lend, lpoints, pos_motor=sampl
     length = len(smplist)
     print(f'Total sample numbers:{length}')
 
-    for smpl, pos in zip(smplist, poslist):
-        print(f'Moving sample {smpl} to position {pos}')
-        pos_motor.move(pos)
+    with batch(length, 'mlinescan'):
+        for smpl, pos in zip(smplist, poslist):
+            print(f'Moving sample {smpl} to position {pos}')
+            pos_motor.move(pos)
 
-        # Apply filters if necessary
-        if sample in smpl_h:
-            if flt_h is not None:
-                xpd_flt_set(flt_h)
-        else:
-            if flt_l is not None:
-                xpd_flt_set(flt_l)
+            # Apply filters if necessary
+            if smpl in smpl_h:
+                if flt_h is not None:
+                    xpd_flt_set(flt_h)
+            else:
+                if flt_l is not None:
+                    xpd_flt_set(flt_l)
 
-        plan = lineplan(exp_time, lstart, lend, lpoints, motor=lmotor, md=md, det=dets)
-        xrun(smpl, plan)
+            plan = lineplan(exp_time, lstart, lend, lpoints, motor=lmotor, md=md, det=dets)
+            bl.xrun(smpl, plan)
 
 
 
 
 def gridscan(smpl, exp_time, xstart, xstop, xpoints, ystart, ystop, ypoints,
-             motorx=sample_x, motory=sample_y, md=None, det=None):
+             motorx=None, motory=None, md=None, det=None, adaptive=None):
     """
         Perform a grid scan by moving a sample across a grid of x and y points.
 
@@ -342,8 +377,14 @@ def gridscan(smpl, exp_time, xstart, xstop, xpoints, ystart, ystop, ypoints,
             motory (object, optional): Motor object used to move the sample along the y-axis. Default is `sample_y`.
             md (dict, optional): Metadata to be associated with the scan. Default is None.
             det (list, optional): List of extra detectors to record during the scan. Default is None.
+            adaptive (dict, optional): options of `adaptive_gridplan` (threshold, gradient, refine, levels,
+                metric); if given, the grid is the coarse grid of an adaptive map. Default is None.
 
         """
+    if motorx is None:
+        motorx = bl.sample_x
+    if motory is None:
+        motory = bl.sample_y
 
     #log the scannig process
     print(f"Starting grid scan for sample {smpl}...")
@@ -352,12 +393,17 @@ def gridscan(smpl, exp_time, xstart, xstop, xpoints, ystart, ystop, ypoints,
     print(f"Exposure time per point: {exp_time} seconds")
 
     # Create the grid scan plan and execute
-    plan = gridplan(exp_time, xstart, xstop, xpoints, ystart, ystop, ypoints, motorx=motorx, motory=motory, md=md, det=det)
-    xrun(smpl, plan)
+    if adaptive is None:
+        plan = gridplan(exp_time, xstart, xstop, xpoints, ystart, ystop, ypoints, motorx=motorx, motory=motory, md=md,
+                        det=det)
+    else:
+        plan = adaptive_gridplan(exp_time, xstart, xstop, xpoints, ystart, ystop, ypoints, motorx=motorx,
+                                 motory=motory, md=md, det=det, **adaptive)
+    bl.xrun(smpl, plan)
 
 
 def mgridscan(smplist, exp_time, xcenter_list, xrange, xpoints, ycenter_list, yrange, ypoints, delay=1,
-              motorx=sample_x, motory=sample_y, smpl_h=None, flt_l=None, flt_h=None, md=None, det=None):
+              motorx=None, motory=None, smpl_h=None, flt_l=None, flt_h=None, md=None, det=None, adaptive=None):
 
     """ Perform grid scan for multiple samples.
 
@@ -384,8 +430,13 @@ def mgridscan(smplist, exp_time, xcenter_list, xrange, xpoints, ycenter_list, yr
             flt_l (list, optional): Filter set for all other samples. Default is None.
             md (dict, optional): Metadata to be associated with the scan. Default is None.
             det (list, optional): Extra detectors to record during the scan. Default is None.
+            adaptive (dict, optional): options of `adaptive_gridplan`, see `gridscan`. Default is None.
 
         """
+    if motorx is None:
+        motorx = bl.sample_x
+    if motory is None:
+        motory = bl.sample_y
 
     # Input validation
     if len(smplist) != len(xcenter_list) or len(xcenter_list) != len(ycenter_list):
@@ -401,60 +452,73 @@ def mgridscan(smplist, exp_time, xcenter_list, xrange, xpoints, ycenter_list, yr
     length = len(smplist)
     print(f'Total number of samples: {length}')
 
-    for smpl, xcenter, ycenter in zip(smplist, xcenter_list, ycenter_list):
-        print(f'Moving sample {smpl} to center position (x = {xcenter}, y = {ycenter})')
-        motorx.move(xcenter)
-        motory.move(ycenter)
-
-        # Define x and y start/stop positions for the grid scan
-        xstart = xcenter - xrange / 2
-        xstop = xcenter + xrange / 2
-        ystart = ycenter - yrange / 2
-        ystop = ycenter + yrange / 2
-
-        # Apply filters based on sample
-        if smpl in smpl_h:
-            if flt_h is not None:
-                print(f'Applying special filter set {flt_h} for sample {smpl}')
-                xpd_flt_set(flt_h)
-        else:
-            if flt_l is not None:
-                print(f'Applying default filter set {flt_l} for sample {smpl}')
-                xpd_flt_set(flt_l)
-
-        # Add delay after moving the sample and setting filters
-        time.sleep(delay)
-
-        # Log the scanning process
-        print(f"Starting grid scan for sample {smpl}...")
-        print(f"X-axis: from {xstart} to {xstop}, points: {xpoints}")
-        print(f"Y-axis: from {ystart} to {ystop}, points: {ypoints}")
-        print(f"Exposure time per point: {exp_time} seconds")
-
-        # Create the grid scan plan and execute the scan
-        plan = gridplan(exp_time, xstart, xstop, xpoints, ystart, ystop, ypoints, motorx=motorx, motory=motory, md=md,
-                        det=det)
-        xrun(smpl, plan)
-
-
-def xyposscan(smpl, exp_time, posxlist, posylist, motorx=sample_x, motory=sample_y, md=None, det=None):
+    with batch(length, 'mgridscan'):
+        for smpl, xcenter, ycenter in zip(smplist, xcenter_list, ycenter_list):
+            print(f'Moving sample {smpl} to center position (x = {xcenter}, y = {ycenter})')
+            motorx.move(xcenter)
+            motory.move(ycenter)
+
+            # Define x and y start/stop positions for the grid scan
+            xstart = xcenter - xrange / 2
+            xstop = xcenter + xrange / 2
+            ystart = ycenter - yrange / 2
+            ystop = ycenter + yrange / 2
+
+            # Apply filters based on sample
+            if smpl in smpl_h:
+                if flt_h is not None:
+                    print(f'Applying special filter set {flt_h} for sample {smpl}')
+                    xpd_flt_set(flt_h)
+            else:
+                if flt_l is not None:
+                    print(f'Applying default filter set {flt_l} for sample {smpl}')
+                    xpd_flt_set(flt_l)
+
+            # Add delay after moving the sample and setting filters
+            bl.clock.sleep(delay)
+
+            # Log the scanning process
+            print(f"Starting grid scan for sample {smpl}...")
+            print(f"X-axis: from {xstart} to {xstop}, points: {xpoints}")
+            print(f"Y-axis: from {ystart} to {ystop}, points: {ypoints}")
+            print(f"Exposure time per point: {exp_time} seconds")
+
+            # Create the grid scan plan and execute the scan
+            if adaptive is None:
+                plan = gridplan(exp_time, xstart, xstop, xpoints, ystart, ystop, ypoints, motorx=motorx, motory=motory,
+                                md=md, det=det)
+            else:
+                plan = adaptive_gridplan(exp_time, xstart, xstop, xpoints, ystart, ystop, ypoints, motorx=motorx,
+                                         motory=motory, md=md, det=det, **adaptive)
+            bl.xrun(smpl, plan)
+
+
+def xyposscan(smpl, exp_time, posxlist, posylist, motorx=None, motory=None, md=None, det=None, group=True):
 
     """ Perform a multiple points scan for one sample by moving to predefined x and y positions.
 
         Parameters:
             smpl (str or int): Sample ID.
-            exp_time (float): Total exposure time (in seconds) for each measurement.
+            exp_time (float or list): Total exposure time (in seconds) for each measurement, or one per
+                position; see `xyposplan`.
             posxlist (list): List of x positions for the sample.
             posylist (list): List of y positions for the sample.
             motorx (object, optional): Motor object to move the sample along the x-axis. Default is `sample_x`.
             motory (object, optional): Motor object to move the sample along the y-axis. Default is `sample_y`.
             md (dict, optional): Metadata to be associated with the scan. Default is None.
             det (list, optional): Extra detectors to record during the scan. Default is None.
+            group (bool, optional): with one exposure per position, measure the positions grouped by
+                exposure. Default is True.
 
         Example:
             >>> xyposscan(1, 5.0, [0, 10, 20], [0, 15, 25])
+            >>> xyposscan(1, [5.0, 30.0, 5.0], [0, 10, 20], [0, 15, 25])
 
     """
+    if motorx is None:
+        motorx = bl.sample_x
+    if motory is None:
+        motory = bl.sample_y
 
     # Ensure posxlist and posylist have the same length
     if len(posxlist) != len(posylist):
@@ -466,5 +530,41 @@ def xyposscan(smpl, exp_time, posxlist, posylist, motorx=sample_x, motory=sample
     print(f"Exposure time per position: {exp_time} seconds")
 
     # Create the plan using xyposplan and execute the plan using xrun
-    plan = xyposplan(exp_time, posxlist, posylist, motorx=motorx, motory=motory, md=md, det=det)
-    xrun(smpl, plan)
+    plan = xyposplan(exp_time, posxlist, posylist, motorx=motorx, motory=motory, md=md, det=det, group=group)
+    bl.xrun(smpl, plan)
+
+
+def move_to_position(motorx, posx, motory, posy):
+    """
+    Helper function to move the X and Y motors only if they are not already at the desired positions.
+
+    Parameters
+    ----------
+    motorx : motor
+        The motor controlling the X position.
+
+    posx : float
+        The desired X position.
+
+    motory : motor
+        The motor controlling the Y position.
+
+    posy : float
+        The desired Y position.
+
+    Returns
+    -------
+    None
+    """
+    current_x = motorx.read()
+    current_y = motory.read()
+
+    # Move X motor only if not already at the desired position
+    if current_x != posx:
+        logging.info(f"Moving motor X from {current_x} to {posx}")
+        motorx.move(posx)
+
+    # Move Y motor only if not already at the desired position
+    if current_y != posy:
+        logging.info(f"Moving motor Y from {current_y} to {posy}")
+        motory.move(posy)
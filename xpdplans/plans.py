@@ -0,0 +1,721 @@
+"""
+Basic plans (count, line, grid and position scans with the area detector),
+filter bank helpers and the xlsx export of run tables.
+"""
+import datetime
+import os
+import tempfile
+import typing
+
+import numpy as np
+import pandas as pd
+import bluesky.plan_stubs as bps
+import bluesky.plans as bp
+import bluesky.preprocessors as bpp
+from bluesky.callbacks import LiveTable
+from ophyd import Signal
+
+from .beamline import bl
+from .live_roi import live_roi
+from .shutter import shutter_policy
+
+
+def plan_with_calib(dets, exp_time, num, calib_file, delay=None):
+    """ plan for a scan with detectors and apply calibration from a file.
+
+    Args:
+        dets (list): List of detectors to be used during the scan.
+        exp_time (float): Exposure time (in seconds) for each reading.
+        num (int): Number of readings to take.
+        calib_file (str): Path to the calibration file.
+        delay (float, optional): Delay (in seconds) between successive readings. Default is no delay.
+
+    Example:
+        plan_with_calib([pec1, det2], 5.0, 10, calib_file='xrd.poni')
+    """
+
+    motors = dets[1:]
+    # Configure the area detector
+    yield from bl._configure_area_det(exp_time)
+    plan = count_with_calib(dets, num, delay=delay, calibration_md=calib_file)
+    plan = bpp.subs_wrapper(plan, LiveTable(motors))
+    yield from plan
+
+
+def count_with_calib(detectors: list, num: int = 1, delay: float = None, *, calibration_md: dict = None,
+                     md: dict = None) -> typing.Generator:
+    """
+    Take one or more readings from detectors with shutter control and calibration metadata injection.
+
+    Parameters
+    ----------
+    detectors : list
+        list of 'readable' objects
+
+    num : integer, optional
+        number of readings to take; default is 1
+
+        If None, capture data until canceled
+
+    delay : iterable or scalar, optional
+        Time delay in seconds between successive readings; default is 0.
+
+    calibration_md :
+        The calibration data in a dictionary. If not applied, the function is a normal `bluesky.plans.count`.
+
+    md : dict, optional
+        metadata
+
+    Notes
+    -----
+    If ``delay`` is an iterable, it must have at least ``num - 1`` entries or
+    the plan will raise a ``ValueError`` during iteration.
+    """
+    if md is None:
+        md = dict()
+    if calibration_md is not None:
+        md["calibration_md"] = calibration_md
+
+    def _per_shot(_detectors):
+        yield from bl.open_shutter_stub()
+        yield from bps.one_shot(_detectors)
+        yield from bl.close_shutter_stub()
+        return
+
+    try:
+        plan = bp.count(detectors, num, delay, md=md, per_shot=_per_shot)
+        sts = yield from plan
+    except Exception as error:
+        raise error
+    return sts
+
+
+def ct_motors_plan(det, exp_time, num=1, delay=0, md=None):
+    """plan for performing multiple readings of detectors (e.g., temperature controller, motor positions) and display results
+    in real-time using LiveTable.
+
+    Parameters:
+        det (list): List of detectors to be read during the scan (e.g., area detector, temperature controller, motors).
+        exp_time (float): Exposure time (in seconds) for each reading.
+        num (int, optional): Number of readings to take. Default is 1.
+        delay (float, optional): Delay (in seconds) between successive readings. Default is 0.
+        md (dict, optional): Additional metadata to attach to the scan. Default is None.
+
+    Example:
+        ct_motors_plan([area_det, T_controller, motor], 5.0, num=10, delay=1)
+
+    """
+    # Configure the area detector
+    (num_frame, acq_time, computed_exposure) = yield from bl._configure_area_det(exp_time)
+
+    # Metadata handling
+    _md = {
+
+        "sp_time_per_frame": acq_time,
+        "sp_num_frames": num_frame,
+        "sp_requested_exposure": exp_time,
+        "sp_computed_exposure": computed_exposure,
+    }
+
+    _md.update(md or {})
+
+    motors = det[1:]
+    plan = bp.count(det, num, delay, md=_md)
+    plan = bpp.subs_wrapper(plan, LiveTable(motors))
+    plan = shutter_policy.wrap(plan)
+    yield from plan
+
+
+def lineplan(exp_time, xstart, xend, xpoints, motor=None, md=None, det=None, roi=None, roi_derived=False):
+    """ plan for 1D line scan by moving a motor between two positions and recording measurements at multiple points.
+
+    Parameters:
+        exp_time (float): Total exposure time (in seconds) for each measurement point.
+        xstart (float): Starting position for the motor.
+        xend (float): Ending position for the motor.
+        xpoints (int): Number of points to measure along the line.
+        motor (object, optional): Motor object to move the sample along the line. Default is `sample_y`.
+        md (dict, optional): Additional metadata to attach to the scan.
+        det (list, optional): List of extra detectors to record during the scan.
+        roi (LiveROI, optional): live ROI reduction of the frames, see live_roi.py.
+        roi_derived (bool, optional): also record the ROI results in streams of their own. Default is False.
+
+    Example:
+        lineplan(5.0, 0, 10, 5, motor=sample_y)
+
+    """
+    if motor is None:
+        motor = bl.sample_y
+
+    if det is None:
+        det = []
+    # Configure the area detector
+    (num_frame, acq_time, computed_exposure) = yield from bl._configure_area_det(exp_time)
+
+    # Metadata handling
+    _md = {
+
+        "sp_time_per_frame": acq_time,
+        "sp_num_frames": num_frame,
+        "sp_requested_exposure": exp_time,
+        "sp_computed_exposure": computed_exposure,
+    }
+    _md.update(md or {})
+
+    area_det = bl.xpd_configuration['area_det']
+
+    plan = bp.scan([area_det] + det, motor, xstart, xend, xpoints, md=_md)
+    plan = bpp.subs_wrapper(plan, LiveTable([motor] + det))
+    plan = shutter_policy.wrap(plan)
+    if roi is not None:
+        plan = live_roi(plan, roi, derived=roi_derived)
+    yield from plan
+
+
+def gridplan(exp_time, xstart, xstop, xpoints, ystart, ystop, ypoints, motorx=None, motory=None, md=None,
+             det=None, roi=None, roi_derived=False):
+
+    """ plan for 2D grid scan by moving two motors across specified ranges and collecting data using detectors.
+
+    Example:
+        gridplan(5.0, 0, 10, 5, 0, 10, 5)
+
+    Parameters:
+        exp_time (float): Total exposure time (in seconds) for each measurement point.
+        xstart (float): Starting position for the x-axis (motorx).
+        xstop (float): Ending position for the x-axis (motorx).
+        xpoints (int): Number of points to measure along the x-axis.
+        ystart (float): Starting position for the y-axis (motory).
+        ystop (float): Ending position for the y-axis (motory).
+        ypoints (int): Number of points to measure along the y-axis.
+        motorx (object, optional): Motor object to move the sample along the x-axis. Default is `sample_x`.
+        motory (object, optional): Motor object to move the sample along the y-axis. Default is `sample_y`.
+        md (dict, optional): Additional metadata to attach to the scan.
+        det (list, optional): List of extra detectors to record during the scan.
+        roi (LiveROI, optional): live ROI reduction of the frames, see live_roi.py.
+        roi_derived (bool, optional): also record the ROI results in streams of their own. Default is False.
+    """
+    if motorx is None:
+        motorx = bl.sample_x
+    if motory is None:
+        motory = bl.sample_y
+
+    if det is None:
+        det = []
+
+    # Configure the ara detector
+    (num_frame, acq_time, computed_exposure) = yield from bl._configure_area_det(exp_time)
+
+    # Metadata
+    _md = {
+        "sp_time_per_frame": acq_time,
+        "sp_num_frames": num_frame,
+        "sp_requested_exposure": exp_time,
+        "sp_computed_exposure": computed_exposure,
+    }
+    _md.update(md or {})
+
+    area_det = bl.xpd_configuration['area_det']
+
+    plan = bp.grid_scan([area_det]+det, motory, ystart, ystop, ypoints, motorx, xstart, xstop, xpoints, True, md=_md)
+    plan = bpp.subs_wrapper(plan, LiveTable([motorx, motory]+det))
+    plan = shutter_policy.wrap(plan)
+    if roi is not None:
+        plan = live_roi(plan, roi, derived=roi_derived)
+    yield from plan
+
+
+def _snake_order(points):
+    """*points* (n, 2) sorted row by row in y, alternating the x direction like a snaked grid_scan."""
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    row = np.unique(points[:, 1], return_inverse=True)[1]
+    order = np.lexsort((np.where(row % 2, -points[:, 0], points[:, 0]), row))
+    return points[order]
+
+
+def _split_cells(cells, refine):
+    """Split each cell ``(x0, x1, y0, y1)`` of *cells* (n, 4) into *refine* x *refine* cells."""
+    steps = np.linspace(0, 1, refine + 1)
+    x = cells[:, :1] + (cells[:, 1:2] - cells[:, :1]) * steps
+    y = cells[:, 2:3] + (cells[:, 3:4] - cells[:, 2:3]) * steps
+    i, j = np.meshgrid(np.arange(refine), np.arange(refine), indexing='ij')
+    i, j = i.ravel(), j.ravel()
+    return np.stack([x[:, i], x[:, i + 1], y[:, j], y[:, j + 1]], axis=-1).reshape(-1, 4)
+
+
+def _corners(cells):
+    """The four corners ``(x, y)`` of each cell, shape (n, 4, 2)."""
+    return np.stack([cells[:, [0, 2]], cells[:, [1, 2]], cells[:, [0, 3]], cells[:, [1, 3]]], axis=1)
+
+
+def _point_key(x, y):
+    # grid coordinates computed along different paths must compare equal
+    return round(float(x), 9), round(float(y), 9)
+
+
+def _scorer(metric, area_det):
+    """
+    Function of the readings of a point returning its score, see the *metric* of `adaptive_gridplan`.
+
+    Called before the run, so that a default metric the area detector cannot provide fails before any data
+    is taken: the image sum needs the image itself in the readings, while a detector writing its frames to
+    files only returns references to them.
+    """
+    if metric is None:
+        image = [key for key, desc in area_det.describe().items()
+                 if len(desc.get('shape') or ()) >= 2 and 'external' not in desc]
+        if not image:
+            raise ValueError(f"{area_det.name} does not return its image in the readings to score the points "
+                             f"with, give a metric, e.g. metric={area_det.name}.stats1.total")
+        image = image[0]
+
+    def score(reading):
+        if metric is None:
+            return float(np.sum(reading[image]['value']))
+        if hasattr(metric, 'read'):
+            return float(reading[metric.name]['value'])
+        return float(metric(reading))
+    return score
+
+
+def adaptive_gridplan(exp_time, xstart, xstop, xpoints, ystart, ystop, ypoints, motorx=None, motory=None,
+                      threshold=0.5, gradient=None, refine=2, levels=1, contrast=0.05, metric=None, md=None,
+                      det=None):
+    """ plan for a 2D map that measures a coarse grid first and refines it only where the sample is interesting.
+
+    The coarse grid is the one `gridplan` measures.  Every point is scored with *metric* as it is read.
+    A cell of the grid (the rectangle between four neighbouring points) is then split *refine* times
+    along each axis if the score at one of its corners is at least *threshold*, or, with *gradient*,
+    if its corner scores differ by at least *gradient*; the new points are measured, and the split
+    cells are looked at again, for *levels* rounds.  Scores are compared normalised to the range
+    measured so far, 0 for the lowest and 1 for the highest; if that range is below *contrast*
+    the map has no features and nothing is refined.  All points go into one run.
+
+    Parameters:
+        exp_time (float): Total exposure time (in seconds) for each measurement point.
+        xstart, xstop, xpoints, ystart, ystop, ypoints: the coarse grid, as for `gridplan`.
+        motorx (object, optional): Motor object to move the sample along the x-axis. Default is `sample_x`.
+        motory (object, optional): Motor object to move the sample along the y-axis. Default is `sample_y`.
+        threshold (float or None): normalised score from which a cell is refined; None: only by gradient.
+        gradient (float, optional): normalised score difference within a cell from which it is refined.
+        refine (int): number of parts each refined cell is split into along each axis.
+        levels (int): rounds of refinement; 0 only measures the coarse grid.
+        contrast (float): smallest (highest - lowest) / highest score that counts as a feature rather than noise.
+        metric (optional): signal read at every point whose value is the score, e.g. ``pe1c.stats1.total``,
+            or a function of the readings of a point (dict, as returned by ``trigger_and_read``)
+            returning the score.  Default is the sum of the area detector image, which needs the
+            image itself in the readings, as in the simulated profile; at the beamline the frames
+            are written to files, so give a metric there (checked before the run starts).
+        md (dict, optional): Additional metadata to attach to the scan.
+        det (list, optional): List of extra detectors to record during the scan.
+
+    Returns:
+        dict: ``(x, y) -> score`` of every point measured.
+
+    Example:
+        adaptive_gridplan(5.0, 0, 10, 6, 0, 10, 6, threshold=0.3, levels=2, metric=pe1c.stats1.total)
+    """
+    if motorx is None:
+        motorx = bl.sample_x
+    if motory is None:
+        motory = bl.sample_y
+    if det is None:
+        det = []
+    area_det = bl.xpd_configuration['area_det']
+    dets = [area_det] + det
+    if metric is not None and hasattr(metric, 'read') and metric not in dets:
+        dets.append(metric)
+
+    score = _scorer(metric, area_det)
+
+    (num_frame, acq_time, computed_exposure) = yield from bl._configure_area_det(exp_time)
+    _md = {
+        "sp_time_per_frame": acq_time,
+        "sp_num_frames": num_frame,
+        "sp_requested_exposure": exp_time,
+        "sp_computed_exposure": computed_exposure,
+        "plan_name": "adaptive_gridplan",
+        "detectors": [d.name for d in dets],
+        "motors": [motorx.name, motory.name],
+        "adaptive": dict(shape=[ypoints, xpoints], threshold=threshold, gradient=gradient, refine=refine,
+                         levels=levels, contrast=contrast),
+    }
+    _md.update(md or {})
+
+    scores = {}
+
+    def measure(points):
+        for x, y in _snake_order(points):
+            yield from bps.mv(motorx, x, motory, y)
+            reading = yield from bps.trigger_and_read(dets + [motorx, motory])
+            scores[_point_key(x, y)] = score(reading)
+
+    @bpp.stage_decorator(dets)
+    @bpp.run_decorator(md=_md)
+    def inner():
+        xs = np.linspace(xstart, xstop, xpoints)
+        ys = np.linspace(ystart, ystop, ypoints)
+        yield from measure(np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2))
+        cells = np.array([[x0, x1, y0, y1] for x0, x1 in zip(xs, xs[1:]) for y0, y1 in zip(ys, ys[1:])])
+        for level in range(levels):
+            if not len(cells):
+                break
+            measured = np.array(list(scores.values()))
+            span = np.ptp(measured)
+            if span <= contrast * np.abs(measured).max():
+                print(f'level {level + 1}: no contrast in the scores, nothing to refine')
+                break
+            corner_scores = np.array([[scores[_point_key(x, y)] for x, y in c] for c in _corners(cells)])
+            norm = (corner_scores - measured.min()) / span
+            hot = np.zeros(len(cells), dtype=bool)
+            if threshold is not None:
+                hot |= norm.max(axis=1) >= threshold
+            if gradient is not None:
+                hot |= np.ptp(norm, axis=1) >= gradient
+            cells = _split_cells(cells[hot], refine)
+            new = {_point_key(x, y): (x, y) for x, y in _corners(cells).reshape(-1, 2)}
+            new = [xy for key, xy in new.items() if key not in scores]
+            print(f'level {level + 1}: refining {hot.sum()} of {len(hot)} cells, {len(new)} new points')
+            yield from measure(new)
+
+    # run_decorator returns the run uid, not what inner returns
+    yield from bpp.subs_wrapper(shutter_policy.wrap(inner()), LiveTable([motorx, motory] + det))
+    return dict(scores)
+
+
+def _exposure_groups(exposures, group=True):
+    """
+    Measuring order of points with per-point *exposures*, and the indices where the detector is reconfigured.
+
+    With *group*, points of equal exposure are measured together, in increasing exposure and in their
+    given order within a group, so the detector is configured once per distinct exposure; otherwise
+    the given order is kept and it is configured whenever the exposure differs from the previous point.
+    """
+    exposures = np.asarray(exposures, dtype=float)
+    order = np.argsort(exposures, kind='stable') if group else np.arange(len(exposures))
+    ordered = exposures[order]
+    changes = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]]) if len(ordered) else np.array([], dtype=int)
+    return order, changes
+
+
+def xyposplan(exp_time, posxlist, posylist, motorx=None, motory=None, md=None, det=None, roi=None,
+              roi_derived=False, group=True):
+    """ plan for a scan over a set of predefined x and y positions.
+
+    *exp_time* may also be a list with one exposure per position, e.g. short for strong and long for
+    weak scatterers.  The area detector is then reconfigured only when the exposure changes, and with
+    *group* the points are measured grouped by exposure, so that happens once per distinct exposure.
+    The start document then has the exposures in the given order as ``sp_requested_exposures`` and
+    the measuring order as ``sp_exposure_order``, and every event has the requested exposure, number
+    of frames and computed exposure of its point as ``sp_requested_exposure``, ``sp_num_frames`` and
+    ``sp_computed_exposure``; each exposure gets an event descriptor of its own, with the detector
+    configuration it was measured with.  The same exposure everywhere is a single exposure.
+
+    Parameters:
+        exp_time (float or list): Total exposure time (in seconds) for each measurement, or one per position.
+        posxlist (list): List of x positions for the sample.
+        posylist (list): List of y positions for the sample.
+        motorx (object, optional): Motor object to move the sample along the x-axis. Default is `sample_x`.
+        motory (object, optional): Motor object to move the sample along the y-axis. Default is `sample_y`.
+        md (dict, optional): Additional metadata to attach to the scan.
+        det (list, optional): List of extra detectors to record during the scan.
+        roi (LiveROI, optional): live ROI reduction of the frames, see live_roi.py.
+        roi_derived (bool, optional): also record the ROI results in streams of their own. Default is False.
+        group (bool, optional): with a list of exposures, measure the points grouped by exposure rather
+            than in the given order. Default is True.
+
+    Example:
+        plan = xyposplan(5, [10, 13, 20], [1.2, 1.3, 1.4])
+        plan = xyposplan([1, 10, 1], [10, 13, 20], [1.2, 1.3, 1.4])
+
+       """
+    if motorx is None:
+        motorx = bl.sample_x
+    if motory is None:
+        motory = bl.sample_y
+    # Input validation
+    if len(posxlist) != len(posylist):
+        raise ValueError("posxlist and posylist must have the same length")
+    if np.ndim(exp_time) and len(exp_time) != len(posxlist):
+        raise ValueError("exp_time must be one exposure or one per position")
+
+    if np.ndim(exp_time) and len(set(exp_time)) == 1:
+        exp_time = exp_time[0]
+
+    if det is None:
+        det = []
+    area_det = bl.xpd_configuration['area_det']
+
+    if np.ndim(exp_time):
+        plan = _xypos_exposures(exp_time, posxlist, posylist, motorx, motory, [area_det] + det, md, group)
+    else:
+        # Configure detector
+        (num_frame, acq_time, computed_exposure) = yield from bl._configure_area_det(exp_time)
+
+        # Metadata
+        _md = {
+
+            "sp_time_per_frame": acq_time,
+            "sp_num_frames": num_frame,
+            "sp_requested_exposure": exp_time,
+            "sp_computed_exposure": computed_exposure,
+        }
+        _md.update(md or {})
+
+        plan = bp.list_scan([area_det]+det, motorx, posxlist, motory, posylist, md=_md)
+    plan = bpp.subs_wrapper(plan, LiveTable([motorx, motory]+det))
+    plan = shutter_policy.wrap(plan)
+    if roi is not None:
+        plan = live_roi(plan, roi, derived=roi_derived)
+    yield from plan
+
+
+def _xypos_exposures(exposures, posxlist, posylist, motorx, motory, dets, md, group):
+    """The list_scan of `xyposplan` with one exposure per point, reconfiguring the detector only on a change."""
+    exposures = [float(e) for e in exposures]
+    order, changes = _exposure_groups(exposures, group)
+    area_det = dets[0]
+    # the configuration of each point, read with it into the primary stream
+    point_config = [Signal(name=name, value=0) for name in
+                    ("sp_requested_exposure", "sp_num_frames", "sp_computed_exposure")]
+
+    # the first exposure measured, before the run like the single exposure of list_scan
+    (num_frame, acq_time, computed_exposure) = yield from bl._configure_area_det(exposures[order[0]])
+    _md = {
+        "sp_time_per_frame": acq_time,
+        "sp_requested_exposures": exposures,
+        "sp_exposure_order": order.tolist(),
+        "plan_name": "xyposplan",
+        "detectors": [d.name for d in dets],
+        "motors": [motorx.name, motory.name],
+        "num_points": len(exposures),
+        "num_intervals": len(exposures) - 1,
+        "plan_args": {"posxlist": list(posxlist), "posylist": list(posylist)},
+    }
+    _md.update(md or {})
+    reconfigure = set(changes.tolist()) - {0}
+
+    @bpp.stage_decorator(list(dets) + [motorx, motory])
+    @bpp.run_decorator(md=_md)
+    def inner():
+        configured = (exposures[order[0]], num_frame, computed_exposure)
+        for k, i in enumerate(order):
+            if k in reconfigure:
+                (frames, _, computed) = yield from bl._configure_area_det(exposures[i])
+                configured = (exposures[i], frames, computed)
+                # a new event descriptor, with the new detector configuration
+                yield from bps.configure(area_det, {})
+            for signal, value in zip(point_config, configured):
+                signal.put(value)
+            yield from bps.mv(motorx, posxlist[i], motory, posylist[i])
+            yield from bps.trigger_and_read(list(dets) + [motorx, motory] + point_config)
+
+    return (yield from inner())
+
+
+def take_one_dark(sample, det, exp_time):
+    """ take one data with dark image, then set dark window to 1000 minutes
+
+    parameter:
+    sample (int): sample name(index) in sample list
+    det (list): list of detectors
+    exp_time (float): exposure time in seconds
+
+    """
+    bl.glbl['dk_window'] = 0.1
+    plan = ct_motors_plan(det, exp_time)
+    bl.xrun(sample, plan)
+    bl.glbl['dk_window'] = 1000
+# ------------------------------------------------------------------------------------------------------------------------
+
+
+def append_compatible(df, new_data, sort=False):
+    """
+    Append new_data to df in a way that's compatible with different pandas versions.
+
+    Parameters:
+        df (DataFrame): The original DataFrame to append data to.
+        new_data (DataFrame): The new data to append to the original DataFrame.
+        sort (bool): Whether to sort columns or not (for pandas <= 1.4.x).
+
+    Returns:
+        DataFrame: The resulting DataFrame after appending new_data.
+    """
+    # imported here rather than at profile load, it is only needed when saving tables
+    from packaging import version
+
+    pandas_version = pd.__version__
+
+    if version.parse(pandas_version) >= version.parse("2.0.0"):
+        # For pandas >= 2.0.0, DataFrame.append is gone (and _append with it in 3.0)
+        return pd.concat([df, new_data], sort=sort)
+    else:
+        # For pandas < 2.0.0
+        return df.append(new_data, sort=sort)
+
+def save_tb_xlsx(sample_name, starttime, endtime, readable_time=False):
+    if not readable_time:
+        startstring = datetime.datetime.fromtimestamp(float(starttime)).strftime('%Y-%m-%d %H:%M:%S')
+        endstring = datetime.datetime.fromtimestamp(float(endtime)).strftime('%Y-%m-%d %H:%M:%S')
+    else:
+        startstring = starttime
+        endstring = endtime
+
+    hdrs = bl.db(since=startstring, until=endstring)
+    _write_tb_xlsx(sample_name, list(hdrs))
+
+
+def save_uids_xlsx(sample_name, uids):
+    """ Save the tables of the runs *uids* to one xlsx file, like save_tb_xlsx does for a time window.
+
+    Parameters:
+        sample_name: sample name(index), used in the file name.
+        uids (list): uids returned by xrun, in the order the rows should appear.
+    """
+    _write_tb_xlsx(sample_name, [bl.db[uid] for uid in uids])
+
+
+def _write_tb_xlsx(sample_name, hdrs):
+    data_dir = "./tiff_base/"
+    timestamp = bl.clock.time()
+    timestring_filename = datetime.datetime.fromtimestamp(float(timestamp)).strftime('%Y%m%d_%H%M%S')
+    file_name = data_dir + 'sample_' + str(sample_name) + '_' + timestring_filename + ".xlsx"
+    print(len(hdrs))
+
+    DBout = None  # Initialize DBout
+    for idx, hdr in enumerate(hdrs):
+        try:
+            tb = join_log_streams(hdr, hdr.table())
+            uid6 = hdr.start['uid'][0:6]
+            tb['uid6'] = uid6
+            if idx == 0:
+                DBout = tb
+            else:
+                # Use append_compatible to handle Pandas version differences
+                DBout = append_compatible(DBout, tb, sort=False)
+        except IndexError:
+            pass
+    with pd.ExcelWriter(file_name) as writer:
+        DBout.to_excel(writer, sheet_name='Sheet1')
+
+
+def join_log_streams(hdr, tb):
+    """ Add the reading of every log stream of *hdr* (see temp_log.py) nearest in time to each row of *tb*.
+
+    Parameters:
+        hdr: databroker header.
+        tb (DataFrame): table of the primary stream of *hdr*.
+    """
+    for stream in hdr.stream_names:
+        # monitor streams are called <name>_monitor in newer bluesky
+        if not stream.endswith(('_log', '_log_monitor')):
+            continue
+        try:
+            log = hdr.table(stream)
+        except IndexError:
+            continue
+        if log.empty or tb.empty:
+            continue
+        log = log[['time'] + [c for c in log.columns if c != 'time']]
+        joined = pd.merge_asof(tb.reset_index().sort_values('time'), log.sort_values('time'),
+                               on='time', direction='nearest')
+        tb = joined.set_index(tb.index.name or 'index')
+    return tb
+
+
+def save_position_to_sample_list(smpl_list, pos_list, filename):
+    """ Update the 'User supplied tags' column in the Excel file with positions from pos_list.
+
+    'pos=<position>' is appended to the tags of every sample in one vectorized update, and the sheet is
+    written to a temporary file that then replaces the original, so an interrupted write never leaves
+    a half-written sample sheet.
+
+    Parameters:
+        smpl_list (list): List of sample indices (0-based).
+        pos_list (list): List of positions to be added to the corresponding samples in 'User supplied tags'.
+        filename (str): Name of the Excel file to read and update.
+
+    Returns:
+        None
+    """
+    # file_name='300001_sample.xlsx'
+
+    file_dir = './Import/'
+    file_name = os.path.join(file_dir, filename)
+    if not os.path.isfile(file_name):
+        raise FileNotFoundError(f"The file '{file_name}' does not exist.")
+
+    f = pd.read_excel(file_name)
+    col = 'User supplied tags'
+    tags = f[col].astype(object) if col in f else pd.Series(None, index=f.index, dtype=object)
+
+    # sample index i is on sheet row i + 1; positions of a sample listed twice are all appended
+    rows = np.asarray(smpl_list, dtype=int) + 1
+    new = pd.Series(['pos=' + str(x) for x in pos_list], index=rows)
+    new = new[new.index < len(f)]
+    new = new.groupby(level=0, sort=False).agg(','.join)
+
+    old = tags.iloc[new.index]
+    empty = (old.isna() | (old == 0)).values
+    tags.iloc[new.index] = np.where(empty, new.values, old.astype(str).values + ',' + new.values)
+    f[col] = tags
+
+    fd, tmp_name = tempfile.mkstemp(dir=file_dir, prefix='.' + filename, suffix='.xlsx')
+    os.close(fd)
+    try:
+        with pd.ExcelWriter(tmp_name) as writer:
+            f.to_excel(writer, index=False)
+        os.replace(tmp_name, file_name)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+    return None
+
+
+def xpd_flt_set(flt_p):
+    fb = bl.fb
+    if flt_p[0] == 0:
+        fb.flt1.set('Out')
+    else:
+        fb.flt1.set('In')
+    if flt_p[1] == 0:
+        fb.flt2.set('Out')
+    else:
+        fb.flt2.set('In')
+    if flt_p[2] == 0:
+        fb.flt3.set('Out')
+    else:
+        fb.flt3.set('In')
+    if flt_p[3] == 0:
+        fb.flt4.set('Out')
+    else:
+        fb.flt4.set('In')
+
+    print('filter bank setting:', fb.flt1.get(), fb.flt2.get(), fb.flt3.get(), fb.flt4.get())
+
+    return None
+
+
+def xpd_flt_read():
+    fb = bl.fb
+    flt_p = [0, 0, 0, 0]
+    if fb.flt1.get() == 'Out':
+        flt_p[0] = 0
+    else:
+        flt_p[0] = 1
+    if fb.flt2.get() == 'Out':
+        flt_p[1] = 0
+    else:
+        flt_p[1] = 1
+
+    if fb.flt3.get() == 'Out':
+        flt_p[2] = 0
+    else:
+        flt_p[2] = 1
+    if fb.flt4.get() == 'Out':
+        flt_p[3] = 0
+    else:
+        flt_p[3] = 1
+
+    return flt_p
@@ -0,0 +1,203 @@
+"""
+Batch runs driven by the sample sheet in ./Import/.
+
+`SampleTable` reads the xpdacq sample sheet once and indexes it by sample
+index (the index used by ``xrun``).  Per-sample settings come from
+``key=value`` pairs in the 'User supplied tags' column, the same column
+``save_position_to_sample_list`` writes ``pos=`` into:
+
+    pos=12.5      sample_x position
+    flt=h         needs the special filter set (smpl_h / pdf_flt_h)
+    mode=pdf      pdf or xrd for the two-detector batch; no mode: single detector
+    exp=60        exposure time for the two-detector batch, in seconds
+    sp=1          scanplan index for single-detector samples
+
+`run_sample_table` turns the table into ``xpd_mscan`` / ``mrun_2det_batch``
+calls and writes the positions it was given back into the sheet in one go.
+
+Example:
+    st = SampleTable('300001_sample.xlsx')
+    st.table                                 # one row per sample index
+    run_sample_table(st, scanplan=0, positions={5: 40.0}, dry_run=True)    # print the calls
+    run_sample_table(st, scanplan=0, positions={5: 40.0}, flt_h=[1, 0, 0, 0], flt_l=[0, 0, 0, 0])
+"""
+import os
+
+import pandas as pd
+
+from .mrun_2det import mrun_2det_batch
+from .mscan_run import xpd_mscan
+from .plans import save_position_to_sample_list
+
+# tag key -> (column, type)
+TAG_COLUMNS = {
+    "pos": ("posx", float),
+    "flt": ("flt", str),
+    "mode": ("mode", str),
+    "exp": ("exp", float),
+    "sp": ("sp", int),
+}
+
+
+def parse_tags(tags):
+    """Parse a 'User supplied tags' cell (``'a,pos=10,mode=pdf'``) into a dict of the known keys."""
+    parsed = {}
+    if not isinstance(tags, str):
+        return parsed
+    for item in tags.split(','):
+        key, sep, value = item.partition('=')
+        key = key.strip()
+        if sep and key in TAG_COLUMNS:
+            column, cast = TAG_COLUMNS[key]
+            try:
+                parsed[column] = cast(value.strip())
+            except ValueError:
+                pass
+    return parsed
+
+
+class SampleTable:
+    """
+    The sample sheet *filename* in *file_dir*, read once.
+
+    Attributes:
+        sheet (DataFrame): the sheet as read, rows in file order.
+        table (DataFrame): one row per sample index with ``name``, ``posx``, ``flt``,
+            ``mode``, ``exp``, ``sp`` and the raw ``tags``.
+    """
+
+    # the first sheet row is the example row, sample index 0 is the second
+    first_row = 1
+
+    def __init__(self, filename, file_dir='./Import/'):
+        self.filename = filename
+        self.file_name = os.path.join(file_dir, filename)
+        if not os.path.isfile(self.file_name):
+            raise FileNotFoundError(f"The file '{self.file_name}' does not exist.")
+        self.sheet = pd.read_excel(self.file_name)
+        self.table = self._index(self.sheet)
+        self._positions = {}
+
+    def _index(self, sheet):
+        rows = sheet.iloc[self.first_row:]
+        names = rows['Sample Name'] if 'Sample Name' in rows else pd.Series(index=rows.index, dtype=object)
+        tags = rows['User supplied tags'] if 'User supplied tags' in rows else pd.Series(index=rows.index, dtype=object)
+        parsed = pd.DataFrame([parse_tags(t) for t in tags], index=rows.index,
+                              columns=[column for column, _ in TAG_COLUMNS.values()])
+        table = parsed.assign(name=names.values, tags=tags.values)
+        table.index = pd.RangeIndex(len(rows), name='sample')
+        return table[['name', 'posx', 'flt', 'mode', 'exp', 'sp', 'tags']]
+
+    def __len__(self):
+        return len(self.table)
+
+    def select(self, mode=None, samples=None):
+        """Rows with detector *mode* (``'pdf'``, ``'xrd'`` or None for single detector), optionally of *samples*."""
+        table = self.table if samples is None else self.table.loc[list(samples)]
+        if mode is None:
+            return table[table['mode'].isna()]
+        return table[table['mode'] == mode]
+
+    def set_position(self, sample, posx):
+        """Use *posx* for *sample*; written to the sheet by :meth:`save_positions`."""
+        self.table.loc[sample, 'posx'] = posx
+        self._positions[sample] = posx
+
+    def save_positions(self):
+        """Write the positions given with :meth:`set_position` into the sheet, in a single update."""
+        if not self._positions:
+            return
+        save_position_to_sample_list(list(self._positions), list(self._positions.values()), self.filename)
+        self._positions.clear()
+
+
+def sample_table_calls(st, scanplan=0, exp_pdf=None, exp_xrd=None, flt_h=None, flt_l=None, pdf_flt=None,
+                       xrd_flt=None, **kwargs):
+    """
+    The driver calls for the samples in *st*, as ``(driver name, args, kwargs)`` tuples.
+
+    Single-detector samples become one ``xpd_mscan`` per scanplan.  ``mode=pdf`` and ``mode=xrd``
+    samples are paired by position into ``mrun_2det_batch`` calls, one per pair of exposures.
+    Samples without a position are skipped with a message.  The filter sets are checked for every
+    call here, as the drivers would, so a missing one fails before anything runs.
+
+    Parameters:
+        st (SampleTable): the sample table.
+        scanplan: scanplan for single-detector samples without an ``sp`` tag.
+        exp_pdf, exp_xrd (float): exposures for pdf / xrd samples without an ``exp`` tag.
+        flt_h, flt_l: filter sets for samples with and without ``flt=h``; for the two-detector
+            batch flt_h is used as pdf_flt_h, and flt_l as pdf_flt / xrd_flt unless those are given.
+        pdf_flt, xrd_flt: filter sets for the two-detector batch.
+        **kwargs: passed on to every ``mrun_2det_batch`` call (pdf_pos, xrd_pos, confirm, queue, ...).
+    """
+    calls = []
+    missing = st.table.index[st.table['posx'].isna()].tolist()
+    if missing:
+        print(f'no position for samples {missing}, skipped')
+    table = st.table.dropna(subset=['posx'])
+
+    single = table[table['mode'].isna()].fillna({'sp': scanplan})
+    for sp, group in single.groupby('sp', sort=False):
+        smpl_h = group.index[group['flt'] == 'h'].tolist()
+        if smpl_h and (flt_h is None or flt_l is None):
+            raise ValueError(f"samples {smpl_h} are tagged flt=h: give both flt_h and flt_l")
+        call_kwargs = dict(smpl_h=smpl_h, flt_h=flt_h, flt_l=flt_l) if smpl_h else dict(flt_l=flt_l)
+        calls.append(('xpd_mscan', (group.index.tolist(), group['posx'].tolist(), int(sp)), call_kwargs))
+
+    pdf = table[table['mode'] == 'pdf'].fillna({'exp': exp_pdf})
+    xrd = table[table['mode'] == 'xrd'].fillna({'exp': exp_xrd})
+    for mode, rows in (('pdf', pdf), ('xrd', xrd)):
+        if rows['exp'].isna().any():
+            raise ValueError(f"no exposure for {mode} samples {rows.index[rows['exp'].isna()].tolist()}: "
+                             f"tag them with exp= or give exp_{mode}")
+    pairs = pd.merge(pdf.reset_index(), xrd.reset_index(), on='posx', suffixes=('_pdf', '_xrd'))
+    unpaired = sorted(set(pdf.index) - set(pairs['sample_pdf']) | set(xrd.index) - set(pairs['sample_xrd']))
+    if unpaired:
+        print(f'no pdf/xrd partner at the same position for samples {unpaired}, skipped')
+    for (e_pdf, e_xrd), group in pairs.groupby(['exp_pdf', 'exp_xrd'], sort=False):
+        smpl_h = group.loc[group['flt_pdf'] == 'h', 'sample_pdf'].tolist()
+        call_kwargs = dict(kwargs, smpl_h=smpl_h, pdf_flt_h=flt_h if smpl_h else None,
+                           pdf_flt=pdf_flt if pdf_flt is not None else flt_l,
+                           xrd_flt=xrd_flt if xrd_flt is not None else flt_l)
+        if smpl_h and (call_kwargs['pdf_flt_h'] is None or call_kwargs['pdf_flt'] is None):
+            raise ValueError(f"pdf samples {smpl_h} are tagged flt=h: give flt_h, and pdf_flt or flt_l")
+        if call_kwargs['pdf_flt'] is not None and call_kwargs['xrd_flt'] is None:
+            raise ValueError("a pdf filter set is given: give xrd_flt too")
+        calls.append(('mrun_2det_batch', (group['sample_pdf'].tolist(), group['sample_xrd'].tolist(),
+                                          group['posx'].tolist(), e_pdf, e_xrd), call_kwargs))
+    return calls
+
+
+def run_sample_table(st, positions=None, dry_run=False, ns=None, **kwargs):
+    """
+    Run every sample of the sample sheet with the drivers from `sample_table_calls`.
+
+    Parameters:
+        st (SampleTable or str): sample table, or the file name of the sheet in ./Import/.
+        positions (dict, optional): sample index -> sample_x position, for samples whose position is
+            not in the sheet yet; written into the sheet as ``pos=`` tags once the drivers are done,
+            also if one of them fails.
+        dry_run (bool): only print the driver calls.
+        ns (dict, optional): namespace to look the drivers up in; default is this module's.
+        **kwargs: see `sample_table_calls`.
+
+    Returns:
+        list: the driver calls, see `sample_table_calls`.
+    """
+    if isinstance(st, str):
+        st = SampleTable(st)
+    ns = globals() if ns is None else ns
+    for sample, posx in (positions or {}).items():
+        st.set_position(sample, posx)
+
+    calls = sample_table_calls(st, **kwargs)
+    try:
+        for name, args, call_kwargs in calls:
+            print(f'{name}{args} {call_kwargs}')
+            if not dry_run:
+                ns[name](*args, **call_kwargs)
+    finally:
+        # the positions were used, keep them also when a driver fails
+        if not dry_run:
+            st.save_positions()
+    return calls
@@ -0,0 +1,173 @@
+"""
+Fast shutter control that keeps the shutter open between close points.
+
+xpdacq's ``inner_shutter_control`` opens the shutter before every trigger
+and closes it after every event, so a scan with short steps spends most of
+its time and shutter cycles opening and closing.  `shutter_policy_wrapper`
+opens the shutter before the first trigger and, after each event, only
+closes it once the gap to the next trigger would exceed *max_gap* seconds
+of beam on the sample: the moves ahead are predicted from the motor
+velocities, sleeps from their duration, and the time already spent since
+the event is counted too.  Anything else between two points (the end of
+the run, unstaging, ...) closes it.  Before the first trigger of a point
+with the shutter left open, its state is read back, so it is reopened if
+it was closed meanwhile.
+
+While the plan runs, a ``state_hook`` of ``xrun`` closes the shutter when
+the RunEngine pauses or suspends, so the sample does not sit in the beam
+for the length of the pause.  On resume the hook opens it again before
+the RunEngine replays the point it rewound to, as that replay does not
+go through the policy.
+
+The plans use the module's `shutter_policy`; the tolerated gap is a
+setting of the session:
+
+    shutter_policy.max_gap = 2     # s of beam between points at most
+    shutter_policy.max_gap = 0     # close after every point, as inner_shutter_control
+"""
+import math
+
+import bluesky.plan_stubs as bps
+from bluesky.preprocessors import finalize_wrapper, plan_mutator
+
+from .beamline import bl
+
+# messages that may come between two points without closing the shutter
+BETWEEN_POINTS = {
+    "checkpoint", "set", "wait", "sleep", "null", "create", "read", "describe", "locate", "configure",
+    "declare_stream",
+}
+
+
+def move_time(obj, target):
+    """
+    Predicted time for *obj* to reach *target*: 0 for a signal, None if it is not known.
+
+    The time of a positioner comes from its ``velocity`` and ``settle_time``.
+    """
+    if not hasattr(obj, "position"):
+        return 0.0
+    velocity = getattr(obj, "velocity", None)
+    velocity = velocity.get() if hasattr(velocity, "get") else velocity
+    try:
+        distance = abs(float(target) - float(obj.position))
+        velocity = abs(float(velocity))
+    except (TypeError, ValueError):
+        return None
+    if distance == 0:
+        return 0.0
+    if velocity == 0:
+        return None
+    return distance / velocity + getattr(obj, "settle_time", 0.0)
+
+
+def shutter_policy_wrapper(plan, max_gap=1.0):
+    """
+    Open the shutter for the triggers of *plan*, closing it only where the gap between points is long.
+
+    Parameters:
+        plan: the plan.
+        max_gap (float): longest time (s) between an event and the next trigger for which the
+            shutter stays open; 0 closes it after every event like ``inner_shutter_control``.
+    """
+    shutter = bl.xpd_configuration.get('shutter')
+    state = dict(open=False, after_event=False, since=None, gap=0.0, moves=[])
+
+    def set_state(msg):
+        if msg.command == "set":
+            state["open"] = msg.args[0] == bl.glbl["shutter_conf"]["open"]
+
+    def open_shutter(msg):
+        if state["open"] and state["after_event"] and shutter is not None:
+            # left open after the last point: still open?
+            reading = yield from bps.rd(shutter)
+            state["open"] = reading == bl.glbl["shutter_conf"]["open"]
+        state["after_event"] = False
+        if not state["open"]:
+            yield from bl.open_shutter_stub()
+            state["open"] = True
+        return (yield msg)
+
+    def close_shutter(msg=None):
+        state["after_event"] = False
+        if state["open"]:
+            yield from bl.close_shutter_stub()
+            state["open"] = False
+        if msg is not None:
+            return (yield msg)
+
+    def mutate(msg):
+        if shutter is not None and msg.obj is shutter:
+            set_state(msg)
+            return None, None
+        if msg.command == "trigger":
+            return open_shutter(msg), None
+        if msg.command == "save":
+            if max_gap <= 0:
+                return None, close_shutter()
+            state.update(after_event=True, since=bl.clock.monotonic(), gap=0.0, moves=[])
+            return None, None
+        if not (state["open"] and state["after_event"]):
+            return None, None
+
+        # between two points: how long until the next trigger?
+        if msg.command not in BETWEEN_POINTS:
+            ahead = math.inf
+        elif msg.command == "set":
+            moving = move_time(msg.obj, msg.args[0])
+            state["moves"].append(math.inf if moving is None else moving)
+            ahead = state["gap"] + max(state["moves"])
+        elif msg.command == "wait":
+            # the moves started since the last wait run in parallel
+            state["gap"] += max(state["moves"], default=0.0)
+            state["moves"] = []
+            ahead = state["gap"]
+        elif msg.command == "sleep":
+            state["gap"] += msg.args[0] or 0.0
+            ahead = state["gap"]
+        else:
+            ahead = state["gap"] + max(state["moves"], default=0.0)
+        if bl.clock.monotonic() - state["since"] + ahead > max_gap:
+            return close_shutter(msg), None
+        return None, None
+
+    def on_state(new, old):
+        # the plan is not running: no beam on the sample, and back as it was before resuming
+        if new in ("paused", "suspending") and state["open"] and shutter is not None:
+            shutter.set(bl.glbl["shutter_conf"]["close"]).wait()
+            state.update(open=False, reopen=True)
+        elif new == "running" and state.pop("reopen", False):
+            shutter.set(bl.glbl["shutter_conf"]["open"]).wait()
+            state["open"] = True
+        if previous_hook is not None:
+            previous_hook(new, old)
+
+    RE = bl.xrun
+    hooked = hasattr(RE, "state_hook")
+    if hooked:
+        previous_hook = RE.state_hook
+        RE.state_hook = on_state
+    try:
+        return (yield from finalize_wrapper(plan_mutator(plan, mutate), close_shutter))
+    finally:
+        if hooked:
+            RE.state_hook = previous_hook
+
+
+class ShutterPolicy:
+    """
+    Settings of the shutter control of the plans, see `shutter_policy_wrapper`.
+
+    Parameters:
+        max_gap (float): longest time (s) between points with the shutter left open.
+    """
+
+    def __init__(self, max_gap=1.0):
+        self.max_gap = max_gap
+
+    def wrap(self, plan):
+        """Return *plan* with the shutter controlled by this policy."""
+        return shutter_policy_wrapper(plan, self.max_gap)
+
+
+shutter_policy = ShutterPolicy()
@@ -0,0 +1,111 @@
+"""
+Keep the detectors staged across the runs of a batch.
+
+Every run stages its detectors at the start and unstages them at the end,
+which for an area detector puts the cam and every plugin through their
+stage settings and back, for every sample.  Inside `keep_staged` the
+detectors are staged once, the ``stage`` / ``unstage`` messages for them
+are dropped from the plans given to ``xrun``, and only their file writers
+are staged per run, so each run still writes its own files and resource
+documents:
+
+    with keep_staged():                   # the area detector
+        for smpl, pos in zip([1, 2, 3], [10, 20, 30]):
+            sample_x.move(pos)
+            xrun(smpl, 0)
+
+    with keep_staged([pe1c, pe2c]):
+        ...
+
+The detectors are unstaged when the block is left, also on an error or an
+abort.  ``xpd_mscan``, ``xpd_temp_list`` and ``mrun_2det_batch`` run their
+loops in it unless called with ``stage_once=False``.
+"""
+import contextlib
+
+from bluesky.preprocessors import plan_mutator
+from bluesky.utils import Msg
+from ophyd.areadetector.filestore_mixins import FileStoreBase
+
+from .beamline import bl
+
+# detector -> number of keep_staged blocks holding it
+_kept = {}
+
+
+def file_writers(det):
+    """The file writer plugins of *det*, which start a new resource every time they are staged."""
+    if isinstance(det, FileStoreBase):
+        return [det]
+    if not hasattr(det, "walk_subdevices"):
+        return []
+    return [dev for _, dev in det.walk_subdevices() if isinstance(dev, FileStoreBase)]
+
+
+def keep_staged_wrapper(plan, dets):
+    """
+    Drop the ``stage`` / ``unstage`` messages for *dets* from *plan*, staging only their file writers.
+
+    Parameters:
+        plan: the plan.
+        dets: detectors that are already staged, e.g. by `keep_staged`.
+    """
+    def writers(msg):
+        # the RunEngine unstages them at the end of the plan if the unstage message never comes
+        for writer in file_writers(msg.obj):
+            yield Msg(msg.command, writer)
+        return []
+
+    def mutate(msg):
+        if msg.command in ("stage", "unstage") and msg.obj in dets:
+            return writers(msg), None
+        return None, None
+
+    return (yield from plan_mutator(plan, mutate))
+
+
+def _keep_staged_preprocessor(plan):
+    return keep_staged_wrapper(plan, _kept)
+
+
+@contextlib.contextmanager
+def keep_staged(dets=None, RE=None):
+    """
+    Stage *dets* once for all the runs in the block instead of once per run.
+
+    Blocks may be nested; a detector is unstaged when the outermost block holding it is left.
+
+    Parameters:
+        dets (list, optional): detectors to keep staged. Default is the area detector.
+        RE (optional): RunEngine the runs go through. Default is `xrun`.
+
+    Example:
+        with keep_staged([pe1c]):
+            xpd_mscan([1, 2, 3], [10, 20, 30], 0)
+    """
+    if dets is None:
+        dets = [bl.xpd_configuration['area_det']]
+    if RE is None:
+        RE = bl.xrun
+    held = []
+    try:
+        for det in dets:
+            if det not in _kept:
+                det.stage()
+                # staged again by every run, for a resource per run
+                for writer in file_writers(det):
+                    writer.unstage()
+                _kept[det] = 0
+            _kept[det] += 1
+            held.append(det)
+        if _keep_staged_preprocessor not in RE.preprocessors:
+            RE.preprocessors.append(_keep_staged_preprocessor)
+        yield
+    finally:
+        for det in reversed(held):
+            _kept[det] -= 1
+            if not _kept[det]:
+                del _kept[det]
+                det.unstage()
+        if not _kept and _keep_staged_preprocessor in RE.preprocessors:
+            RE.preprocessors.remove(_keep_staged_preprocessor)
@@ -0,0 +1,262 @@
+"""
+Progress of long batches, served over HTTP so it can be polled from anywhere.
+
+`BatchStatus` is a callback fed by the RunEngine documents.  It keeps the
+current sample, run and point, the last uid, the throughput and an ETA:
+the ETA of the current run comes from the ``num_points`` of its start
+document, the one of the batch from the number of runs the driver
+announced with `expect_runs` or `batch` (the multi-run drivers do) and the time per
+run so far, moves and temperature changes between the runs included.
+The batch is closed once its last run stops, so the runs after it are
+not counted into it.
+
+`StatusServer` subscribes one to ``xrun`` and answers ``GET /status`` with
+its JSON snapshot, from an asyncio server in a background thread, so
+polling it costs the session nothing:
+
+    server = StatusServer(port=8765).start()
+    mrun_2det_batch(...)
+
+    $ curl http://localhost:8765/status
+    {"sample": "3", "run": 7, "point": 2, "num_points": 5, "runs_done": 6, "runs_expected": 40,
+     "eta": 5310.2, "points_per_hour": 118.4, "uid": "...", "last_uid": "...", ...}
+"""
+import asyncio
+import contextlib
+import json
+import threading
+import time as ttime
+import weakref
+
+from bluesky.callbacks.core import CallbackBase
+
+from .beamline import bl
+
+_trackers = weakref.WeakSet()
+# drivers inside a `batch` block, outermost first
+_batches = []
+
+
+def expect_runs(runs, name=None):
+    """
+    Announce to every `BatchStatus` that a batch of *runs* runs starts now.
+
+    Drivers call it before their first run; it costs nothing without a tracker.
+    """
+    for tracker in list(_trackers):
+        tracker.expect(runs, name)
+
+
+@contextlib.contextmanager
+def batch(runs, name=None):
+    """
+    Announce a batch of *runs* runs with `expect_runs` for the block, unless a driver already did.
+
+    A driver called by another one, e.g. ``xpd_temp_list`` for each sample of ``xpd_mtemp_list``,
+    runs in the batch of the outer one.
+    """
+    if not _batches:
+        expect_runs(runs, name)
+    _batches.append(name)
+    try:
+        yield
+    finally:
+        _batches.pop()
+
+
+class BatchStatus(CallbackBase):
+    """
+    Progress of the runs and of the batch they belong to, fed by documents.
+
+    Read with :meth:`snapshot`.  Times come from the documents, so they are
+    those of the RunEngine.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self.expect(None)
+        _trackers.add(self)
+
+    def expect(self, runs, name=None):
+        """Start a new batch of *runs* runs (None: unknown) called *name*."""
+        with self._lock:
+            self.batch = name
+            self.runs_expected = runs
+            self.batch_start = ttime.time()
+            self.runs_done = 0
+            self.last_stop = None
+            self.points = 0
+            self.uid = None
+            self.last_uid = None
+            self.last_status = None
+            self.sample = None
+            self.plan = None
+            self.run_start = None
+            self.point = 0
+            self.num_points = None
+            self.last_point_time = None
+            self._primary = set()
+
+    def start(self, doc):
+        with self._lock:
+            self.uid = doc["uid"]
+            self.sample = doc.get("sample_name")
+            self.plan = doc.get("plan_name")
+            self.num_points = doc.get("num_points")
+            self.run_start = doc["time"]
+            self.point = 0
+            self._primary.clear()
+
+    def descriptor(self, doc):
+        if doc.get("name") == "primary":
+            self._primary.add(doc["uid"])
+
+    def event(self, doc):
+        if doc["descriptor"] in self._primary:
+            with self._lock:
+                self.point = doc["seq_num"]
+                self.points += 1
+                self.last_point_time = doc["time"]
+
+    def event_page(self, doc):
+        if doc["descriptor"] in self._primary:
+            with self._lock:
+                self.point = doc["seq_num"][-1]
+                self.points += len(doc["seq_num"])
+                self.last_point_time = doc["time"][-1]
+
+    def stop(self, doc):
+        with self._lock:
+            self.runs_done += 1
+            self.last_stop = doc["time"]
+            self.last_uid = self.uid
+            self.last_status = doc.get("exit_status")
+            self.uid = None
+            self.run_start = None
+            if self.runs_expected is not None and self.runs_done >= self.runs_expected:
+                # the batch is over: later runs are not part of it
+                self.runs_expected = None
+                self.batch = None
+
+    def snapshot(self):
+        """The progress as a JSON-able dict; ETAs in seconds, None where not known yet."""
+        with self._lock:
+            now = ttime.time()
+            elapsed = now - self.batch_start
+            running = self.run_start is not None
+            run_elapsed = now - self.run_start if running else 0.0
+
+            run_eta = None
+            if running and self.num_points and self.point:
+                per_point = (self.last_point_time - self.run_start) / self.point
+                run_eta = max(per_point * (self.num_points - self.point) - (now - self.last_point_time), 0.0)
+
+            eta = None
+            if self.runs_expected is not None and self.runs_done:
+                # per run of the batch so far, including the moves and waits between runs
+                per_run = (self.last_stop - self.batch_start) / self.runs_done
+                left = self.runs_expected - self.runs_done
+                eta = max(left * per_run - (now - self.last_stop), 0.0)
+
+            return dict(
+                batch=self.batch, sample=self.sample, plan=self.plan, uid=self.uid, last_uid=self.last_uid,
+                last_status=self.last_status, run=self.runs_done + running, runs_done=self.runs_done,
+                runs_expected=self.runs_expected, point=self.point, num_points=self.num_points,
+                points=self.points, elapsed=elapsed, run_elapsed=run_elapsed, run_eta=run_eta, eta=eta,
+                points_per_hour=self.points / elapsed * 3600 if elapsed > 0 else None,
+                runs_per_hour=self.runs_done / elapsed * 3600 if elapsed > 0 else None,
+                time=now,
+            )
+
+
+class StatusServer:
+    """
+    Serve a `BatchStatus` fed by ``xrun`` as JSON over HTTP.
+
+    Parameters:
+        host (str): interface to listen on; the default only answers this machine,
+            ``'0.0.0.0'`` answers every host that can reach it.
+        port (int): TCP port.
+        status (BatchStatus, optional): the tracker to serve; default is a new one.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, status=None):
+        self.host = host
+        self.port = port
+        self.status = status if status is not None else BatchStatus()
+        self._token = None
+        self._thread = None
+        self._loop = None
+        self._closing = None
+        self._error = None
+
+    def start(self):
+        """Subscribe to ``xrun`` and start serving, in a background thread; returns self."""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        ready = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._serve_thread, args=(ready,), name="StatusServer",
+                                        daemon=True)
+        self._thread.start()
+        ready.wait()
+        if self._error is not None:
+            raise self._error
+        self._token = bl.xrun.subscribe(self.status)
+        print(f"status on http://{self.host}:{self.port}/status")
+        return self
+
+    def close(self):
+        """Unsubscribe and stop serving."""
+        if self._token is not None:
+            bl.xrun.unsubscribe(self._token)
+            self._token = None
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._closing.set)
+            self._thread.join()
+
+    def _serve_thread(self, ready):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve(ready))
+        finally:
+            self._loop.close()
+            self._loop = None
+
+    async def _serve(self, ready):
+        self._closing = asyncio.Event()
+        try:
+            server = await asyncio.start_server(self._handle, self.host, self.port)
+        except OSError as error:
+            # e.g. the port is taken; reported by start
+            self._error = error
+            ready.set()
+            return
+        if not self.port:
+            self.port = server.sockets[0].getsockname()[1]
+        ready.set()
+        try:
+            await self._closing.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass  # headers
+            parts = request.decode(errors="replace").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/", "/status"):
+                code, body = "200 OK", json.dumps(self.status.snapshot(), default=str)
+            else:
+                code, body = "404 Not Found", json.dumps({"error": "GET /status"})
+            body = body.encode()
+            writer.write(f"HTTP/1.1 {code}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
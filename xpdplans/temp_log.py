@@ -0,0 +1,112 @@
+"""
+Background temperature log for the temperature drivers in temp_runs.py.
+
+The drivers pass the temperature controller to ``ct_motors_plan`` as a
+detector, so the temperature is only read when a frame is taken.
+`temp_log_wrapper` additionally monitors the controller readback (and
+heater power) into streams of their own, one reading every ``period``
+seconds for the whole run, without adding anything to the primary stream.
+``save_tb_xlsx`` joins those streams onto the frames by time.
+
+Every temperature driver wraps its plans with `temp_logged`, configured by
+`temp_log_config`:
+    temp_log_config['period'] = 0.5     # 2 readings per second
+    temp_log_config['power'] = False    # readback only
+    temp_log_config['period'] = None    # switch the log off
+"""
+import threading
+
+import bluesky.plan_stubs as bps
+import bluesky.preprocessors as bpp
+from ophyd import Signal
+
+# used by `temp_logged`; period in seconds, None switches the log off
+temp_log_config = {"period": 1.0, "power": True, "deadband": None}
+
+
+class PolledSignal(Signal):
+    """
+    Signal mirroring ``source.get()`` every *period* seconds from a thread.
+
+    Monitoring it gives a fixed-rate stream of a signal that is otherwise
+    only read on demand (or updates faster than we want to record).
+
+    Parameters:
+        source: signal (or anything with ``get()`` and ``name``) to mirror.
+        period (float): seconds between readings.
+        deadband (float, optional): only post a reading if it differs from the
+            last posted one by more than this; default posts every reading.
+        name (str, optional): default is ``<source name>_log``, which is also the stream name.
+    """
+
+    def __init__(self, source, period=1.0, deadband=None, *, name=None, **kwargs):
+        super().__init__(name=name or f"{source.name}_log", value=source.get(), **kwargs)
+        self.source = source
+        self.period = period
+        self.deadband = deadband
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start polling, if not running already."""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._poll, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop polling and wait for the thread to finish."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _poll(self):
+        self.put(self.source.get())
+        while not self._stopped.wait(self.period):
+            value = self.source.get()
+            if self.deadband is None or abs(value - self.get()) > self.deadband:
+                self.put(value)
+
+
+def temp_log_wrapper(plan, signals, period=1.0, deadband=None):
+    """
+    Monitor *signals*, polled every *period* seconds, into their own streams while *plan* runs.
+
+    Parameters:
+        plan: the plan to wrap, containing one run.
+        signals (list): signals to log, e.g. ``[eurotherm.readback, eurotherm.power]``.
+        period (float): seconds between readings.
+        deadband (float, optional): see `PolledSignal`.
+    """
+    mirrors = [PolledSignal(sig, period, deadband) for sig in signals]
+
+    def start_polling():
+        for mirror in mirrors:
+            mirror.start()
+        yield from bps.null()
+
+    def stop_polling():
+        for mirror in mirrors:
+            mirror.stop()
+        yield from bps.null()
+
+    plan = bpp.monitor_during_wrapper(plan, mirrors)
+    return (yield from bpp.finalize_wrapper(bpp.pchain(start_polling(), plan), stop_polling()))
+
+
+def temp_log_signals(T_controller, power=True):
+    """The readback of *T_controller* and, if *power* and it has one, its heater power."""
+    signals = [getattr(T_controller, "readback", T_controller)]
+    if power and hasattr(T_controller, "power"):
+        signals.append(T_controller.power)
+    return signals
+
+
+def temp_logged(plan, T_controller):
+    """Wrap *plan* with the temperature log of *T_controller* as set up in `temp_log_config`."""
+    if temp_log_config["period"] is None:
+        return plan
+    signals = temp_log_signals(T_controller, temp_log_config["power"])
+    return temp_log_wrapper(plan, signals, temp_log_config["period"], temp_log_config["deadband"])
@@ -0,0 +1,527 @@
+"""
+Temperature drivers: temperature lists and ramps for one or several samples,
+hold times, and whole temperature profiles in a single run.
+"""
+import contextlib
+
+import bluesky.plan_stubs as bps
+import bluesky.preprocessors as bpp
+from bluesky.callbacks import LiveTable
+
+from .beamline import bl
+from .plans import ct_motors_plan, save_tb_xlsx, save_uids_xlsx, take_one_dark, xpd_flt_set
+from .staging import keep_staged
+from .status import batch
+from .temp_log import temp_logged
+from .temp_schedule import arrival_times, linear_schedule, wait_for_setpoint
+
+
+def xpd_temp_list(smpl, Temp_list, exp_time, delay=1, num=1, delay_num=0, dets=None, takeonedark=False,
+                  ramp_rate=None, tolerance=1.0, stage_once=True):
+    """
+    example
+        xpd_temp_list(1, [300, 350, 400], 5, delay=1, num=1, delay_num=0, dets=[euroterhm.power])
+        sample 1, at temperature 300, 350 and 400, take one data, exposure time 5sec,
+        wait 1 second after each temperature, record eurotherm power(%) at the same time.
+
+    parameters:
+        smpl: sample index ID in sample list
+        Temp_list: temperature list
+        exp_time : total exposure time for each sample, in seconds
+        delay: sleep time after each temperature changes, for temperature controller to stable
+        num: number of data at each temperature
+        delay_num : sleep time in between each data if multiple data are taken at each temperature
+        dets: list of motors, temperatures controllers, which will be recorded in table.
+        ramp_rate: controller ramp rate in K/min. If given, each setpoint is sent without blocking and
+            acquisition starts once the controller reaches it (predicted from ramp_rate, confirmed from
+            the readback), so delay only needs to cover the stabilisation after arrival.
+        tolerance: K from the setpoint counted as arrived, only used with ramp_rate.
+        stage_once: stage the area detector once for all the temperatures instead of once per temperature,
+            see `keep_staged`.
+
+    """
+
+    if dets is None:
+        dets = []
+
+    T_controller = bl.xpd_configuration["temp_controller"]
+    area_det = bl.xpd_configuration['area_det']
+    det = [area_det, T_controller] + dets
+    starttime = bl.clock.time()
+    with batch(len(Temp_list) + int(takeonedark is True), 'xpd_temp_list'):
+        if takeonedark is True:
+            take_one_dark(smpl, det, exp_time)
+
+        if num > 1:  # take more than one data
+            delay_num1 = delay_num + exp_time
+        else:
+            delay_num1 = 0
+
+        if ramp_rate is not None:
+            eta = arrival_times(Temp_list, ramp_rate, T0=T_controller.get())
+            print(f'ramping at {ramp_rate} K/min, {eta[-1]:.0f} s of ramping in total')
+        with keep_staged([area_det]) if stage_once else contextlib.nullcontext():
+            for Temp in Temp_list:
+                print(f'temperature moving to {Temp}')
+                if ramp_rate is None:
+                    T_controller.move(Temp)
+                else:
+                    T_controller.set(Temp)
+                    wait_for_setpoint(T_controller, Temp, ramp_rate, tolerance=tolerance)
+                bl.clock.sleep(delay)
+                plan = ct_motors_plan(det, exp_time, num=num, delay=delay_num1)
+                bl.xrun(smpl, temp_logged(plan, T_controller))
+    endtime = bl.clock.time()
+    save_tb_xlsx(smpl, starttime, endtime)
+    return None
+
+
+def xpd_temp_ramp(smpl, Tstart, Tstop, Tstep, exp_time, delay=1, num=1, delay_num=0, dets=None, takeonedark=False,
+                  ramp_rate=None, tolerance=1.0):
+    """
+    example:
+        xpd_temp_ramp(1, 300, 400, 10, 5, delay=1, num=1, delay_num=0, dets=[euroterhm.power])
+        sample 1, from 300K to 400K, 10K steps, take one data, exposure time 5sec,
+        wait 1 second after each temperature. record eurotherm power(%) at the same time
+
+    parameters:
+        smpl: sample index ID in sample list
+        Tstart, Tstop, Tstep: temperature range(Tstart, Tend), step size: Tstep
+        exp_time : total exposure time for each sample, in seconds
+        delay: sleep time after each temperature changes, for temperature controller to stable
+        num: number of data at each temperature
+        delay_num : sleep time in between each data if multiple data are taken at each temperature
+        dets: list of motors, temperatures controllers, which will be recorded in table.
+        ramp_rate: controller ramp rate in K/min. If given, each setpoint is sent without blocking and
+            acquisition starts once the controller reaches it (predicted from ramp_rate, confirmed from
+            the readback), so delay only needs to cover the stabilisation after arrival.
+        tolerance: K from the setpoint counted as arrived, only used with ramp_rate.
+    """
+
+    if dets is None:
+        dets = []
+    T_controller = bl.xpd_configuration["temp_controller"]
+    area_det = bl.xpd_configuration['area_det']
+    det = [area_det, T_controller] + dets
+    starttime = bl.clock.time()
+    if takeonedark is True:
+        take_one_dark(smpl, det, exp_time)
+        
+    temp_list = linear_schedule(Tstart, Tstop, Tstep)
+    if num > 1:  # take more than one data
+        delay_num1 = delay_num + exp_time
+    else:
+        delay_num1 = 0
+    if ramp_rate is not None:
+        eta = arrival_times(temp_list, ramp_rate, T0=T_controller.get())
+        print(f'ramping at {ramp_rate} K/min, {eta[-1]:.0f} s of ramping in total')
+    for Temp in temp_list:
+        print('temperature moving to' + str(Temp))
+        if ramp_rate is None:
+            T_controller.move(Temp)
+        else:
+            T_controller.set(Temp)
+            wait_for_setpoint(T_controller, Temp, ramp_rate, tolerance=tolerance)
+        bl.clock.sleep(delay)
+        plan = ct_motors_plan(det, exp_time, num=num, delay=delay_num1)
+        bl.xrun(smpl, temp_logged(plan, T_controller))
+    endtime = bl.clock.time()
+    save_tb_xlsx(smpl, starttime, endtime)
+    return None
+
+
+def temp_hold_plan(det, Temp_list, holdtime_list, exp_time, delay=1, delay_hold=0, poll=5, md=None):
+    """
+    plan for a whole temperature profile in one run, collecting frames for a time budget at each temperature.
+
+    While the controller ramps and stabilises, the temperature is read every *poll* seconds into the
+    "temperature" stream.  At each setpoint, frames go to the primary stream back to back (with
+    *delay_hold* in between) until the next one would not finish within the hold time.
+
+    Parameters:
+        det (list): area detector, temperature controller and anything else to read with every frame.
+        Temp_list (list): temperatures to set.
+        holdtime_list (list): hold time in seconds at each temperature.
+        exp_time (float): exposure time of each frame, in seconds.
+        delay (float): time to wait for the temperature to stabilise after it is reached.
+        delay_hold (float): extra time between frames.
+        poll (float): seconds between temperature readings while ramping.
+        md (dict, optional): additional metadata.
+
+    Example:
+        xrun(1, temp_hold_plan([pe1c, eurotherm], [300, 400], [600, 1200], 5))
+    """
+    T_controller = bl.xpd_configuration["temp_controller"]
+    (num_frame, acq_time, computed_exposure) = yield from bl._configure_area_det(exp_time)
+
+    _md = {
+        "sp_time_per_frame": acq_time,
+        "sp_num_frames": num_frame,
+        "sp_requested_exposure": exp_time,
+        "sp_computed_exposure": computed_exposure,
+        "temp_list": list(Temp_list),
+        "holdtime_list": list(holdtime_list),
+        "plan_name": "temp_hold_plan",
+    }
+    _md.update(md or {})
+
+    def read_temperature():
+        yield from bps.create("temperature")
+        yield from bps.read(T_controller)
+        yield from bps.save()
+
+    def wait_read_temperature(seconds):
+        while seconds > 0:
+            yield from read_temperature()
+            yield from bps.sleep(min(poll, seconds))
+            seconds -= poll
+
+    def frame():
+        yield from bpp.plan_mutator(bps.trigger_and_read(det), bl.inner_shutter_control)
+
+    @bpp.stage_decorator(det)
+    @bpp.run_decorator(md=_md)
+    def inner():
+        for Temp, holdtime in zip(Temp_list, holdtime_list):
+            st = yield from bps.abs_set(T_controller, Temp, group="temp_hold")
+            while not st.done:
+                yield from read_temperature()
+                yield from bps.sleep(poll)
+            yield from bps.wait(group="temp_hold")
+            yield from wait_read_temperature(delay)
+            yield from read_temperature()
+
+            # frames until the next one would overrun the hold time, at least one
+            deadline = bl.clock.monotonic() + holdtime
+            while True:
+                t0 = bl.clock.monotonic()
+                yield from frame()
+                if delay_hold:
+                    yield from bps.sleep(delay_hold)
+                now = bl.clock.monotonic()
+                if now + (now - t0) > deadline:
+                    break
+            yield from read_temperature()
+
+    plan = bpp.subs_wrapper(inner(), LiveTable(det[1:]))
+    return (yield from plan)
+
+
+def temp_hold(smpl, Temp_list, holdtime_list, exp_time, delay=1, delay_hold=0,
+              dets=None, takeonedark=False, cooltoRT=False, time_budget=False):
+    """
+    Controls the temperature change and data collection for a sample experiment.
+
+    Parameters:
+        smpl (int): Sample index or ID.
+        Temp_list (list): List of target temperatures to set.
+        holdtime_list (list): Corresponding list of hold times for each temperature.
+        exp_time (float): Exposure time (seconds).
+        delay (float): Time to wait for the temperature to stabilize.
+        delay_hold (float): Additional delay between measurements.
+        dets (list): Optional list of detectors/motors to record.
+        takeonedark (bool): Whether to take a dark measurement first.
+        cooltoRT (bool): Whether to cool to room temperature (30C) after finished measurements, 
+            then take one data at room temperature.
+        time_budget (bool): Collect the whole profile in one run with temp_hold_plan: frames are taken
+            back to back until the hold time at each temperature is used up, and the temperature is
+            recorded in its own stream while ramping.
+
+    """
+
+    if dets is None:
+        dets = []
+
+    T_controller = bl.xpd_configuration["temp_controller"]
+    area_det = bl.xpd_configuration['area_det']
+    det = [area_det, T_controller] + dets
+
+    # log the start time
+    starttime = bl.clock.time()
+
+    # Optionally take a dark measurement
+    if takeonedark is True:
+        take_one_dark(smpl, det, exp_time)
+
+    if time_budget:
+        plan = temp_hold_plan(det, Temp_list, holdtime_list, exp_time, delay=delay, delay_hold=delay_hold)
+        bl.xrun(smpl, temp_logged(plan, T_controller))
+    else:
+        delay_true = delay_hold + exp_time
+
+        # Iterate over each temperature and holdtime
+        for Temp, holdtime in zip(Temp_list, holdtime_list):
+            print(f'temperature moving to {Temp}, then hold for {holdtime}')
+            T_controller.move(Temp)
+
+            # Wait for temperature to stabilize.
+            bl.clock.sleep(delay)
+
+            # Calculate the number of data points to collect at this temperature
+            num = int(holdtime / exp_time) + 1
+            plan = ct_motors_plan(det, exp_time, num=num, delay=delay_true)
+            bl.xrun(smpl, temp_logged(plan, T_controller))
+
+    # Log the end time
+    endtime = bl.clock.time()
+    # Save data to an Excel file
+    save_tb_xlsx(smpl, starttime, endtime)
+    
+    if cooltoRT is True:
+        T_controller.move(30)
+        plan = ct_motors_plan(det, exp_time, num=1)
+        bl.xrun(smpl, temp_logged(plan, T_controller))
+        
+
+def xpd_temp_setrun(smpl, temp, exp_time, delay=1, hold_time=1, dets=None, cooltoRT=False, takeonedark=False):
+    """
+    example:
+        xpd_temp_setrun(1, 500, 5, delay=1, hold_time=1, dets=[euroterhm.power])
+        sample 1, set temperature is 500, continuously taking data(exposure time= 5sec) until the set temperature is reached.
+        wait 1 sec between each data, record temperature and power(%) at the same time
+
+    parameters:
+        sample: sample index ID in sample list
+        temp: target temperature
+        exp_time : total exposure time of each data
+        delay: sleep time between each data
+        hold_time: hold time to maintain the targe temperature, continuously taking data during the hold time.
+        dets: list of motors, temperatures controllers, which will be recorded in table.
+    """
+    if dets is None:
+        dets = []
+    T_controller = bl.xpd_configuration["temp_controller"]
+    area_det = bl.xpd_configuration['area_det']
+    det = [area_det, T_controller] + dets
+    starttime = bl.clock.time()
+    if takeonedark is True:
+        take_one_dark(smpl, det, exp_time)
+    print(f'set temperature to {temp}, start to collect data')
+    T_controller.set(temp)
+    while abs(T_controller.get() - temp) >= 1:
+        plan = ct_motors_plan(det, exp_time)
+        bl.xrun(smpl, temp_logged(plan, T_controller))
+        bl.clock.sleep(delay)
+    print(f'reach the temperature, hold for {hold_time}')  
+    hold_num = int(hold_time/(exp_time+delay))+1
+    for i in range(hold_num):
+        plan = ct_motors_plan(det, exp_time)
+        bl.xrun(smpl, temp_logged(plan, T_controller))
+        bl.clock.sleep(delay)
+        
+    endtime = bl.clock.time()    
+    save_tb_xlsx(smpl, starttime, endtime)
+    
+    if cooltoRT is True:
+        RT=30
+        T_controller.set(RT)
+        print('set temperature to RT, please wait for cool down')
+        while abs(T_controller.get() - RT) <= 1:
+            plan = ct_motors_plan(det, exp_time)
+            bl.xrun(smpl, temp_logged(plan, T_controller))
+            bl.clock.sleep(delay)
+    return None
+
+
+def xpd_mtemp_ramp(sample_list, pos_list, Tstart, Tstop, Tstep, exp_time, delay=1, num=1, delay_num=0, smpl_h=None,
+                   flt_h=None, flt_l=None, motor=None, dets=None, takeonedark=False, ramp_rate=None,
+                   temp_major=False):
+    """
+    example
+        xpd_mtemp_ramp([1,2,3],[10, 20, 30],  300, 400, 10, 5, delay=1, num=1, delay_num=0, smpl_h=[1],
+        flt_h=[1,0,0,0], flt_l=[0,0,0,0], dets=[euroterhm.power])
+        3 samples [1, 2,3], sample_x positions at [10, 20, 30], 
+        sample 1 will need filter [1,0,0,0], others([2,3]) does not need filters [0,0,0,0]
+        for each sample, from 300K to 400K, 10K steps, take one data at each temperature, exposure time is 5sec
+        wait 1 second after each temperature, record eurotherm power(%) at the same time.
+
+    parameters:
+        sample_list: list of sample index IDs in sample list
+        pos_list: list of sample positions 
+        Tstart, Tstop, Tstep: temperature range(Tstart, Tend), step size: Tstep
+        exp_time : total exposure time for each sample, in seconds
+        delay: sleep time after each temperature changes, for temperature to stable
+        num: number of data at each temperature
+        delay_num : sleep time in between each data if multiple data are taken at each temperature
+        smpl_h: list of samples which need special filter sets
+        flt_h: filter set for the sample in the smpl_h
+        flt_l: filter set for all other samples in the sample_list. !!! flt_l has to be set if flt_h is set!!!
+        dets: list of motors, temperatures controllers, which will be recorded in table.
+        ramp_rate: controller ramp rate in K/min, see xpd_temp_ramp.
+        temp_major: step the temperature once for all samples instead of a full ramp per sample,
+            see xpd_mtemp_major.
+
+    """
+    if motor is None:
+        motor = bl.sample_x
+    if dets is None:
+        dets = []
+    if smpl_h is None:
+        smpl_h = []
+    if len(sample_list) != len(pos_list):
+        print('sample list and pos_list Must have same length!')
+        return None
+    length = len(sample_list)
+    print('Total sample numbers:', length)
+    # one run per sample and temperature, plus the darks: one in all with temp_major, else one per sample
+    darks = int(takeonedark) * (1 if temp_major else length)
+    with batch(length * len(linear_schedule(Tstart, Tstop, Tstep)) + darks, 'xpd_mtemp_ramp'):
+        if temp_major:
+            return xpd_mtemp_major(sample_list, pos_list, linear_schedule(Tstart, Tstop, Tstep), exp_time,
+                                   delay=delay, num=num, delay_num=delay_num, smpl_h=smpl_h, flt_h=flt_h,
+                                   flt_l=flt_l, motor=motor, dets=dets, takeonedark=takeonedark,
+                                   ramp_rate=ramp_rate)
+
+        for sample, pos in zip(sample_list, pos_list):
+            print('Move sample: ', sample, 'to position: ', pos)
+            motor.move(pos)
+            if sample in smpl_h:
+                xpd_flt_set(flt_h)
+            else:
+                if flt_l != None:
+                    xpd_flt_set(flt_l)
+            bl.clock.sleep(1)
+            xpd_temp_ramp(sample, Tstart, Tstop, Tstep, exp_time, delay=delay, num=num, 
+                          delay_num=delay_num, dets=dets,takeonedark=takeonedark, ramp_rate=ramp_rate)
+
+
+def xpd_mtemp_list(sample_list, pos_list, templist, exp_time, delay=1, num=1, delay_num=0, smpl_h=[],
+                   flt_h=None, flt_l=None, motor=None, dets=[], takeonedark=False, ramp_rate=None,
+                   temp_major=False):
+    """
+    example
+        xpd_mtemp_list([1,2,3],[10, 20, 30],  [300, 350, 400], 5, delay=1, num=1, delay_num=0, smpl_h=[1],
+        flt_h=[1,0,0,0], flt_l=[0,0,0,0], dets=[euroterhm.power])
+        3 samples [1, 2,3], sample_x positions at [10, 20, 30], 
+        sample 1 will need filter [1,0,0,0], others([2,3]) does not need filters [0,0,0,0]
+        take one data at temperature 300, 350 and 400, exposure time 5sec,
+        wait 1 second after each temperature, record eurotherm power(%) at the same time.
+
+        parameters:
+        sample_list: list of sample index IDs in sample list
+        pos_list: list of sample positions 
+        Temp_list: temperature list
+        exp_time : total exposure time for each sample, in seconds
+        delay: sleep time after each temperature changes, for temperature controller to stable
+        num: number of data at each temperature
+        delay_num : sleep time in between each data if multiple data are taken at each temperature
+        smpl_h: list of samples which need special filter sets
+        flt_h: filter set for the sample in the smpl_h
+        flt_l: filter set for all other samples in the sample_list. !!! flt_l has to be set if flt_h is set!!!
+        dets: list of motors, temperatures controllers, which will be recorded in table.
+        ramp_rate: controller ramp rate in K/min, see xpd_temp_ramp.
+        temp_major: step the temperature once for all samples instead of a full ramp per sample,
+            see xpd_mtemp_major.
+    
+    
+    """
+    if motor is None:
+        motor = bl.sample_x
+
+    if len(sample_list) != len(pos_list):
+        print('sample list and pos_list Must have same length!')
+        return None
+    length = len(sample_list)
+    print('Total sample numbers:', length)
+    # one run per sample and temperature, plus the darks: one in all with temp_major, else one per sample
+    darks = int(takeonedark is True) * (1 if temp_major else length)
+    with batch(length * len(templist) + darks, 'xpd_mtemp_list'):
+        if temp_major:
+            return xpd_mtemp_major(sample_list, pos_list, templist, exp_time, delay=delay, num=num,
+                                   delay_num=delay_num, smpl_h=smpl_h, flt_h=flt_h, flt_l=flt_l, motor=motor,
+                                   dets=dets, takeonedark=takeonedark, ramp_rate=ramp_rate)
+
+        for sample, pos in zip(sample_list, pos_list):
+            print('Move sample: ', sample, 'to position: ', pos)
+            motor.move(pos)
+            if sample in smpl_h:
+                xpd_flt_set(flt_h)
+            else:
+                if flt_l != None:
+                    xpd_flt_set(flt_l)
+            bl.clock.sleep(1)
+            xpd_temp_list(sample, templist, exp_time, delay=delay, num=num, 
+                          delay_num=delay_num, dets=dets, takeonedark=takeonedark, ramp_rate=ramp_rate)
+
+
+def xpd_mtemp_major(sample_list, pos_list, Temp_list, exp_time, delay=1, num=1, delay_num=0, smpl_h=None,
+                    flt_h=None, flt_l=None, motor=None, dets=None, takeonedark=False, ramp_rate=None,
+                    tolerance=1.0):
+    """
+    example
+        xpd_mtemp_major([1,2,3],[10, 20, 30], [300, 350, 400], 5, delay=60, smpl_h=[1],
+        flt_h=[1,0,0,0], flt_l=[0,0,0,0], dets=[euroterhm.power])
+        3 samples [1, 2,3] on the same heated holder, sample_x positions at [10, 20, 30],
+        the controller goes to 300, 350 and 400 once; at each temperature every sample is measured in turn,
+        sample 1 with filter [1,0,0,0], the others with [0,0,0,0]. One table per sample is saved at the end.
+
+    Compared with xpd_mtemp_list / xpd_mtemp_ramp, which run the whole temperature series per sample,
+    the holder is heated and cooled once instead of once per sample.
+
+    parameters:
+        sample_list: list of sample index IDs in sample list
+        pos_list: list of sample positions
+        Temp_list: temperature list, e.g. from linear_schedule or piecewise_schedule
+        exp_time : total exposure time for each sample, in seconds
+        delay: sleep time after each temperature changes, for temperature controller to stable
+        num: number of data for each sample at each temperature
+        delay_num : sleep time in between each data if multiple data are taken
+        smpl_h: list of samples which need special filter sets
+        flt_h: filter set for the sample in the smpl_h
+        flt_l: filter set for all other samples in the sample_list.
+        motor: motor moving between the sample positions
+        dets: list of motors, temperatures controllers, which will be recorded in table.
+        takeonedark: take one dark with the first sample before starting
+        ramp_rate, tolerance: see xpd_temp_ramp.
+
+    returns:
+        dict: sample -> list of uids, in collection order.
+    """
+    if motor is None:
+        motor = bl.sample_x
+    if dets is None:
+        dets = []
+    if smpl_h is None:
+        smpl_h = []
+    if len(sample_list) != len(pos_list):
+        print('sample list and pos_list Must have same length!')
+        return None
+    print('Total sample numbers:', len(sample_list))
+
+    T_controller = bl.xpd_configuration["temp_controller"]
+    area_det = bl.xpd_configuration['area_det']
+    det = [area_det, T_controller] + dets
+    with batch(len(sample_list) * len(Temp_list) + int(takeonedark is True), 'xpd_mtemp_major'):
+        if takeonedark is True:
+            take_one_dark(sample_list[0], det, exp_time)
+
+        if num > 1:  # take more than one data
+            delay_num1 = delay_num + exp_time
+        else:
+            delay_num1 = 0
+
+        uids = {sample: [] for sample in sample_list}
+        current_flt = None
+        for Temp in Temp_list:
+            print(f'temperature moving to {Temp}')
+            if ramp_rate is None:
+                T_controller.move(Temp)
+            else:
+                T_controller.set(Temp)
+                wait_for_setpoint(T_controller, Temp, ramp_rate, tolerance=tolerance)
+            bl.clock.sleep(delay)
+            for sample, pos in zip(sample_list, pos_list):
+                print('Move sample: ', sample, 'to position: ', pos)
+                motor.move(pos)
+                flt = flt_h if sample in smpl_h else flt_l
+                # only touch the filters when the next sample needs a different set
+                if flt is not None and list(flt) != current_flt:
+                    xpd_flt_set(flt)
+                    current_flt = list(flt)
+                    bl.clock.sleep(1)
+                plan = ct_motors_plan(det, exp_time, num=num, delay=delay_num1)
+                uids[sample].extend(bl.xrun(sample, temp_logged(plan, T_controller)) or [])
+
+    for sample in sample_list:
+        save_uids_xlsx(sample, uids[sample])
+    return uids
@@ -0,0 +1,135 @@
+"""
+Temperature schedules for the temperature drivers in temp_runs.py.
+
+The schedule functions return the setpoints as numpy arrays in one call;
+`arrival_times` turns a schedule into the times at which each setpoint is
+reached for a given controller ramp rate, and `wait_for_setpoint` lets a
+driver write a setpoint without blocking and start acquiring as soon as the
+controller gets there, instead of after a fixed worst-case ``delay``.
+
+Example:
+    temps = piecewise_schedule((300, 500, 20), (500, 800, 50))
+    arrival_times(temps, ramp_rate=10, dwell=65)     # s from start, 10 K/min
+    temps, holds = cyclic_schedule(300, 400, 25, cycles=3, hold_high=600)
+"""
+import numpy as np
+
+from .beamline import bl
+
+
+def linear_schedule(Tstart, Tstop, Tstep):
+    """
+    Setpoints from *Tstart* to *Tstop* (both included) in steps of about *Tstep*,
+    the same list as ``xpd_temp_ramp`` uses.
+    """
+    Tnum = int(abs(Tstart - Tstop) / Tstep) + 1
+    return np.linspace(Tstart, Tstop, Tnum)
+
+
+def log_schedule(Tstart, Tstop, num):
+    """*num* setpoints from *Tstart* to *Tstop*, evenly spaced on a log scale."""
+    return np.geomspace(Tstart, Tstop, num)
+
+
+def piecewise_schedule(*segments):
+    """
+    Concatenate linear segments with different step sizes.
+
+    Parameters:
+        *segments: ``(Tstart, Tstop, Tstep)`` tuples; a segment starting where
+            the previous one stopped does not repeat that setpoint.
+
+    Example:
+        piecewise_schedule((300, 500, 20), (500, 800, 50), (800, 300, 100))
+    """
+    parts = [linear_schedule(*seg) for seg in segments]
+    for i in range(1, len(parts)):
+        if parts[i - 1].size and parts[i].size and parts[i][0] == parts[i - 1][-1]:
+            parts[i] = parts[i][1:]
+    return np.concatenate(parts) if parts else np.empty(0)
+
+
+def cyclic_schedule(Tlow, Thigh, Tstep, cycles=1, hold_low=0, hold_high=0):
+    """
+    Heat/cool cycles between *Tlow* and *Thigh*, with holds at both ends.
+
+    Parameters:
+        Tlow, Thigh, Tstep: range and step size of every ramp.
+        cycles (int): number of up-and-down cycles; the schedule ends back at *Tlow*.
+        hold_low, hold_high (float): hold time in seconds at *Tlow* and *Thigh*.
+
+    Returns:
+        tuple: ``(temps, holds)`` arrays of the same length.
+    """
+    up = linear_schedule(Tlow, Thigh, Tstep)
+    one_cycle = np.concatenate([up, up[-2:0:-1]])
+    temps = np.append(np.tile(one_cycle, cycles), Tlow)
+    holds = np.where(temps == Thigh, hold_high, np.where(temps == Tlow, hold_low, 0.0))
+    return temps, holds
+
+
+def ramp_durations(temps, ramp_rate, T0=None):
+    """
+    Time in seconds to ramp to each setpoint from the previous one.
+
+    Parameters:
+        temps (array): setpoints.
+        ramp_rate (float): controller ramp rate in K/min.
+        T0 (float, optional): temperature before the first setpoint; default is the first setpoint.
+    """
+    temps = np.asarray(temps, dtype=float)
+    if T0 is None:
+        T0 = temps[0] if temps.size else 0.0
+    return np.abs(np.diff(temps, prepend=T0)) / (ramp_rate / 60.0)
+
+
+def arrival_times(temps, ramp_rate, T0=None, dwell=0.0):
+    """
+    Time in seconds from the start at which each setpoint is reached.
+
+    Parameters:
+        temps (array): setpoints.
+        ramp_rate (float): controller ramp rate in K/min.
+        T0 (float, optional): starting temperature, see `ramp_durations`.
+        dwell (float or array): time spent at each setpoint before moving on
+            (settle + acquisition + hold).
+
+    Returns:
+        numpy.ndarray: arrival times, same length as *temps*.
+    """
+    ramp = ramp_durations(temps, ramp_rate, T0)
+    dwell = np.broadcast_to(np.asarray(dwell, dtype=float), ramp.shape)
+    return np.cumsum(ramp) + np.concatenate([[0.0], np.cumsum(dwell)[:-1]])
+
+
+def wait_for_setpoint(T_controller, temp, ramp_rate, tolerance=1.0, poll=0.5, timeout=None):
+    """
+    Wait until *T_controller* has reached *temp* after its setpoint was written.
+
+    Sleeps for the ramp time predicted from the current readback and
+    *ramp_rate*, then polls the readback until it is within *tolerance*.
+
+    Parameters:
+        T_controller: temperature controller, its ``get()`` is the readback.
+        temp (float): setpoint already sent to the controller.
+        ramp_rate (float): controller ramp rate in K/min.
+        tolerance (float): K from *temp* counted as arrived.
+        poll (float): seconds between readback checks after the predicted arrival.
+        timeout (float, optional): give up after this many seconds; default is
+            twice the predicted ramp time plus a minute.
+
+    Returns:
+        bool: True if the setpoint was reached, False on timeout.
+    """
+    predicted = float(ramp_durations([temp], ramp_rate, T0=T_controller.get())[0])
+    if timeout is None:
+        timeout = 2 * predicted + 60
+    bl.clock.sleep(min(predicted, timeout))
+    waited = min(predicted, timeout)
+    while abs(T_controller.get() - temp) > tolerance:
+        if waited >= timeout:
+            print(f'temperature {T_controller.get():.1f} has not reached {temp} after {waited:.0f} s, continuing')
+            return False
+        bl.clock.sleep(poll)
+        waited += poll
+    return True